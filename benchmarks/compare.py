@@ -0,0 +1,71 @@
+"""
+Compara dois relatórios de `benchmarks.run` (melhor tempo e pico de RSS
+de cada caso) e sai com erro se algum caso piorou além do limite.
+
+    python -m benchmarks.compare base.json novo.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+
+def _load(path: str) -> Tuple[Dict, Dict]:
+    with open(path) as f:
+        report = json.load(f)
+
+    results = {
+        (result['name'], result['size']): result
+        for result in report['results']
+    }
+    return report, results
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    base_report, base = _load(base_path)
+    new_report, new = _load(new_path)
+
+    print(f"{base_report['commit']} -> {new_report['commit']}")
+    print(f"{'caso':<34} {'base':>9} {'novo':>9} {'razão':>7} "
+          f"{'RSS base':>9} {'RSS novo':>9}")
+
+    regressions = 0
+    for key in sorted(base.keys() | new.keys()):
+        name = f'{key[0]} ({key[1]})'
+        if key not in base or key not in new:
+            where = 'novo' if key in new else 'base'
+            print(f'{name:<34} só em {where}')
+            continue
+
+        old, current = base[key], new[key]
+        ratio = current['best'] / old['best'] if old['best'] else 1.0
+
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  pior'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = '  melhor'
+
+        print(
+            f"{name:<34} {old['best']:>8.3f}s {current['best']:>8.3f}s "
+            f"{ratio:>7.2f} {old['peak_rss'] / 1024 ** 2:>6.0f}MiB "
+            f"{current['peak_rss'] / 1024 ** 2:>6.0f}MiB{flag}"
+        )
+
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='benchmarks.compare')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='piora relativa tolerada (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    sys.exit(compare(args.base, args.new, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Arquivos CMIP sintéticos com a forma, a codificação e o layout de chaves
+dos arquivos reais do noaa-goes19 (disco completo, int16 empacotado,
+chunks HDF5 comprimidos), para que os benchmarks não dependam da rede
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import h5netcdf
+import numpy as np
+
+# altura do satélite e semieixos do elipsoide, em metros (GOES-R PUG)
+PERSPECTIVE_HEIGHT = 35786023.0
+SEMI_MAJOR = 6378137.0
+SEMI_MINOR = 6356752.31414
+
+# tamanho do disco completo -> (passo do ângulo de varredura, canal típico)
+SIZES: Dict[int, tuple] = {
+    21696: (14e-6, 'C02'),
+    10848: (28e-6, 'C01'),
+    5424: (56e-6, 'C13'),
+}
+
+# codificação do CMI: refletância nos canais 1-6, temperatura de brilho
+# nos demais
+REFLECTANCE = {'scale_factor': 0.00031746, 'add_offset': 0.0}
+BRIGHTNESS = {'scale_factor': 0.04224986, 'add_offset': 173.15}
+
+CHUNK = 226
+
+
+@dataclass(frozen=True)
+class Fixture:
+    size: int
+    channel: str
+    date: datetime
+    key: str
+    path: Path
+
+    @property
+    def nbytes(self) -> int:
+        return self.path.stat().st_size
+
+
+def _timestamp(date: datetime) -> str:
+    return date.strftime('%Y%j%H%M%S') + str(date.microsecond // 100000)
+
+
+def key_of(channel: str, date: datetime) -> str:
+    """Chave no layout do bucket, ex. ABI-L2-CMIPF/2025/226/19/OR_..."""
+    end = date + timedelta(minutes=9, seconds=30)
+    created = end + timedelta(seconds=10)
+    name = (
+        f'OR_ABI-L2-CMIPF-M6{channel}_G19_s{_timestamp(date)}'
+        f'_e{_timestamp(end)}_c{_timestamp(created)}.nc'
+    )
+    return f'ABI-L2-CMIPF/{date.strftime("%Y/%j/%H")}/{name}'
+
+
+def _earth_mask(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Pixels cuja linha de visada intercepta o elipsoide"""
+    h = PERSPECTIVE_HEIGHT + SEMI_MAJOR
+    sx, cx = np.sin(x), np.cos(x)
+    sy, cy = np.sin(y), np.cos(y)
+
+    ratio = (SEMI_MAJOR / SEMI_MINOR) ** 2
+    a = sx ** 2 + cx ** 2 * (cy ** 2 + ratio * sy ** 2)
+    b = -2 * h * cx * cy
+    c = h ** 2 - SEMI_MAJOR ** 2
+    return b ** 2 - 4 * a * c >= 0
+
+
+def _field(
+    x: np.ndarray,
+    y: np.ndarray,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """Campo suave em [0, 1] com ruído, comprimível como uma imagem real"""
+    base = (
+        0.5 + 0.25 * np.sin(x * 90) * np.cos(y * 70) +
+        0.15 * np.sin((x + y) * 400)
+    )
+    noise = rng.normal(0, 0.03, base.shape)
+    return np.clip(base + noise, 0, 1)
+
+
+def _write(path: Path, size: int, channel: str, date: datetime, seed: int):
+    step, _ = SIZES[size]
+    offset = (size - 1) / 2 * step
+    codes = np.arange(size, dtype=np.int16)
+
+    reflective = int(channel[1:]) <= 6
+    encoding = REFLECTANCE if reflective else BRIGHTNESS
+    vmin, vmax = (0.0, 1.0) if reflective else (190.0, 320.0)
+
+    rng = np.random.default_rng(seed)
+    x = codes * step - offset
+    y = offset - codes * step
+
+    temp = path.with_name(path.name + '.tmp')
+    with h5netcdf.File(temp, 'w') as f:
+        f.dimensions = {'y': size, 'x': size}
+
+        for name, scale, add in (('x', step, -offset), ('y', -step, offset)):
+            var = f.create_variable(name, (name,), np.int16)
+            var[:] = codes
+            var.attrs['scale_factor'] = np.float32(scale)
+            var.attrs['add_offset'] = np.float32(add)
+            var.attrs['units'] = 'rad'
+            var.attrs['axis'] = name.upper()
+
+        seconds = (date - datetime(2000, 1, 1, 12, tzinfo=date.tzinfo))
+        t = f.create_variable('t', (), np.float64)
+        t[...] = seconds.total_seconds() + 285
+        t.attrs['units'] = 'seconds since 2000-01-01 12:00:00'
+        t.attrs['standard_name'] = 'time'
+
+        cmi = f.create_variable(
+            'CMI', ('y', 'x'), np.int16,
+            chunks=(CHUNK, CHUNK),
+            compression='gzip', compression_opts=1,
+            fillvalue=np.int16(-1)
+        )
+        cmi.attrs['scale_factor'] = np.float32(encoding['scale_factor'])
+        cmi.attrs['add_offset'] = np.float32(encoding['add_offset'])
+        cmi.attrs['_Unsigned'] = 'true'
+        cmi.attrs['valid_range'] = np.array([0, 4095], dtype=np.int16)
+        cmi.attrs['coordinates'] = 't y x'
+
+        dqf = f.create_variable(
+            'DQF', ('y', 'x'), np.int8,
+            chunks=(CHUNK, CHUNK),
+            compression='gzip', compression_opts=1,
+            fillvalue=np.int8(-1)
+        )
+        dqf.attrs['_Unsigned'] = 'true'
+        dqf.attrs['coordinates'] = 't y x'
+
+        # faixas de linhas alinhadas aos chunks, para não montar o disco
+        # todo em memória (0.5 km são ~1 GB em int16)
+        for row in range(0, size, CHUNK):
+            rows = slice(row, min(row + CHUNK, size))
+            grid_x, grid_y = np.meshgrid(x, y[rows])
+            earth = _earth_mask(grid_x, grid_y)
+
+            value = vmin + _field(grid_x, grid_y, rng) * (vmax - vmin)
+            raw = np.rint(
+                (value - encoding['add_offset']) / encoding['scale_factor']
+            )
+            raw = np.clip(raw, 0, 4095).astype(np.int16)
+            raw[~earth] = -1
+            cmi[rows, :] = raw
+
+            flags = np.zeros(raw.shape, dtype=np.int8)
+            flags[~earth] = -1
+            dqf[rows, :] = flags
+
+    temp.replace(path)
+
+
+def generate(
+    root: str,
+    bucket: str = 'noaa-goes19',
+    sizes: List[int] = (5424,),
+    date: datetime = datetime(2025, 8, 14, 19, 0, 21, tzinfo=timezone.utc),
+    seed: int = 0
+) -> List[Fixture]:
+    """
+    Gera (ou reaproveita) um arquivo por tamanho em root/bucket/chave, o
+    layout servido pelo servidor S3 local
+    """
+    fixtures = []
+    for size in sizes:
+        if size not in SIZES:
+            raise ValueError(f'tamanho inválido: {size} (use {list(SIZES)})')
+
+        _, channel = SIZES[size]
+        key = key_of(channel, date)
+        path = Path(root) / bucket / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if not path.exists():
+            print(f'gerando {key} ({size}x{size})')
+            _write(path, size, channel, date, seed + size)
+
+        fixtures.append(Fixture(size, channel, date, key, path))
+
+    return fixtures
@@ -0,0 +1,359 @@
+"""
+Mede os estágios do pipeline sobre os arquivos sintéticos servidos pelo
+S3 local e grava os resultados em JSON, comparáveis entre commits com
+`python -m benchmarks.compare`.
+
+    python -m benchmarks.run --sizes 5424 10848 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fixtures import SIZES, Fixture, generate
+from benchmarks.s3_server import LocalS3
+
+REPO = Path(__file__).resolve().parent.parent
+BUCKET = 'noaa-goes19'
+DATE = datetime(2025, 8, 14, 19, 0, 21, tzinfo=timezone.utc)
+
+
+@dataclass
+class Result:
+    name: str
+    size: int
+    seconds: List[float]
+    # unidade processada por execução (bytes ou pixels) e o seu nome
+    work: float = 0
+    unit: str = ''
+    peak_rss: int = 0
+    extra: Dict = field(default_factory=dict)
+
+    @property
+    def best(self) -> float:
+        return min(self.seconds)
+
+    def to_json(self) -> Dict:
+        data = asdict(self)
+        data['median'] = statistics.median(self.seconds)
+        data['best'] = self.best
+        data['throughput'] = self.work / self.best if self.best else 0
+        return data
+
+
+def _timed(function: Callable, repeat: int) -> List[float]:
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _open(fixture: Fixture):
+    import xarray as xr
+    return xr.open_dataset(fixture.path, chunks='auto')
+
+
+def _projection(workdir: Path):
+    from goes2.geo.projection import WebMercator
+    return WebMercator(cache_dir=str(workdir / 'cache' / 'reprojection'))
+
+
+def _product(fixture: Fixture):
+    from goes2.product import CMI
+    return CMI.of(fixture.channel)
+
+
+def _colored(fixture: Fixture, workdir: Path):
+    with _open(fixture) as data:
+        reproj = _projection(workdir).reproject(data)
+    return _product(fixture).create(reproj)
+
+
+# cada caso roda num processo novo: o pico de RSS é só dele
+
+def bench_repository_get(fixture, workdir, repeat, endpoint, mode):
+    from goes2.aws import AWSRepository
+
+    async def get():
+        repository = AWSRepository(
+            bucket_name=BUCKET,
+            endpoint_url=endpoint,
+            download_mode=mode
+        )
+        try:
+            files = await repository.get(
+                f'ABI-L2-CMIPF/{fixture.channel}', DATE
+            )
+            repository.release(files)
+        finally:
+            await repository.dispose()
+
+    def run():
+        # o cache em disco fica no diretório de trabalho; limpa para medir
+        # o download de fato
+        shutil.rmtree(workdir / 'temp', ignore_errors=True)
+        asyncio.run(get())
+
+    return Result(
+        f'repository_get[{mode}]', fixture.size, _timed(run, repeat),
+        fixture.nbytes, 'bytes'
+    )
+
+
+def bench_reproject(fixture, workdir, repeat, endpoint, mode):
+    projection = _projection(workdir)
+
+    def run():
+        with _open(fixture) as data:
+            projection.reproject(data)
+
+    # a primeira execução constrói e grava a LUT
+    lut_build = _timed(run, 1)[0]
+    return Result(
+        'reproject', fixture.size, _timed(run, repeat),
+        fixture.size ** 2, 'pixels', extra={'first_run': lut_build}
+    )
+
+
+def bench_apply_palette(fixture, workdir, repeat, endpoint, mode):
+    with _open(fixture) as data:
+        reproj = _projection(workdir).reproject(data)
+
+    product = _product(fixture)
+
+    def run():
+        # CMI.Channel.create é só o apply_palette da banda
+        product.create(reproj).values
+
+    return Result(
+        'apply_palette', fixture.size, _timed(run, repeat),
+        reproj['CMI'].size, 'pixels'
+    )
+
+
+def bench_image_to_raster(fixture, workdir, repeat, endpoint, mode):
+    from goes2.raster import Image
+
+    colored = _colored(fixture, workdir).compute()
+    output = workdir / 'image'
+
+    return Result(
+        'image_to_raster', fixture.size,
+        _timed(lambda: Image('PNG').to_raster(colored, str(output)), repeat),
+        colored.sizes['y'] * colored.sizes['x'], 'pixels'
+    )
+
+
+def bench_paletted_image_to_raster(fixture, workdir, repeat, endpoint, mode):
+    from goes2.raster import Image
+
+    indexed = _colored(fixture, workdir).compute()
+    output = workdir / 'paletted'
+    image = Image('PNG', paletted=True)
+
+    return Result(
+        'paletted_image_to_raster', fixture.size,
+        _timed(lambda: image.to_raster(indexed, str(output)), repeat),
+        indexed.sizes['y'] * indexed.sizes['x'], 'pixels'
+    )
+
+
+def bench_xyz_tiles_to_raster(fixture, workdir, repeat, endpoint, mode):
+    from goes2.raster import XYZTiles
+
+    colored = _colored(fixture, workdir).compute()
+
+    def run():
+        output = workdir / 'xyz'
+        shutil.rmtree(output, ignore_errors=True)
+        XYZTiles().to_raster(colored, str(output))
+
+    return Result(
+        'xyz_tiles_to_raster', fixture.size, _timed(run, repeat),
+        colored.sizes['y'] * colored.sizes['x'], 'pixels'
+    )
+
+
+def bench_gdal_tiles_to_raster(fixture, workdir, repeat, endpoint, mode):
+    from goes2.raster import GDALTiles
+
+    if shutil.which('gdal2tiles.py') is None:
+        return None
+
+    colored = _colored(fixture, workdir).compute()
+
+    def run():
+        output = workdir / 'gdal'
+        shutil.rmtree(output, ignore_errors=True)
+        GDALTiles().to_raster(colored, str(output))
+
+    return Result(
+        'gdal_tiles_to_raster', fixture.size, _timed(run, repeat),
+        colored.sizes['y'] * colored.sizes['x'], 'pixels'
+    )
+
+
+def bench_end_to_end(fixture, workdir, repeat, endpoint, mode):
+    from goes2 import GOES2
+    from goes2.aws import AWSRepository
+    from goes2.raster import XYZTiles
+    from goes2.storage import TimeSeriesStorage
+
+    async def produce():
+        repository = AWSRepository(
+            bucket_name=BUCKET,
+            endpoint_url=endpoint,
+            download_mode=mode
+        )
+        goes2 = GOES2(XYZTiles(), repository)
+        goes2.on_projection(_projection(workdir)).at_date(DATE)
+        goes2.use_store(TimeSeriesStorage(at=str(workdir / 'static')))
+        try:
+            await goes2.produce_in_parallel([_product(fixture)])
+        finally:
+            await goes2.dispose()
+
+    def run():
+        for directory in ('static', 'temp'):
+            shutil.rmtree(workdir / directory, ignore_errors=True)
+        asyncio.run(produce())
+
+    return Result(
+        f'end_to_end[{mode}]', fixture.size, _timed(run, repeat),
+        fixture.size ** 2, 'pixels'
+    )
+
+
+BENCHMARKS = {
+    'repository_get': bench_repository_get,
+    'reproject': bench_reproject,
+    'apply_palette': bench_apply_palette,
+    'image_to_raster': bench_image_to_raster,
+    'paletted_image_to_raster': bench_paletted_image_to_raster,
+    'xyz_tiles_to_raster': bench_xyz_tiles_to_raster,
+    'gdal_tiles_to_raster': bench_gdal_tiles_to_raster,
+    'end_to_end': bench_end_to_end,
+}
+
+
+def _case(name, fixture, workdir, repeat, endpoint, mode) -> Optional[Dict]:
+    """Executado num processo novo"""
+    sys.path.insert(0, str(REPO))
+    from goes2.metrics import peak_rss
+
+    # as paletas (res/) são procuradas em caminhos relativos
+    os.chdir(workdir)
+    result = BENCHMARKS[name](fixture, workdir, repeat, endpoint, mode)
+    if result is None:
+        return None
+
+    result.peak_rss = peak_rss()
+    return result.to_json()
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=REPO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _workdir(root: Path) -> Path:
+    root.mkdir(parents=True, exist_ok=True)
+    res = root / 'res'
+    if not res.exists():
+        res.symlink_to(REPO / 'res', target_is_directory=True)
+    return root
+
+
+def run(
+    sizes: List[int],
+    benchmarks: List[str],
+    repeat: int,
+    fixtures_dir: str,
+    mode: str
+) -> Dict:
+    fixtures = generate(fixtures_dir, BUCKET, sizes, DATE)
+    results = []
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as temp, \
+            LocalS3(fixtures_dir) as server:
+        workdir = _workdir(Path(temp))
+
+        for fixture in fixtures:
+            for name in benchmarks:
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    result = pool.submit(
+                        _case, name, fixture, workdir, repeat,
+                        server.endpoint_url, mode
+                    ).result()
+
+                if result is None:
+                    print(f'{name} ({fixture.size}): indisponível, pulado')
+                    continue
+
+                print(
+                    f"{result['name']} ({fixture.size}): "
+                    f"{result['best']:.3f}s, "
+                    f"pico {result['peak_rss'] / 1024 ** 2:.0f} MiB"
+                )
+                results.append(result)
+
+    return {
+        'commit': _commit(),
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='benchmarks.run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5424],
+                        choices=sorted(SIZES))
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS),
+                        choices=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fixtures', default='benchmarks/data',
+                        help='diretório dos arquivos sintéticos (reusados)')
+    parser.add_argument('--download-mode', default='memory',
+                        choices=('disk', 'memory', 'ranges'))
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    report = run(
+        args.sizes, args.benchmarks, args.repeat,
+        str(Path(args.fixtures).resolve()), args.download_mode
+    )
+
+    output = args.output or f"benchmarks/results/{report['commit']}.json"
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'resultados em {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Servidor local compatível com o subconjunto do S3 que o pipeline usa
+(ListObjectsV2, GET com Range e HEAD), servindo os arquivos de
+root/bucket/chave. Usado com AWSRepository(endpoint_url=...).
+"""
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+def _etag(path: Path) -> str:
+    stat = path.stat()
+    digest = hashlib.md5(f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+class LocalS3:
+    def __init__(
+        self,
+        root: str,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        page_size: int = 1000
+    ):
+        self._root = Path(root)
+        self._host = host
+        self._port = port
+        self._page_size = page_size
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self.requests = 0
+        self.bytes_sent = 0
+
+    @property
+    def endpoint_url(self) -> str:
+        return f'http://{self._host}:{self._port}'
+
+    def _path(self, bucket: str, key: str) -> Path:
+        path = (self._root / bucket / key).resolve()
+        if self._root.resolve() not in path.parents:
+            raise web.HTTPForbidden()
+        return path
+
+    async def _list(self, request: web.Request) -> web.Response:
+        bucket = request.match_info['bucket']
+        prefix = request.query.get('prefix', '')
+        token = request.query.get('continuation-token') or ''
+        max_keys = int(request.query.get('max-keys', self._page_size))
+
+        base = self._root / bucket
+        if not base.is_dir():
+            raise web.HTTPNotFound(text='NoSuchBucket')
+
+        keys = sorted(
+            str(path.relative_to(base))
+            for path in base.rglob('*')
+            if path.is_file() and not path.name.endswith('.tmp')
+        )
+        keys = [k for k in keys if k.startswith(prefix) and k > token]
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+
+        contents = []
+        for key in page:
+            path = base / key
+            stat = path.stat()
+            modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+            contents.append(
+                f'<Contents><Key>{escape(key)}</Key>'
+                f'<LastModified>{modified.strftime("%Y-%m-%dT%H:%M:%S.000Z")}'
+                f'</LastModified><ETag>{escape(_etag(path))}</ETag>'
+                f'<Size>{stat.st_size}</Size>'
+                f'<StorageClass>STANDARD</StorageClass></Contents>'
+            )
+
+        next_token = (
+            f'<NextContinuationToken>{escape(page[-1])}'
+            f'</NextContinuationToken>' if truncated else ''
+        )
+        body = (
+            f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<ListBucketResult xmlns="{NAMESPACE}">'
+            f'<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>'
+            f'<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>'
+            f'<IsTruncated>{str(truncated).lower()}</IsTruncated>'
+            f'{"".join(contents)}{next_token}</ListBucketResult>'
+        )
+        return web.Response(text=body, content_type='application/xml')
+
+    async def _object(self, request: web.Request) -> web.StreamResponse:
+        path = self._path(
+            request.match_info['bucket'], request.match_info['key']
+        )
+        if not path.is_file():
+            raise web.HTTPNotFound(text='NoSuchKey')
+
+        # FileResponse trata Range (206 + Content-Range) e HEAD
+        response = web.FileResponse(
+            path, headers={'ETag': _etag(path), 'Accept-Ranges': 'bytes'}
+        )
+        if request.method == 'GET' and request.http_range.start is not None:
+            start, stop = request.http_range.start, request.http_range.stop
+            size = path.stat().st_size
+            self.bytes_sent += min(stop or size, size) - start
+        elif request.method == 'GET':
+            self.bytes_sent += path.stat().st_size
+        return response
+
+    async def _dispatch(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        if request.match_info.get('key'):
+            return await self._object(request)
+        return await self._list(request)
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/{bucket}', self._dispatch)
+        app.router.add_get('/{bucket}/', self._dispatch)
+        app.router.add_get('/{bucket}/{key:.+}', self._dispatch)
+        return app
+
+    async def _start(self, ready: threading.Event):
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        self._port = site._server.sockets[0].getsockname()[1]
+        ready.set()
+
+    def start(self) -> 'LocalS3':
+        """Sobe o servidor numa thread com loop de eventos próprio"""
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start(ready))
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        if not ready.wait(10):
+            raise RuntimeError('servidor S3 local não iniciou')
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._runner.cleanup(), self._loop
+        )
+        future.result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self) -> 'LocalS3':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from goes2 import GOES2
+from goes2.aws import AWSRepository
+from goes2.geo.projection import WebMercator
+from goes2.metrics import (
+    JSONLines, PrometheusTextFile, SpanRecorder, registry
+)
+from goes2.product import CMI, RGB
+from goes2.raster import (
+    COG, AnimatedLoop, Encoding, Image, TileStore, XYZTiles, ZarrTimeSeries
+)
+from goes2.server import TileServer
+from goes2.storage import RetentionPolicy, TimeSeriesStorage
+
+
+def _parse_date(value: str) -> datetime:
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def _parse_products(value: str):
+    """
+    'ALL', 'C01-C16' ou lista separada por vírgulas ('C02,C13'); composições
+    RGB pelo nome ('truecolor,airmass')
+    """
+    if value.upper() == 'ALL':
+        return CMI.ALL()
+
+    products = []
+    for part in value.upper().split(','):
+        if part.lower() in RGB.recipes:
+            products.append(RGB.of(part.lower()))
+        elif '-' in part:
+            start, finish = part.split('-')
+            products += CMI.in_range(int(start[1:]), int(finish[1:]))
+        else:
+            products.append(CMI.of(part))
+    return products
+
+
+def _parse_bbox(value: str):
+    return tuple(float(v) for v in value.split(','))
+
+
+def _metrics(args):
+    if args.metrics_prometheus:
+        registry.add_exporter(PrometheusTextFile(args.metrics_prometheus))
+    if args.metrics_jsonl:
+        registry.add_exporter(JSONLines(args.metrics_jsonl))
+    if args.trace:
+        registry.tracer.on_finish = SpanRecorder(args.trace)
+
+
+def _retention(args) -> RetentionPolicy:
+    return RetentionPolicy(
+        max_count=args.keep,
+        max_age=(
+            timedelta(hours=args.max_age) if args.max_age is not None
+            else None
+        ),
+        max_bytes=args.max_bytes
+    )
+
+
+def _build(args) -> GOES2:
+    _metrics(args)
+    store = TimeSeriesStorage(at='static', retention=_retention(args))
+
+    encoding = Encoding(
+        args.format,
+        level=args.png_level,
+        filter=args.png_filter,
+        quality=args.quality,
+        lossless=not args.lossy
+    )
+
+    # cada produto é calculado uma vez e gravado em todas as saídas
+    sinks = {}
+    for output in dict.fromkeys(args.output):
+        if output == 'image':
+            sinks[output] = Image(
+                args.format, paletted=args.paletted, encoding=encoding
+            )
+        elif output == 'cog':
+            sinks[output] = COG()
+        elif output == 'zarr':
+            sinks[output] = ZarrTimeSeries('static/zarr')
+        else:
+            tile_store = None
+            if args.dedup:
+                # dentro do armazenamento, para os hardlinks funcionarem
+                tile_store = TileStore('static/.tiles')
+                # só as cópias dos tiles apagados são verificadas
+                store.on_remove(tile_store.release)
+                store.on_collect(tile_store.prune_released)
+
+            min_zoom, max_zoom = (int(z) for z in args.zoom.split('-'))
+            sinks[output] = XYZTiles(
+                args.format,
+                zoom_range=(min_zoom, max_zoom),
+                tile_store=tile_store,
+                paletted=args.paletted,
+                encoding=encoding
+            )
+
+    repository = AWSRepository(
+        listing_path=args.listing_cache,
+        download_mode=args.download_mode
+    )
+
+    projection = WebMercator(resolution=args.resolution, bbox=args.bbox)
+    goes2 = GOES2(
+        sinks,
+        repository,
+        executor=args.executor,
+        workers=args.workers,
+        memory_budget=args.memory_budget,
+        packed=args.packed
+    )
+    goes2.use_store(store)
+    return goes2.on_projection(projection)
+
+
+def _loops(args, goes2: GOES2, products) -> list:
+    """Animações mantidas a partir das imagens de cada produto"""
+    if args.loop is None:
+        return []
+    if 'image' not in args.output:
+        raise SystemExit('--loop precisa da saída image (--output image)')
+
+    loops = []
+    for product in products:
+        key = goes2.storage_key(product, 'image')
+        loops.append(AnimatedLoop(
+            goes2.store, key, f'static/loops/{key}',
+            format=args.loop,
+            frames=args.loop_frames or args.keep,
+            lossless=not args.lossy,
+            quality=args.quality
+        ))
+    return loops
+
+
+async def _serve(args):
+    """Só o servidor de tiles, sobre o armazenamento de outro processo"""
+    if args.metrics_prometheus:
+        registry.add_exporter(PrometheusTextFile(args.metrics_prometheus))
+    if args.metrics_jsonl:
+        registry.add_exporter(JSONLines(args.metrics_jsonl))
+
+    server = TileServer(
+        TimeSeriesStorage(at=args.at),
+        host=args.host,
+        port=args.port,
+        cache_bytes=args.cache_bytes,
+        xyz=args.xyz
+    )
+    await server.start()
+    try:
+        while True:
+            await asyncio.sleep(60)
+            await asyncio.to_thread(registry.export)
+    finally:
+        await server.stop()
+
+
+async def _run(args):
+    if args.command == 'serve':
+        return await _serve(args)
+
+    goes2 = _build(args)
+    products = _parse_products(args.products)
+    loops = _loops(args, goes2, products)
+
+    # no mesmo processo, os eventos do armazenamento chegam direto ao cache
+    server = None
+    if args.serve is not None:
+        server = await TileServer(
+            goes2.store, port=args.serve, xyz=args.xyz
+        ).start()
+
+    try:
+        if args.command == 'backfill':
+            await goes2.backfill(
+                products,
+                args.start,
+                args.end,
+                cadence=timedelta(minutes=args.cadence),
+                queue_size=args.queue_size
+            )
+        else:
+            await goes2.follow(products, interval=args.interval)
+    finally:
+        await goes2.dispose()
+        for loop in loops:
+            await asyncio.to_thread(loop.close)
+        if server is not None:
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='goes2')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--products', default='ALL')
+    common.add_argument(
+        '--output', nargs='+', choices=('tiles', 'image', 'cog', 'zarr'),
+        default=['tiles'],
+        help='uma ou mais saídas; com várias, o armazenamento usa '
+             '<produto>-<saída>'
+    )
+    common.add_argument('--format', default='PNG',
+                        choices=('PNG', 'JPEG', 'JPG', 'WEBP'),
+                        type=str.upper)
+    common.add_argument('--paletted', action='store_true',
+                        help='PNG de 8 bits com paleta para produtos CMI')
+    common.add_argument('--png-level', type=int, default=6,
+                        help='nível do zlib (0-9)')
+    common.add_argument('--png-filter', default='none',
+                        choices=('none', 'sub', 'up', 'average', 'paeth'))
+    common.add_argument('--quality', type=int, default=80,
+                        help='qualidade do JPEG e do WebP com perdas')
+    common.add_argument('--lossy', action='store_true',
+                        help='WebP com perdas (padrão: sem perdas)')
+    common.add_argument('--zoom', default='4-6')
+    common.add_argument('--resolution', type=float, default=2000)
+    common.add_argument('--bbox', type=_parse_bbox, default=None,
+                        help='lon_min,lat_min,lon_max,lat_max')
+    common.add_argument('--download-mode', default='disk',
+                        choices=('disk', 'memory', 'ranges'))
+    common.add_argument('--listing-cache', default=None)
+    common.add_argument('--executor', default='thread',
+                        choices=('thread', 'process'))
+    common.add_argument('--workers', type=int, default=None)
+    common.add_argument('--memory-budget', type=int, default=None,
+                        help='bytes para produtos simultâneos')
+    common.add_argument('--packed', action='store_true',
+                        help='processa o CMI nos inteiros empacotados')
+    common.add_argument('--metrics-prometheus', default=None,
+                        help='arquivo .prom (textfile do node_exporter)')
+    common.add_argument('--metrics-jsonl', default=None,
+                        help='arquivo JSON lines com snapshots das métricas')
+    common.add_argument('--trace', default=None,
+                        help='arquivo JSON lines com as árvores de spans')
+    common.add_argument('--keep', type=int, default=12,
+                        help='horários mantidos por produto')
+    common.add_argument('--max-age', type=float, default=None,
+                        help='idade máxima dos horários, em horas')
+    common.add_argument('--max-bytes', type=int, default=None,
+                        help='bytes máximos por produto')
+    common.add_argument('--dedup', action='store_true',
+                        help='grava tiles idênticos uma vez só (hardlinks)')
+    common.add_argument('--loop', default=None, choices=('WEBP', 'GIF'),
+                        type=str.upper,
+                        help='animação dos últimos horários dos produtos')
+    common.add_argument('--loop-frames', type=int, default=None,
+                        help='quadros da animação (padrão: --keep)')
+    common.add_argument('--serve', type=int, default=None, metavar='PORT',
+                        help='serve os tiles produzidos nesta porta')
+    common.add_argument('--xyz', action='store_true',
+                        help='y das URLs na numeração XYZ (disco em TMS)')
+
+    backfill = subparsers.add_parser('backfill', parents=[common])
+    backfill.add_argument('--start', type=_parse_date, required=True)
+    backfill.add_argument('--end', type=_parse_date, required=True)
+    backfill.add_argument('--cadence', type=int, default=10,
+                          help='minutos entre intervalos')
+    backfill.add_argument('--queue-size', type=int, default=2)
+
+    follow = subparsers.add_parser('follow', parents=[common])
+    follow.add_argument('--interval', type=float, default=20)
+
+    serve = subparsers.add_parser('serve')
+    serve.add_argument('--at', default='static')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--cache-bytes', type=int, default=256 * 1024 ** 2,
+                       help='tamanho do cache de tiles em memória')
+    serve.add_argument('--xyz', action='store_true',
+                       help='y das URLs na numeração XYZ (disco em TMS)')
+    serve.add_argument('--metrics-prometheus', default=None)
+    serve.add_argument('--metrics-jsonl', default=None)
+
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
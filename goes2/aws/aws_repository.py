@@ -1,24 +1,43 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple, Union
 
-import aioboto3
-
-from botocore import UNSIGNED
-from botocore.config import Config
-
 from goes2.aws.download_manager import DownloadManager
+from goes2.aws.listing_index import KeyRecord, ListingIndex
+from goes2.aws.s3_client import S3Client
 
 import asyncio
 
 
 class AWSRepository:
-    def __init__(self):
-        self._session = aioboto3.Session()
-
-        self._bucket_name = 'noaa-goes19'
-        self._download_manager = DownloadManager(self._bucket_name)
-
-        self._s3 = None
+    def __init__(
+        self,
+        listing_ttl: float = 60,
+        listing_path: Optional[str] = None,
+        bucket_name: str = 'noaa-goes19',
+        endpoint_url: Optional[str] = None,
+        max_connections: int = 64,
+        part_size: int = 16 * 1024 ** 2,
+        max_concurrency: int = 16,
+        max_bandwidth: Optional[float] = None,
+        download_mode: str = 'disk'
+    ):
+        # um único cliente (e pool de conexões) para listagens e downloads
+        self._s3 = S3Client(max_connections, endpoint_url)
+
+        self._bucket_name = bucket_name
+        self._download_manager = DownloadManager(
+            self._bucket_name,
+            client=self._s3,
+            part_size=part_size,
+            max_concurrency=max_concurrency,
+            max_bandwidth=max_bandwidth,
+            mode=download_mode
+        )
+        self._index = ListingIndex(
+            self._list_prefix,
+            ttl=listing_ttl,
+            persist_path=listing_path
+        )
 
     def _flatten_request(self, product_request: str):
         if '/' in product_request:
@@ -26,64 +45,96 @@ class AWSRepository:
         else:
             return product_request, None
 
-    async def _get_s3_resource(self):
-        if self._s3 is None:
-            self._s3 = await self._session.resource(
-                's3',
-                config=Config(signature_version=UNSIGNED)
-            ).__aenter__()
-        return self._s3
+    async def _list_prefix(self, prefix: str):
+        client = await self._s3.get()
+        paginator = client.get_paginator('list_objects_v2')
 
-    async def _is_channel_in_key(self, product):
-        await self._get_s3_resource()
-        bucket = await self._s3.Bucket(self._bucket_name)
+        objects = []
+        async for page in paginator.paginate(
+            Bucket=self._bucket_name,
+            Prefix=prefix
+        ):
+            for obj in page.get('Contents', []):
+                objects.append((obj['Key'], obj['Size'], obj['ETag']))
 
-        async for obj in bucket.objects.filter(Prefix=product).limit(1):
-            return 'M6C' in obj.key
+        return objects
 
-    async def _find_key(self, product: str, channel: str, date: datetime):
-        channel_in_key = await self._is_channel_in_key(product)
+    async def _find_record(
+        self,
+        product: str,
+        channel: str,
+        date: datetime
+    ) -> KeyRecord:
+        date = date.replace(minute=(date.minute // 10) * 10)
 
-        if channel_in_key and not channel:
-            raise ValueError(
-                f'produto {product} deve especificar um canal'
+        record = await self._index.find(product, channel, date)
+        if record is None:
+            raise Exception(
+                f'produto {product}/{channel} não encontrado às {date}'
             )
 
-        bucket = await self._s3.Bucket(self._bucket_name)
+        return record
 
-        date = date.replace(minute=(date.minute // 10) * 10)
-        prefix = f'{product}/{date.strftime("%Y/%j/%H")}'
-        date_in_key = f'_s{date.strftime("%Y%j%H%M")}'
-
-        async for obj in bucket.objects.filter(Prefix=prefix):
-            if date_in_key in obj.key:
-                if channel:
-                    if channel in obj.key:
-                        return obj.key
-                else:
-                    return obj.key
-
-        raise Exception(
-            f'produto {product}/{channel} não encontrado às {date}'
-        )
+    @property
+    def index(self) -> ListingIndex:
+        return self._index
+
+    async def latest_date(
+        self,
+        product_requests: Union[Tuple[str], str]
+    ) -> datetime:
+        """
+        Encontra o intervalo de 10 minutos mais recente em que todos os
+        produtos pedidos estão disponíveis
+        """
+        if not isinstance(product_requests, tuple):
+            product_requests = (product_requests,)
+
+        now = datetime.now(timezone.utc)
+        hours = (now, now - timedelta(hours=1))
+
+        slots = None
+        for req in product_requests:
+            product, channel = self._flatten_request(req)
+
+            available = set()
+            for hour in hours:
+                for record in await self._index.hour(product, hour):
+                    if channel and record.channel != channel:
+                        continue
+                    start = record.start
+                    available.add(start.replace(
+                        minute=(start.minute // 10) * 10,
+                        second=0,
+                        microsecond=0
+                    ))
+
+            slots = available if slots is None else slots & available
+
+        if not slots:
+            raise Exception(
+                f'nenhuma varredura recente com {product_requests}'
+            )
+
+        return max(slots)
 
     async def _fetch_product(self, product: str, channel: str, date: datetime):
-        key = await self._find_key(product, channel, date)
-        return await self._download_manager.get_file(key)
+        record = await self._find_record(product, channel, date)
+        return await self._download_manager.get_file(
+            record.key, record.etag, record.size
+        )
 
     async def get(
         self,
         product_requests: Union[Tuple[str], str],
         date: Optional[datetime] = None
     ):
-        if date is None:
-            # TODO: encontrar o mais recente de todos os produtos
-            date = datetime.now().astimezone(timezone.utc)
-            pass
-
         if not isinstance(product_requests, tuple):
             product_requests = (product_requests,)
 
+        if date is None:
+            date = await self.latest_date(product_requests)
+
         tasks = []
         for req in product_requests:
             product, channel = self._flatten_request(req)
@@ -93,10 +144,24 @@ class AWSRepository:
             )
             tasks.append(download_task)
 
-        return await asyncio.gather(*tasks)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            # libera o que foi obtido antes de propagar a falha
+            self.release([
+                r for r in results if not isinstance(r, BaseException)
+            ])
+            raise errors[0]
+
+        return results
+
+    def release(self, files):
+        """Libera os arquivos retornados por `get` (buffers em memória)"""
+        for file in files:
+            self._download_manager.release(file)
 
     async def dispose(self):
+        self._index.flush()
         await self._download_manager.dispose()
-
-        if self._s3:
-            await self._s3.__aexit__(None, None, None)
+        await self._s3.dispose()
@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - sem flock (Windows)
+    fcntl = None
+
+from goes2.metrics import registry
+
+
+class DownloadCache:
+    """
+    Cache persistente de arquivos baixados, limitado em bytes e com despejo
+    LRU. Cada arquivo tem um `.meta` com chave, ETag e tamanho; o `.meta` é
+    escrito por último (rename atômico), então um download interrompido
+    nunca é tratado como válido. Vários processos podem compartilhar o mesmo
+    diretório: commits e despejos são serializados por um flock.
+    """
+
+    def __init__(
+        self,
+        at: str = 'temp',
+        max_bytes: int = 20 * 1024 ** 3,
+        grace: float = 600
+    ):
+        self._path = Path(at)
+        self._path.mkdir(exist_ok=True, parents=True)
+        self._max_bytes = max_bytes
+
+        # arquivos usados há menos de `grace` segundos não são despejados,
+        # pois podem estar prestes a ser abertos por outro processo
+        self._grace = grace
+
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key: str) -> Path:
+        return self._path / key.split('/')[-1]
+
+    def _meta(self, key: str) -> Path:
+        file = self._file(key)
+        return file.with_name(file.name + '.meta')
+
+    @contextmanager
+    def _locked(self):
+        with open(self._path / '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _discard(self, file: Path, meta: Path):
+        # o .meta sai primeiro, invalidando a entrada para os leitores
+        for path in (meta, file):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _valid(
+        file: Path,
+        meta: Path,
+        key: str,
+        etag: Optional[str],
+        size: Optional[int]
+    ) -> Optional[bool]:
+        """
+        Se a entrada confere com a chave, o etag e o tamanho; None se ela
+        não existe
+        """
+        try:
+            with open(meta, 'r') as f:
+                info = json.load(f)
+            stat = file.stat()
+        except (OSError, ValueError):
+            return None
+
+        return (
+            info.get('key') == key and
+            stat.st_size == info.get('size') and
+            (size is None or stat.st_size == size) and
+            (not etag or info.get('etag') == etag)
+        )
+
+    def lookup(
+        self,
+        key: str,
+        etag: Optional[str] = None,
+        size: Optional[int] = None
+    ) -> Optional[Path]:
+        file = self._file(key)
+        meta = self._meta(key)
+
+        valid = self._valid(file, meta, key, etag, size)
+        if valid is None:
+            self.misses += 1
+            registry.inc('download_cache_misses_total')
+            return None
+
+        if not valid:
+            # outro processo pode ter acabado de gravar a entrada entre as
+            # duas leituras: confere de novo sob a trava antes de apagar
+            with self._locked():
+                valid = self._valid(file, meta, key, etag, size)
+                if not valid:
+                    self._discard(file, meta)
+
+        if not valid:
+            self.misses += 1
+            registry.inc('download_cache_misses_total')
+            return None
+
+        # marca o uso para o LRU
+        os.utime(file)
+        self.hits += 1
+        registry.inc('download_cache_hits_total')
+        return file
+
+    def temp_path(self, key: str) -> Path:
+        return self._path / f'.{key.split("/")[-1]}.{uuid4().hex}.part'
+
+    def commit(
+        self,
+        key: str,
+        temp: Path,
+        etag: str = '',
+        size: Optional[int] = None
+    ) -> Path:
+        # só pega arquivos curtos; o RangedDownloader pré-aloca o arquivo
+        # e confere os bytes recebidos ele mesmo
+        actual_size = os.path.getsize(temp)
+        if size is not None and actual_size != size:
+            os.remove(temp)
+            raise IOError(
+                f'download truncado de {key}: {actual_size} de {size} bytes'
+            )
+
+        file = self._file(key)
+        meta = self._meta(key)
+        meta_temp = meta.with_name(f'.{meta.name}.{uuid4().hex}.part')
+
+        with open(meta_temp, 'w') as f:
+            json.dump({'key': key, 'etag': etag, 'size': actual_size}, f)
+
+        with self._locked():
+            os.replace(temp, file)
+            os.replace(meta_temp, meta)
+            self._evict()
+
+        return file
+
+    def _evict(self):
+        entries = []
+        total = 0
+        now = time.time()
+
+        for meta in self._path.glob('*.meta'):
+            file = meta.with_name(meta.name[:-len('.meta')])
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                self._discard(file, meta)
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, file, meta))
+            total += stat.st_size
+
+        # downloads interrompidos há mais de um dia
+        for part in self._path.glob('.*.part'):
+            try:
+                if now - part.stat().st_mtime > 86400:
+                    os.remove(part)
+            except FileNotFoundError:
+                pass
+
+        entries.sort()
+        for mtime, size, file, meta in entries:
+            if total <= self._max_bytes:
+                break
+            if now - mtime < self._grace:
+                continue
+
+            self._discard(file, meta)
+            total -= size
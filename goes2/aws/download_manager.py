@@ -1,91 +1,220 @@
-import aioboto3
-from botocore import UNSIGNED
-from botocore.config import Config
-
 import asyncio
 
-from typing import Dict, Set
+from typing import Dict, Optional, Union
 from pathlib import Path
 
-import xarray as xr
+from goes2.aws.download_cache import DownloadCache
+from goes2.aws.memory import BufferPool, MemoryObject
+from goes2.aws.ranged_downloader import RangedDownloader
+from goes2.aws.remote import RemoteObject
+from goes2.aws.s3_client import S3Client
+from goes2.metrics import registry
 
 
 class DownloadManager:
-    def __init__(self, bucket_name: str = 'noaa-goes19'):
-        self._session = aioboto3.Session()
-        self._s3 = None
+    """
+    Baixa e deduplica arquivos do bucket. No modo 'disk' os arquivos vão
+    para o cache persistente em disco; no modo 'memory' vão para buffers
+    de um pool, que voltam ao pool quando todos os consumidores chamam
+    `release`; no modo 'ranges' nada é baixado de antemão e só os
+    intervalos de bytes efetivamente lidos são buscados.
+    """
+
+    MODES = ('disk', 'memory', 'ranges')
+
+    def __init__(
+        self,
+        bucket_name: str = 'noaa-goes19',
+        cache_path: str = 'temp',
+        max_cache_bytes: int = 20 * 1024 ** 3,
+        client: Optional[S3Client] = None,
+        part_size: int = 16 * 1024 ** 2,
+        max_concurrency: int = 16,
+        max_bandwidth: Optional[float] = None,
+        mode: str = 'disk'
+    ):
+        if mode not in self.MODES:
+            raise ValueError(
+                f'modo de download inválido: {mode} (use {self.MODES})'
+            )
+        self._mode = mode
+
+        self._owns_client = client is None
+        self._s3 = client or S3Client()
+        self._downloader = RangedDownloader(
+            self._s3,
+            part_size=part_size,
+            max_concurrency=max_concurrency,
+            max_bandwidth=max_bandwidth
+        )
 
-        self._downloaded_files: Set[str] = set()
-        self._pending_downloads: Dict[str, asyncio.Event] = {}
         self._download_tasks: Dict[str, asyncio.Task] = {}
         self._lock = asyncio.Lock()
 
-        self._temp_path = Path('temp')
-        self._temp_path.mkdir(exist_ok=True, parents=True)
+        self._cache = (
+            DownloadCache(cache_path, max_cache_bytes)
+            if mode == 'disk' else None
+        )
 
-        self._bucket_name = bucket_name
+        self._pool = BufferPool()
+        self._in_memory: Dict[str, MemoryObject] = {}
+        self._references: Dict[str, int] = {}
 
-    async def _get_s3_resource(self):
-        if self._s3 is None:
-            self._s3 = await self._session.resource(
-                's3',
-                config=Config(signature_version=UNSIGNED)
-            ).__aenter__()
-        return self._s3
+        self._bucket_name = bucket_name
 
-    def _get_cached_file(self, file_key: str):
-        path = self._temp_path / file_key.split('/')[-1]
-        return path
+    async def _download_file(
+        self,
+        file_key: str,
+        etag: str,
+        size: Optional[int]
+    ) -> Path:
+        temp = self._cache.temp_path(file_key)
 
-    async def _download_file(self, file_key: str, event: asyncio.Event):
         try:
-            await self._get_s3_resource()
-            bucket = await self._s3.Bucket(self._bucket_name)
-            await bucket.download_file(
-                file_key,
-                self._temp_path / file_key.split('/')[-1]
-            )
-
-            self._downloaded_files.add(file_key)
-            self._pending_downloads.pop(file_key)
+            with registry.timer('download'):
+                await self._downloader.download(
+                    self._bucket_name, file_key, temp, size
+                )
 
-            event.set()
+            return await asyncio.to_thread(
+                self._cache.commit, file_key, temp, etag, size
+            )
 
         except Exception as e:
             print(e)
+            temp.unlink(missing_ok=True)
+            raise
+
+        finally:
+            self._download_tasks.pop(file_key, None)
+
+    async def _download_to_memory(
+        self,
+        file_key: str,
+        size: Optional[int]
+    ) -> MemoryObject:
+        buffer = None
+
+        try:
+            if not size:
+                size = await self._downloader.size_of(
+                    self._bucket_name, file_key
+                )
+
+            buffer = self._pool.acquire(size)
+            view = memoryview(buffer)
+
+            def sink(offset: int, chunk: bytes):
+                view[offset:offset + len(chunk)] = chunk
+
+            with registry.timer('download'):
+                await self._downloader.download_into(
+                    self._bucket_name, file_key, size, sink
+                )
+
+            obj = MemoryObject(file_key, buffer, size)
+            if self._references.get(file_key, 0) > 0:
+                self._in_memory[file_key] = obj
+            else:
+                # todos os consumidores desistiram durante o download
+                self._pool.release(buffer)
+            return obj
+
+        except BaseException as e:
+            # download_into só volta (ou levanta) depois que todas as partes
+            # terminaram ou foram canceladas: ninguém mais escreve no buffer
+            # e ele pode voltar ao pool, inclusive num cancelamento
+            if not isinstance(e, asyncio.CancelledError):
+                print(e)
+            if buffer is not None:
+                self._pool.release(buffer)
+            raise
+
+        finally:
+            self._download_tasks.pop(file_key, None)
+
+    async def get_file(
+        self,
+        file_key: str,
+        etag: str = '',
+        size: Optional[int] = None
+    ) -> Union[Path, MemoryObject, RemoteObject]:
+        if self._mode == 'ranges':
+            if not size:
+                size = await self._downloader.size_of(
+                    self._bucket_name, file_key
+                )
+            return RemoteObject(
+                file_key,
+                self._bucket_name,
+                size,
+                self._downloader,
+                asyncio.get_running_loop()
+            )
 
-    async def get_file(self, file_key: str):
         async with self._lock:
-            # arquivo já foi baixado
-            if file_key in self._downloaded_files:
-                return self._get_cached_file(file_key)
+            if self._mode == 'memory':
+                # a referência é contada antes de esperar o download, para
+                # que outro consumidor não devolva o buffer antes da hora
+                self._references[file_key] = (
+                    self._references.get(file_key, 0) + 1
+                )
+
+                if file_key in self._in_memory:
+                    return self._in_memory[file_key]
 
             # arquivo está sendo baixado
-            if file_key in self._pending_downloads:
-                event = self._pending_downloads[file_key]
-                await event.wait()
-                return self._get_cached_file(file_key)
+            task = self._download_tasks.get(file_key)
+
+            if task is None:
+                if self._mode == 'memory':
+                    task = asyncio.create_task(
+                        self._download_to_memory(file_key, size)
+                    )
+                else:
+                    # arquivo já foi baixado (nesta ou em outra execução)
+                    cached = self._cache.lookup(file_key, etag, size)
+                    if cached is not None:
+                        return cached
+
+                    # arquivo precisa ser baixado
+                    task = asyncio.create_task(
+                        self._download_file(file_key, etag, size)
+                    )
+
+                self._download_tasks[file_key] = task
+
+        try:
+            return await asyncio.shield(task)
+        except BaseException:
+            if self._mode == 'memory':
+                self.release(file_key)
+            raise
 
-            # arquivo precisa ser baixado
-            event = asyncio.Event()
-            self._pending_downloads[file_key] = event
-            task = asyncio.create_task(self._download_file(file_key, event))
-            self._download_tasks[file_key] = task
+    def release(self, file: Union[str, Path, MemoryObject, RemoteObject]):
+        """Libera uma referência a um arquivo obtido com `get_file`"""
+        if isinstance(file, (Path, RemoteObject)):
+            return
 
-        await event.wait()
+        key = file.key if isinstance(file, MemoryObject) else file
+        if key not in self._references:
+            return
 
-        if file_key in self._downloaded_files:
-            return self._get_cached_file(file_key)
+        self._references[key] -= 1
+        if self._references[key] <= 0:
+            self._references.pop(key)
+
+            obj = self._in_memory.pop(key, None)
+            if obj is not None:
+                self._pool.release(obj.buffer)
 
     async def dispose(self):
         async with self._lock:
-            for task in self._download_tasks.values():
+            tasks = list(self._download_tasks.values())
+            for task in tasks:
                 task.cancel()
 
-            await asyncio.gather(
-                *self._download_tasks.values(),
-                return_exceptions=True
-            )
+            await asyncio.gather(*tasks, return_exceptions=True)
 
-            if self._s3:
-                await self._s3.__aexit__(None, None, None)
+            if self._owns_client:
+                await self._s3.dispose()
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from goes2.metrics import registry
+
+# OR_ABI-L2-CMIPF-M6C13_G19_s20252261900210_e20252261909518_c20252261909594.nc
+KEY_PATTERN = re.compile(
+    r'OR_(?P<product>.+?)-M(?P<mode>\d)(?:C(?P<channel>\d{2}))?'
+    r'_G(?P<sat>\d+)_s(?P<start>\d{14})_e(?P<end>\d{14})_c(?P<created>\d{14})'
+)
+
+Lister = Callable[[str], Awaitable[List[Tuple[str, int, str]]]]
+
+
+def _parse_time(value: str) -> datetime:
+    # AAAAJJJHHMMSS + décimos de segundo
+    date = datetime.strptime(value[:13], '%Y%j%H%M%S')
+    return date.replace(
+        microsecond=int(value[13]) * 100000,
+        tzinfo=timezone.utc
+    )
+
+
+@dataclass(frozen=True)
+class KeyRecord:
+    key: str
+    product: str
+    mode: str
+    channel: Optional[str]
+    start: datetime
+    end: datetime
+    created: datetime
+    size: int = 0
+    etag: str = ''
+
+    @staticmethod
+    def parse(key: str, size: int = 0, etag: str = '') -> Optional['KeyRecord']:
+        match = KEY_PATTERN.search(key.split('/')[-1])
+        if match is None:
+            return None
+
+        channel = match['channel']
+        return KeyRecord(
+            key=key,
+            product=match['product'],
+            mode=match['mode'],
+            channel=f'C{channel}' if channel else None,
+            start=_parse_time(match['start']),
+            end=_parse_time(match['end']),
+            created=_parse_time(match['created']),
+            size=size,
+            etag=etag.strip('"')
+        )
+
+    def to_json(self) -> Dict:
+        data = asdict(self)
+        for name in ('start', 'end', 'created'):
+            data[name] = data[name].isoformat()
+        return data
+
+    @staticmethod
+    def from_json(data: Dict) -> 'KeyRecord':
+        data = dict(data)
+        for name in ('start', 'end', 'created'):
+            data[name] = datetime.fromisoformat(data[name])
+        return KeyRecord(**data)
+
+
+@dataclass
+class _Entry:
+    fetched_at: float
+    records: List[KeyRecord]
+    keys: Set[str] = field(default_factory=set)
+
+    def __post_init__(self):
+        self.keys = {record.key for record in self.records}
+
+
+class ListingIndex:
+    """
+    Índice em memória das listagens de S3 por prefixo de hora
+    (`produto/AAAA/JJJ/HH`). Cada prefixo é listado uma única vez e reusado
+    até expirar o TTL; prefixos de horas já encerradas há mais de `settle`
+    não mudam mais e nunca expiram. Chamadas concorrentes para o mesmo
+    prefixo compartilham a mesma listagem.
+
+    O arquivo de `persist_path` é regravado no máximo a cada
+    `save_interval` segundos (e em `flush`).
+    """
+
+    def __init__(
+        self,
+        lister: Lister,
+        ttl: float = 60,
+        settle: timedelta = timedelta(minutes=30),
+        persist_path: Optional[str] = None,
+        save_interval: float = 30
+    ):
+        self._lister = lister
+        self._ttl = ttl
+        self._settle = settle
+        self._persist_path = Path(persist_path) if persist_path else None
+        self._save_interval = save_interval
+        self._saved_at = 0.0
+        self._dirty = False
+
+        self._entries: Dict[str, _Entry] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        self._load()
+
+    @staticmethod
+    def prefix(product: str, date: datetime) -> str:
+        return f'{product}/{date.strftime("%Y/%j/%H")}'
+
+    def _is_fresh(self, entry: _Entry, date: datetime) -> bool:
+        hour_end = (
+            date.replace(minute=0, second=0, microsecond=0) +
+            timedelta(hours=1)
+        )
+        if hour_end.tzinfo is None:
+            hour_end = hour_end.replace(tzinfo=timezone.utc)
+
+        fetched_at = datetime.fromtimestamp(entry.fetched_at, timezone.utc)
+        if fetched_at - hour_end > self._settle:
+            return True
+
+        return time.time() - entry.fetched_at < self._ttl
+
+    async def _fetch(self, prefix: str) -> List[KeyRecord]:
+        with registry.timer('listing'):
+            objects = await self._lister(prefix)
+
+        records = []
+        for key, size, etag in objects:
+            record = KeyRecord.parse(key, size, etag)
+            if record is not None:
+                records.append(record)
+
+        self._entries[prefix] = _Entry(time.time(), records)
+        self._save()
+        return records
+
+    async def hour(
+        self,
+        product: str,
+        date: datetime,
+        refresh: bool = False
+    ) -> List[KeyRecord]:
+        prefix = self.prefix(product, date)
+
+        entry = self._entries.get(prefix)
+        if entry is not None and not refresh and self._is_fresh(entry, date):
+            self.hits += 1
+            registry.inc('listing_cache_hits_total')
+            return entry.records
+
+        self.misses += 1
+        registry.inc('listing_cache_misses_total')
+
+        task = self._inflight.get(prefix)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(prefix))
+            self._inflight[prefix] = task
+            task.add_done_callback(
+                lambda _: self._inflight.pop(prefix, None)
+            )
+
+        # shield: o cancelamento de um chamador não cancela os demais
+        return await asyncio.shield(task)
+
+    def add(self, record: KeyRecord):
+        """Inclui um objeto recém-notificado numa listagem já em memória"""
+        prefix = record.key.rsplit('/', 1)[0]
+        entry = self._entries.get(prefix)
+        if entry is None:
+            return
+
+        if record.key not in entry.keys:
+            entry.keys.add(record.key)
+            entry.records.append(record)
+
+    def prune(self, before: datetime) -> int:
+        """
+        Esquece as listagens das horas anteriores a `before` (o modo
+        contínuo só consulta as recentes); devolve quantas foram removidas
+        """
+        hour = before.strftime('%Y/%j/%H')
+        old = [
+            prefix for prefix in self._entries
+            if prefix[-len(hour):] < hour
+        ]
+        for prefix in old:
+            del self._entries[prefix]
+
+        if old:
+            self._save()
+        return len(old)
+
+    async def find(
+        self,
+        product: str,
+        channel: Optional[str],
+        date: datetime
+    ) -> Optional[KeyRecord]:
+        """
+        Encontra o arquivo mais recente do produto/canal cujo início da
+        varredura cai no intervalo de 10 minutos de `date`
+        """
+        records = await self.hour(product, date)
+
+        if channel is None and any(r.channel for r in records):
+            raise ValueError(
+                f'produto {product} deve especificar um canal'
+            )
+
+        date_in_key = f'_s{date.strftime("%Y%j%H%M")[:-1]}'
+
+        found = None
+        for record in records:
+            if date_in_key not in record.key:
+                continue
+            if channel and record.channel != channel:
+                continue
+            if found is None or record.created > found.created:
+                found = record
+
+        return found
+
+    def _load(self):
+        if self._persist_path is None or not self._persist_path.exists():
+            return
+
+        try:
+            with open(self._persist_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        for prefix, entry in data.items():
+            self._entries[prefix] = _Entry(
+                entry['fetched_at'],
+                [KeyRecord.from_json(r) for r in entry['records']]
+            )
+
+    def flush(self):
+        """Grava as listagens pendentes"""
+        if self._dirty:
+            self._save(force=True)
+
+    def _save(self, force: bool = False):
+        if self._persist_path is None:
+            return
+
+        self._dirty = True
+        if not force and time.time() - self._saved_at < self._save_interval:
+            return
+        self._dirty = False
+        self._saved_at = time.time()
+
+        data = {
+            prefix: {
+                'fetched_at': entry.fetched_at,
+                'records': [r.to_json() for r in entry.records]
+            }
+            for prefix, entry in self._entries.items()
+        }
+
+        self._persist_path.parent.mkdir(exist_ok=True, parents=True)
+        temp = self._persist_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temp, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp, self._persist_path)
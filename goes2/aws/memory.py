@@ -0,0 +1,85 @@
+import io
+import threading
+from dataclasses import dataclass
+from typing import List
+
+
+class BufferPool:
+    """
+    Pool de buffers reutilizáveis, para que os downloads em memória não
+    aloquem (e zerem) centenas de MB a cada varredura
+    """
+
+    def __init__(self, max_idle_bytes: int = 4 * 1024 ** 3):
+        self._max_idle_bytes = max_idle_bytes
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> bytearray:
+        with self._lock:
+            # o menor buffer livre que comporte o objeto, sem desperdiçar
+            # mais que o dobro do tamanho pedido
+            candidates = [
+                buffer for buffer in self._free
+                if size <= len(buffer) <= 2 * size
+            ]
+            if candidates:
+                buffer = min(candidates, key=len)
+                self._free.remove(buffer)
+                return buffer
+
+        return bytearray(size)
+
+    def release(self, buffer: bytearray):
+        with self._lock:
+            self._free.append(buffer)
+
+            # descarta os maiores até caber no limite de memória ociosa
+            self._free.sort(key=len)
+            while sum(len(b) for b in self._free) > self._max_idle_bytes:
+                self._free.pop()
+
+
+class MemoryFile(io.RawIOBase):
+    """Arquivo somente leitura sobre um buffer, sem cópia"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = len(self._view) + offset
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), len(self._view))
+        size = max(end - self._position, 0)
+        buffer[:size] = self._view[self._position:end]
+        self._position += size
+        return size
+
+
+@dataclass
+class MemoryObject:
+    """Objeto do S3 baixado para um buffer do pool"""
+
+    key: str
+    buffer: bytearray
+    size: int
+
+    def open(self) -> MemoryFile:
+        return MemoryFile(memoryview(self.buffer)[:self.size])
@@ -0,0 +1,96 @@
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from goes2.aws.listing_index import KeyRecord, ListingIndex
+
+
+class ScanSource(ABC):
+    """Fonte de notificações de novos objetos no bucket"""
+
+    @abstractmethod
+    def events(self) -> AsyncIterator[KeyRecord]:
+        pass
+
+
+class PollingSource(ScanSource):
+    """
+    Consulta periodicamente o prefixo da hora corrente (e o da hora
+    anterior, nos primeiros minutos da hora) de cada produto, emitindo cada
+    objeto novo uma única vez. As listagens passam pelo `ListingIndex`, que
+    fica atualizado para os demais consumidores.
+    """
+
+    def __init__(
+        self,
+        index: ListingIndex,
+        products: Iterable[str],
+        interval: float = 20,
+        late_minutes: int = 15
+    ):
+        self._index = index
+        self._products = sorted(set(products))
+        self._interval = interval
+        self._late_minutes = late_minutes
+        self._seen: Dict[str, Set[str]] = {}
+
+    def _hours(self, now: datetime):
+        hours = [now]
+        if now.minute < self._late_minutes:
+            hours.insert(0, now - timedelta(hours=1))
+        return hours
+
+    async def events(self) -> AsyncIterator[KeyRecord]:
+        while True:
+            now = datetime.now(timezone.utc)
+            hours = self._hours(now)
+
+            for product in self._products:
+                for hour in hours:
+                    prefix = ListingIndex.prefix(product, hour)
+
+                    try:
+                        records = await self._index.hour(
+                            product, hour, refresh=True
+                        )
+                    except Exception as e:
+                        print(f'falha ao listar {prefix}: {e}')
+                        continue
+
+                    seen = self._seen.setdefault(prefix, set())
+                    for record in sorted(records, key=lambda r: r.end):
+                        if record.key not in seen:
+                            seen.add(record.key)
+                            yield record
+
+            # esquece os prefixos que não são mais consultados
+            current = {
+                ListingIndex.prefix(product, hour)
+                for product in self._products for hour in hours
+            }
+            for prefix in list(self._seen):
+                if prefix not in current:
+                    self._seen.pop(prefix)
+
+            await asyncio.sleep(self._interval)
+
+
+class QueueSource(ScanSource):
+    """
+    Fonte alimentada externamente (por exemplo, por um consumidor da fila
+    SNS/SQS de novos objetos do bucket) através de `put`
+    """
+
+    def __init__(self, queue: Optional[asyncio.Queue] = None):
+        self._queue = queue or asyncio.Queue()
+
+    async def put(self, key: str, size: int = 0, etag: str = ''):
+        await self._queue.put((key, size, etag))
+
+    async def events(self) -> AsyncIterator[KeyRecord]:
+        while True:
+            key, size, etag = await self._queue.get()
+            record = KeyRecord.parse(key, size, etag)
+            if record is not None:
+                yield record
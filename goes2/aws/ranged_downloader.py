@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from goes2.aws.s3_client import S3Client
+from goes2.metrics import registry
+
+Sink = Callable[[int, bytes], None]
+
+
+class TokenBucket:
+    """Limitador de banda global, em bytes por segundo"""
+
+    def __init__(self, rate: Optional[float] = None):
+        self._rate = rate
+        self._tokens = rate or 0
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: int):
+        if not self._rate:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._rate,
+                self._tokens + (now - self._last) * self._rate
+            )
+            self._last = now
+
+            # o saldo pode ficar negativo; a espera paga a dívida
+            self._tokens -= amount
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self._rate)
+
+
+class RangedDownloader:
+    """
+    Baixa objetos grandes em partes concorrentes (GETs com Range), limitando
+    a concorrência por host e a banda total
+    """
+
+    def __init__(
+        self,
+        client: S3Client,
+        part_size: int = 16 * 1024 ** 2,
+        max_concurrency: int = 16,
+        max_bandwidth: Optional[float] = None,
+        read_size: int = 1024 ** 2,
+        retries: int = 3
+    ):
+        self._client = client
+        self._part_size = part_size
+        self._max_concurrency = max_concurrency
+        self._read_size = read_size
+        self._retries = retries
+
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._bandwidth = TokenBucket(max_bandwidth)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        host = self._client.host
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphores[host]
+
+    async def size_of(self, bucket: str, key: str) -> int:
+        client = await self._client.get()
+        head = await client.head_object(Bucket=bucket, Key=key)
+        return head['ContentLength']
+
+    async def _fetch_part(
+        self,
+        bucket: str,
+        key: str,
+        start: int,
+        end: int,
+        sink: Sink
+    ) -> int:
+        """Baixa a parte [start, end]; devolve os bytes entregues"""
+        client = await self._client.get()
+
+        for attempt in range(self._retries):
+            offset = start
+            try:
+                async with self._semaphore():
+                    response = await client.get_object(
+                        Bucket=bucket,
+                        Key=key,
+                        Range=f'bytes={start}-{end}'
+                    )
+
+                    async with response['Body'] as body:
+                        while True:
+                            chunk = await body.read(self._read_size)
+                            if not chunk:
+                                break
+
+                            await self._bandwidth.acquire(len(chunk))
+                            sink(offset, chunk)
+                            offset += len(chunk)
+                            registry.inc('download_bytes_total', len(chunk))
+
+                if offset != end + 1:
+                    raise IOError(
+                        f'parte {start}-{end} de {key} incompleta'
+                    )
+                return offset - start
+
+            except Exception:
+                if attempt == self._retries - 1:
+                    raise
+                registry.inc('download_retries_total')
+
+    async def download_into(
+        self,
+        bucket: str,
+        key: str,
+        size: int,
+        sink: Sink
+    ) -> int:
+        """Baixa o objeto em partes para `sink`; devolve os bytes"""
+        parts = [
+            (start, min(start + self._part_size, size) - 1)
+            for start in range(0, size, self._part_size)
+        ]
+
+        tasks = [
+            asyncio.ensure_future(
+                self._fetch_part(bucket, key, start, end, sink)
+            )
+            for start, end in parts
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            # com uma parte falha (ou o download cancelado), as demais são
+            # canceladas e esperadas: nenhuma escreve no destino depois do
+            # retorno, quando o arquivo já foi fechado ou o buffer liberado
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for task in tasks:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        return sum(task.result() for task in tasks)
+
+    async def fetch_range(
+        self,
+        bucket: str,
+        key: str,
+        start: int,
+        end: int
+    ) -> bytearray:
+        """Baixa o intervalo [start, end] (inclusivo) do objeto"""
+        buffer = bytearray(end - start + 1)
+        view = memoryview(buffer)
+
+        def sink(offset: int, chunk: bytes):
+            view[offset - start:offset - start + len(chunk)] = chunk
+
+        await self._fetch_part(bucket, key, start, end, sink)
+        return buffer
+
+    async def download(
+        self,
+        bucket: str,
+        key: str,
+        dest: Path,
+        size: Optional[int] = None
+    ):
+        if not size:
+            size = await self.size_of(bucket, key)
+
+        fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            written = await self.download_into(
+                bucket, key, size,
+                lambda offset, chunk: os.pwrite(fd, chunk, offset)
+            )
+        finally:
+            os.close(fd)
+
+        # o arquivo já nasce com o tamanho final (ftruncate): o tamanho em
+        # disco não revela um download incompleto, os bytes recebidos sim
+        if written != size:
+            raise IOError(
+                f'download truncado de {key}: {written} de {size} bytes'
+            )
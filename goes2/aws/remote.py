@@ -0,0 +1,117 @@
+import asyncio
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from goes2.aws.ranged_downloader import RangedDownloader
+
+
+class S3RangeFile(io.RawIOBase):
+    """
+    Arquivo somente leitura sobre um objeto do S3, que busca sob demanda
+    apenas os blocos lidos (metadados HDF5 e os chunks necessários). As
+    leituras são síncronas e delegadas ao loop de eventos do downloader,
+    por isso o arquivo deve ser lido fora da thread do loop.
+    """
+
+    def __init__(
+        self,
+        obj: 'RemoteObject',
+        block_size: int = 1024 ** 2,
+        max_blocks: int = 256
+    ):
+        self._obj = obj
+        self._position = 0
+        self._block_size = block_size
+        self._max_blocks = max_blocks
+        self._blocks: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.fetched_bytes = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self._obj.size + offset
+        return self._position
+
+    def _fetch(self, first: int, last: int):
+        """Busca os blocos [first, last] ausentes num único GET"""
+        start = first * self._block_size
+        end = min((last + 1) * self._block_size, self._obj.size) - 1
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._obj.downloader.fetch_range(
+                self._obj.bucket, self._obj.key, start, end
+            ),
+            self._obj.loop
+        )
+        data = future.result()
+        self.fetched_bytes += len(data)
+
+        for index in range(first, last + 1):
+            offset = (index - first) * self._block_size
+            self._blocks[index] = bytes(
+                data[offset:offset + self._block_size]
+            )
+
+    def _block(self, index: int) -> bytes:
+        block = self._blocks[index]
+        self._blocks.move_to_end(index)
+        return block
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), self._obj.size)
+        if end <= self._position:
+            return 0
+
+        first = self._position // self._block_size
+        last = (end - 1) // self._block_size
+
+        with self._lock:
+            missing = [i for i in range(first, last + 1)
+                       if i not in self._blocks]
+            if missing:
+                self._fetch(missing[0], missing[-1])
+
+            written = 0
+            for index in range(first, last + 1):
+                block = self._block(index)
+                block_start = index * self._block_size
+                lo = max(self._position, block_start) - block_start
+                hi = min(end, block_start + len(block)) - block_start
+                buffer[written:written + hi - lo] = block[lo:hi]
+                written += hi - lo
+
+            while len(self._blocks) > self._max_blocks:
+                self._blocks.popitem(last=False)
+
+        self._position += written
+        return written
+
+
+@dataclass
+class RemoteObject:
+    """Objeto do S3 lido por intervalos de bytes, sem download completo"""
+
+    key: str
+    bucket: str
+    size: int
+    downloader: RangedDownloader
+    loop: asyncio.AbstractEventLoop
+
+    def open(self) -> S3RangeFile:
+        return S3RangeFile(self)
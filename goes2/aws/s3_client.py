@@ -0,0 +1,58 @@
+import asyncio
+from typing import Optional
+from urllib.parse import urlparse
+
+import aioboto3
+from botocore import UNSIGNED
+from botocore.config import Config
+
+
+class S3Client:
+    """
+    Cliente S3 único, com um pool de conexões compartilhado por todo o
+    tráfego (listagens e downloads)
+    """
+
+    def __init__(
+        self,
+        max_pool_connections: int = 64,
+        endpoint_url: Optional[str] = None
+    ):
+        self._session = aioboto3.Session()
+        self._config = Config(
+            signature_version=UNSIGNED,
+            max_pool_connections=max_pool_connections,
+            retries={'max_attempts': 5, 'mode': 'adaptive'},
+            # serviços compatíveis (MinIO, o servidor dos benchmarks) não
+            # resolvem o bucket como subdomínio
+            s3={'addressing_style': 'path'} if endpoint_url else None
+        )
+        self._endpoint_url = endpoint_url
+
+        self._context = None
+        self._client = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def host(self) -> str:
+        if self._endpoint_url:
+            return urlparse(self._endpoint_url).netloc
+        return 's3.amazonaws.com'
+
+    async def get(self):
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._context = self._session.client(
+                        's3',
+                        config=self._config,
+                        endpoint_url=self._endpoint_url
+                    )
+                    self._client = await self._context.__aenter__()
+        return self._client
+
+    async def dispose(self):
+        if self._context is not None:
+            await self._context.__aexit__(None, None, None)
+            self._context = None
+            self._client = None
@@ -0,0 +1,195 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from goes2.metrics import registry
+from goes2.product import Product
+
+
+@dataclass
+class _Job:
+    product: Product
+    date: datetime
+    files: List[Any]
+    reprojs: Optional[List[Any]] = None
+    reserved: int = 0
+
+
+class Backfill:
+    """
+    Reprocessa um intervalo de tempo num pipeline de três estágios
+    (download -> decodificação/reprojeção -> rasterização) ligados por filas
+    limitadas: o próximo intervalo é baixado enquanto o atual é renderizado,
+    e a memória não cresce com o tamanho do intervalo. Produtos já presentes
+    no armazenamento são pulados, então uma execução interrompida pode ser
+    retomada com os mesmos argumentos.
+    """
+
+    def __init__(
+        self,
+        goes2,
+        products: List[Product],
+        start: datetime,
+        end: datetime,
+        cadence: timedelta = timedelta(minutes=10),
+        queue_size: int = 2,
+        decoders: int = 2,
+        renderers: int = 2
+    ):
+        if end < start:
+            raise ValueError(f'intervalo inválido: {start} > {end}')
+
+        self._goes2 = goes2
+        self._products = products
+        self._start = start
+        self._end = end
+        self._cadence = cadence
+        self._decoders = decoders
+        self._renderers = renderers
+
+        # filas medidas em intervalos de tempo, não em produtos
+        maxsize = max(queue_size * len(products), 1)
+        self._decode_queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._render_queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def dates(self):
+        date = self._start
+        while date <= self._end:
+            yield date
+            date += self._cadence
+
+    async def _fetch(
+        self,
+        product: Product,
+        date: datetime
+    ) -> Optional[_Job]:
+        try:
+            with registry.timer('fetch', product=product.name):
+                files = await self._goes2._repo.get(product.uses, date)
+            return _Job(product, date, files)
+        except Exception as e:
+            print(f'falha ao baixar {product.name} das {date}: {e}')
+            self._fail()
+            self._goes2._release_inputs(product, date)
+            return None
+
+    def _fail(self):
+        self.failed += 1
+        registry.inc('products_total', status='failed')
+
+    def _queue_depths(self):
+        registry.set('queue_depth', self._decode_queue.qsize(), queue='decode')
+        registry.set('queue_depth', self._render_queue.qsize(), queue='render')
+
+    async def _download_stage(self):
+        for date in self.dates():
+            pending = []
+            products = []
+            for product in self._products:
+                # SQLite e glob: fora do loop de eventos
+                if await asyncio.to_thread(
+                    self._goes2._exists, product, date
+                ):
+                    self.skipped += 1
+                    registry.inc('products_total', status='skipped')
+                    continue
+                products.append(product)
+                pending.append(self._fetch(product, date))
+
+            # entradas comuns aos produtos do intervalo são decodificadas
+            # uma vez só
+            self._goes2._expect_inputs(products, date)
+
+            # os downloads de um mesmo intervalo correm juntos; put bloqueia
+            # quando a decodificação está atrasada
+            for job in await asyncio.gather(*pending):
+                if job is not None:
+                    await self._decode_queue.put(job)
+                    self._queue_depths()
+
+        for _ in range(self._decoders):
+            await self._decode_queue.put(None)
+
+    def _release(self, job: _Job):
+        self._goes2._repo.release(job.files)
+        self._goes2._release_inputs(job.product, job.date)
+        job.files = []
+        job.reprojs = None
+
+        if job.reserved:
+            self._goes2._budget.release(job.reserved)
+            job.reserved = 0
+
+    async def _decode_stage(self):
+        while (job := await self._decode_queue.get()) is not None:
+            self._queue_depths()
+            try:
+                with registry.labels(product=job.product.name):
+                    # a reserva vale da decodificação até o fim da
+                    # rasterização
+                    nbytes = await asyncio.to_thread(
+                        self._goes2._estimate, job.product, job.files
+                    )
+                    await self._goes2._budget.acquire(nbytes)
+                    job.reserved = nbytes
+
+                    job.reprojs = await asyncio.to_thread(
+                        self._goes2._decode,
+                        job.files, job.product, job.date
+                    )
+            except Exception as e:
+                print(f'falha ao decodificar {job.product.name}: {e}')
+                self._fail()
+                self._release(job)
+                continue
+
+            await self._render_queue.put(job)
+            self._queue_depths()
+
+    async def _render_stage(self):
+        while (job := await self._render_queue.get()) is not None:
+            self._queue_depths()
+            try:
+                print(f'produzindo {job.product.name} das {job.date}')
+                await asyncio.to_thread(
+                    self._goes2._render, job.product, job.reprojs, job.date
+                )
+                self.done += 1
+                registry.inc('products_total', status='done')
+            except Exception as e:
+                print(f'falha ao produzir {job.product.name}: {e}')
+                self._fail()
+            finally:
+                self._release(job)
+                await asyncio.to_thread(registry.export)
+
+    async def run(self):
+        renderers = [
+            asyncio.create_task(self._render_stage())
+            for _ in range(self._renderers)
+        ]
+        decoders = [
+            asyncio.create_task(self._decode_stage())
+            for _ in range(self._decoders)
+        ]
+
+        try:
+            await self._download_stage()
+            await asyncio.gather(*decoders)
+
+            for _ in range(self._renderers):
+                await self._render_queue.put(None)
+            await asyncio.gather(*renderers)
+        finally:
+            for task in decoders + renderers:
+                task.cancel()
+
+        print(
+            f'backfill concluído: {self.done} gerados, '
+            f'{self.skipped} já existentes, {self.failed} falhas'
+        )
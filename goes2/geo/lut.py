@@ -0,0 +1,204 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+from uuid import uuid4
+
+import numpy as np
+from pyproj import Transformer
+
+
+@dataclass(frozen=True)
+class TargetGrid:
+    """Grade regular de destino (centros dos pixels) num CRS projetado"""
+
+    crs: str
+    resolution: float
+    minx: float
+    maxy: float
+    width: int
+    height: int
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.minx + (np.arange(self.width) + 0.5) * self.resolution
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.maxy - (np.arange(self.height) + 0.5) * self.resolution
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        return (
+            self.minx,
+            self.maxy - self.height * self.resolution,
+            self.minx + self.width * self.resolution,
+            self.maxy
+        )
+
+
+@dataclass(frozen=True)
+class SourceGrid:
+    """Grade geoestacionária de origem, em metros no plano da projeção"""
+
+    crs: str
+    x0: float
+    dx: float
+    y0: float
+    dy: float
+    width: int
+    height: int
+
+    @staticmethod
+    def from_coords(crs: str, x: np.ndarray, y: np.ndarray) -> 'SourceGrid':
+        return SourceGrid(
+            crs=crs,
+            x0=float(x[0]),
+            dx=float(x[1] - x[0]),
+            y0=float(y[0]),
+            dy=float(y[1] - y[0]),
+            width=len(x),
+            height=len(y)
+        )
+
+
+class ReprojectionLUT:
+    """
+    Mapa de índices destino -> origem para reprojeção por vizinho mais
+    próximo. Cada pixel do destino guarda o índice linear do pixel de origem
+    (ou -1 quando cai fora do disco).
+    """
+
+    def __init__(self, grid: TargetGrid, index: np.ndarray):
+        self.grid = grid
+        self.index = index
+
+    @staticmethod
+    def build(
+        source: SourceGrid,
+        grid: TargetGrid,
+        rows_per_block: int = 256
+    ) -> np.ndarray:
+        transformer = Transformer.from_crs(
+            grid.crs, source.crs, always_xy=True
+        )
+
+        xs = grid.x
+        ys = grid.y
+        index = np.empty((grid.height, grid.width), dtype=np.int32)
+
+        # processa em blocos de linhas para limitar os temporários
+        for r0 in range(0, grid.height, rows_per_block):
+            r1 = min(r0 + rows_per_block, grid.height)
+            gx, gy = np.meshgrid(xs, ys[r0:r1])
+            sx, sy = transformer.transform(gx, gy)
+
+            with np.errstate(invalid='ignore'):
+                col = np.rint((sx - source.x0) / source.dx)
+                row = np.rint((sy - source.y0) / source.dy)
+
+            valid = (
+                np.isfinite(col) & np.isfinite(row) &
+                (col >= 0) & (col < source.width) &
+                (row >= 0) & (row < source.height)
+            )
+
+            block = np.full(col.shape, -1, dtype=np.int64)
+            block[valid] = (
+                row[valid].astype(np.int64) * source.width +
+                col[valid].astype(np.int64)
+            )
+            index[r0:r1] = block
+
+        return index
+
+    def gather(
+        self,
+        values: np.ndarray,
+        fill,
+        rows_per_block: int = 512
+    ) -> np.ndarray:
+        flat = values.reshape(-1)
+        out = np.empty(self.index.shape, dtype=values.dtype)
+
+        for r0 in range(0, self.grid.height, rows_per_block):
+            r1 = min(r0 + rows_per_block, self.grid.height)
+            idx = self.index[r0:r1]
+
+            # mode='clip' evita um temporário para os índices inválidos,
+            # que são sobrescritos logo em seguida
+            np.take(flat, idx, out=out[r0:r1], mode='clip')
+            out[r0:r1][idx < 0] = fill
+
+        return out
+
+
+class LUTCache:
+    """
+    Cache de LUTs de reprojeção em disco (arrays memory-mapped) e em memória
+    """
+
+    def __init__(self, at: str = 'cache/reprojection'):
+        self._path = Path(at)
+        self._luts: Dict[str, ReprojectionLUT] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(sat: str, source: SourceGrid, grid: TargetGrid) -> str:
+        description = repr((
+            sat,
+            source.width, source.height,
+            round(source.x0, 3), round(source.dx, 6),
+            round(source.y0, 3), round(source.dy, 6),
+            grid.crs, grid.resolution,
+            tuple(round(b, 3) for b in grid.bounds)
+        ))
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def get(
+        self,
+        sat: str,
+        source: SourceGrid,
+        grid: TargetGrid
+    ) -> ReprojectionLUT:
+        key = self._key(sat, source, grid)
+
+        lut = self._luts.get(key)
+        if lut is not None:
+            return lut
+
+        # os produtos de mesma resolução compartilham a LUT: só uma thread
+        # a constrói, as outras esperam e a reaproveitam
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        with lock:
+            lut = self._luts.get(key)
+            if lut is not None:
+                return lut
+
+            file = self._path / f'{key}.npy'
+            if not file.exists():
+                self._path.mkdir(exist_ok=True, parents=True)
+                print(f'construindo LUT de reprojeção {key[:8]} para {sat}')
+
+                index = ReprojectionLUT.build(source, grid)
+
+                # escrita atômica: outro processo pode estar lendo o cache
+                temp = self._path / f'.{key}.{uuid4().hex}.tmp.npy'
+                np.save(temp, index)
+                os.replace(temp, file)
+
+            lut = ReprojectionLUT(grid, np.load(file, mmap_mode='r'))
+            self._luts[key] = lut
+            return lut
+
+    def __getstate__(self):
+        # memmaps não devem ser serializados; são reabertos sob demanda
+        return {'_path': self._path}
+
+    def __setstate__(self, state):
+        self.__init__(state['_path'])
@@ -1,52 +1,329 @@
-import os
+import math
 import xarray as xr
 from abc import ABC, abstractmethod
+from typing import Optional, Tuple
 
-from rasterio.enums import Resampling
+import numpy as np
+import rioxarray  # noqa: F401 (registra o acessor .rio)
+from affine import Affine
+from pyproj import Transformer
+from rasterio.warp import calculate_default_transform
 
+from goes2.geo.lut import LUTCache, SourceGrid, TargetGrid
+from goes2.metrics import registry
 from goes2.sats import GOES19
 
-import dask.array as da
+import dask
+import dask.array
+
+
+DECIMATION = ('mean', 'nearest')
 
 
 class Projection(ABC):
     @abstractmethod
-    def reproject(self, data: xr.Dataset):
+    def reproject(self, data: xr.Dataset, decimation: str = 'mean'):
         pass
 
+    def window(self, data: xr.Dataset) -> xr.Dataset:
+        """Parte do dataset efetivamente lida pela reprojeção"""
+        return data
+
+    def decimate(self, data: xr.Dataset, method: str = 'mean') -> xr.Dataset:
+        """Dataset reduzido para a resolução de saída, antes da reprojeção"""
+        return data
+
+    def output_shape(self, data: xr.Dataset) -> Tuple[int, int]:
+        """Dimensões (y, x) da saída, sem reprojetar"""
+        return data.sizes['y'], data.sizes['x']
+
 
 class WebMercator(Projection):
-    def _crop(self, data: xr.Dataset):
-        bounds_future = data.rio.bounds()
-        minx, miny, maxx, maxy = da.compute(*bounds_future)
+    def __init__(
+        self,
+        resolution: float = 2000,
+        cache_dir: str = 'cache/reprojection',
+        bbox: Optional[Tuple[float, float, float, float]] = None
+    ):
+        """
+        Args:
+            resolution: Resolução de saída, em metros. Bandas mais finas
+            que ela são reduzidas já na leitura; resoluções grosseiras
+            (8000, 16000) servem de prévias rápidas
+            cache_dir: Diretório das LUTs de reprojeção
+            bbox: Região de interesse (lon_min, lat_min, lon_max, lat_max),
+            em graus. Se informada, só a janela do disco que a cobre é lida
+            e a saída é recortada nela; senão usa o recorte do disco todo.
+        """
+        self._crs = 'EPSG:3857'
+        self._resolution = resolution
+        self._luts = LUTCache(cache_dir)
+        self._bbox = bbox
+
+    def _box(
+        self,
+        grid: Optional[TargetGrid]
+    ) -> Tuple[float, float, float, float]:
+        if self._bbox is not None:
+            # lon/lat -> mercator é separável, os cantos bastam
+            transformer = Transformer.from_crs(
+                'EPSG:4326', self._crs, always_xy=True
+            )
+            lon_min, lat_min, lon_max, lat_max = self._bbox
+            box_minx, box_miny = transformer.transform(lon_min, lat_min)
+            box_maxx, box_maxy = transformer.transform(lon_max, lat_max)
+            return box_minx, box_miny, box_maxx, box_maxy
 
+        minx, miny, maxx, maxy = grid.bounds
         size = min(maxx - minx, maxy - miny) * 0.87
-        box = (
+        return (
             (minx + maxx)/2 - size/2,  # minx
             (miny + maxy)/2 - size/1.8,  # miny
             (minx + maxx)/2 + size/2,  # maxx
             (miny + maxy)/2 + size/1.8  # maxy
         )
 
-        # Process in chunks
-        return data.rio.clip_box(*box).persist()
+    def _crop(self, grid: TargetGrid) -> TargetGrid:
+        minx, miny, maxx, maxy = grid.bounds
+        box = self._box(grid)
+
+        res = grid.resolution
+        col0 = max(int(math.floor((box[0] - minx) / res)), 0)
+        col1 = min(int(math.ceil((box[2] - minx) / res)), grid.width)
+        row0 = max(int(math.floor((maxy - box[3]) / res)), 0)
+        row1 = min(int(math.ceil((maxy - box[1]) / res)), grid.height)
+
+        return TargetGrid(
+            crs=grid.crs,
+            resolution=res,
+            minx=minx + col0 * res,
+            maxy=maxy - row0 * res,
+            width=col1 - col0,
+            height=row1 - row0
+        )
+
+    def _target_grid(self, source: SourceGrid) -> TargetGrid:
+        if self._bbox is not None:
+            # grade alinhada à resolução, independente da janela de origem,
+            # para que todos os canais caiam na mesma grade
+            res = self._resolution
+            box_minx, box_miny, box_maxx, box_maxy = self._box(None)
+            minx = math.floor(box_minx / res) * res
+            maxy = math.ceil(box_maxy / res) * res
+
+            return TargetGrid(
+                crs=self._crs,
+                resolution=res,
+                minx=minx,
+                maxy=maxy,
+                width=int(math.ceil((box_maxx - minx) / res)),
+                height=int(math.ceil((maxy - box_miny) / res))
+            )
+
+        left = source.x0 - source.dx / 2
+        top = source.y0 - source.dy / 2
+        right = left + source.dx * source.width
+        bottom = top + source.dy * source.height
+
+        transform, width, height = calculate_default_transform(
+            source.crs, self._crs,
+            source.width, source.height,
+            left, bottom, right, top,
+            resolution=self._resolution
+        )
+
+        grid = TargetGrid(
+            crs=self._crs,
+            resolution=self._resolution,
+            minx=transform.c,
+            maxy=transform.f,
+            width=width,
+            height=height
+        )
+        return self._crop(grid)
+
+    def window(self, data: xr.Dataset, margin: int = 2) -> xr.Dataset:
+        """
+        Recorta o dataset (ainda preguiçoso) na janela da grade de ângulos de
+        varredura que cobre a bbox, para que só os chunks HDF5 que a
+        intersectam sejam lidos e descomprimidos
+        """
+        if self._bbox is None:
+            return data
+
+        lon_min, lat_min, lon_max, lat_max = self._bbox
+        lon, lat = np.meshgrid(
+            np.linspace(lon_min, lon_max, 64),
+            np.linspace(lat_min, lat_max, 64)
+        )
+
+        transformer = Transformer.from_crs(
+            'EPSG:4326', ' '.join(GOES19.crs.split()), always_xy=True
+        )
+        sx, sy = transformer.transform(lon, lat)
+
+        valid = np.isfinite(sx) & np.isfinite(sy)
+        if not valid.any():
+            raise ValueError(
+                f'bbox {self._bbox} fora do disco visto por {GOES19.name}'
+            )
+
+        # ângulos de varredura, em radianos
+        sx = sx[valid] / GOES19.height
+        sy = sy[valid] / GOES19.height
+
+        x = data.x.values
+        y = data.y.values
+
+        # x é crescente e y decrescente na grade do ABI
+        col0 = np.searchsorted(x, sx.min()) - margin
+        col1 = np.searchsorted(x, sx.max()) + margin
+        row0 = len(y) - np.searchsorted(y[::-1], sy.max()) - margin
+        row1 = len(y) - np.searchsorted(y[::-1], sy.min()) + margin
+
+        # início alinhado ao fator de dizimação, para que os blocos médios
+        # caiam sempre nos mesmos pixels de origem
+        factor = self._factor(data)
+        col0 = max(col0, 0) // factor * factor
+        row0 = max(row0, 0) // factor * factor
+
+        return data.isel(
+            x=slice(col0, min(col1, len(x))),
+            y=slice(row0, min(row1, len(y)))
+        )
+
+    def _factor(self, data: xr.Dataset) -> int:
+        """
+        Quantos pixels de origem cabem num pixel de saída, no nadir (onde o
+        pixel do ABI é menor): 4 para o C02 (0.5 km) a 2 km
+        """
+        if data.sizes.get('x', 0) < 2:
+            return 1
+
+        # o pixel nominal (0.5/1/2 km) é ligeiramente maior no nadir
+        # (501.004 m, 1002.009 m, 2004.017 m): arredonda, não trunca
+        source = abs(float(data.x[1] - data.x[0])) * GOES19.height
+        return max(round(self._resolution / source), 1)
+
+    @staticmethod
+    def _aligned_chunks(var: xr.DataArray, factor: int) -> dict:
+        """
+        Chunks dask múltiplos do fator e dos chunks HDF5 do arquivo: cada
+        bloco médio fica inteiro num chunk e cada chunk HDF5 é lido uma vez
+        """
+        storage = var.encoding.get('chunksizes') or (factor, factor)
+        chunks = {}
+        for dim, stored, current in zip(var.dims, storage, var.data.chunks):
+            base = math.lcm(int(stored), factor)
+            chunks[dim] = max(current[0] // base, 1) * base
+        return chunks
+
+    def decimate(self, data: xr.Dataset, method: str = 'mean') -> xr.Dataset:
+        """
+        Reduz a origem para a resolução de saída enquanto ela ainda é
+        preguiçosa: média de blocos ('mean') ou o pixel central de cada
+        bloco ('nearest'). Variáveis inteiras (flags de qualidade, CMI
+        empacotado) são sempre amostradas, pois a média dos códigos brutos
+        não tem significado.
+        """
+        if method not in DECIMATION:
+            raise ValueError(f'dizimação inválida: {method}')
+
+        factor = self._factor(data)
+        if factor < 2:
+            return data
+
+        names = [
+            name for name, var in data.data_vars.items()
+            if var.dims == ('y', 'x')
+        ]
+        data = data[names]
+
+        # o pixel central representa o bloco na amostragem
+        center = factor // 2
+        strided = data.isel(
+            x=slice(center, None, factor), y=slice(center, None, factor)
+        )
+        if method == 'nearest':
+            return strided
+
+        # na média, a coordenada de cada bloco é o seu centro
+        x = data.x.coarsen(x=factor, boundary='trim').mean()
+        y = data.y.coarsen(y=factor, boundary='trim').mean()
+        strided = strided.isel(
+            x=slice(0, x.size), y=slice(0, y.size)
+        ).assign_coords(x=x, y=y)
+
+        data_vars = {}
+        for name in names:
+            var = data[name]
+            if not np.issubdtype(var.dtype, np.floating):
+                data_vars[name] = strided[name]
+                continue
 
-    def reproject(self, data: xr.Dataset):
+            if isinstance(var.data, dask.array.Array):
+                var = var.chunk(self._aligned_chunks(var, factor))
+
+            mean = var.coarsen(x=factor, y=factor, boundary='trim').mean()
+            data_vars[name] = mean.assign_attrs(var.attrs)
+
+        return xr.Dataset(data_vars, attrs=data.attrs)
+
+    @staticmethod
+    def _fill_value(data: xr.DataArray):
+        if np.issubdtype(data.dtype, np.floating):
+            return np.nan
+        return data.attrs.get('_FillValue', 0)
+
+    @staticmethod
+    def _source_grid(data: xr.Dataset) -> SourceGrid:
         x_meters = data.x.values * GOES19.height
         y_meters = data.y.values * GOES19.height
-        data.rio.write_crs(GOES19.crs, inplace=True)
-
-        data = data.assign_coords({
-            'x': x_meters,
-            'y': y_meters
-        })
 
-        data = data.rio.reproject(
-            'EPSG:3857',
-            resolution=2000,
-            resampling=Resampling.nearest,
-            chunks=data.chunks,
-            num_threads=os.cpu_count() or 4,
+        return SourceGrid.from_coords(
+            ' '.join(GOES19.crs.split()), x_meters, y_meters
         )
 
-        return self._crop(data)
+    def output_shape(self, data: xr.Dataset) -> Tuple[int, int]:
+        grid = self._target_grid(self._source_grid(self.window(data)))
+        return grid.height, grid.width
+
+    def reproject(self, data: xr.Dataset, decimation: str = 'mean'):
+        data = self.decimate(self.window(data), decimation)
+
+        source = self._source_grid(data)
+        grid = self._target_grid(source)
+        lut = self._luts.get(GOES19.name, source, grid)
+
+        names = [
+            name for name, var in data.data_vars.items()
+            if var.dims == ('y', 'x')
+        ]
+        # leitura, descompressão e dizimação
+        with registry.timer('read'):
+            values = dask.compute(*[data[name].data for name in names])
+
+        data_vars = {}
+        with registry.timer('reproject'):
+            for name, value in zip(names, values):
+                var = data[name]
+                data_vars[name] = (
+                    ('y', 'x'),
+                    lut.gather(np.asarray(value), self._fill_value(var)),
+                    var.attrs
+                )
+
+        coords = {
+            name: coord for name, coord in data.coords.items()
+            if not set(coord.dims) & {'x', 'y'} and name not in ('x', 'y')
+        }
+        coords['x'] = grid.x
+        coords['y'] = grid.y
+
+        result = xr.Dataset(data_vars, coords=coords, attrs=data.attrs)
+        result.rio.write_crs(self._crs, inplace=True)
+        result.rio.write_transform(
+            Affine(grid.resolution, 0, grid.minx, 0, -grid.resolution, grid.maxy),
+            inplace=True
+        )
+        return result
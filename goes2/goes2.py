@@ -1,61 +1,285 @@
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
-from typing import List, Union
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 from goes2.geo.projection import Projection, WebMercator
 from .aws import AWSRepository
+from .aws.listing_index import KeyRecord
+from .aws.notifications import PollingSource, ScanSource
+from .backfill import Backfill
+from .inputs import SharedInputs
+from .metrics import registry
+from .packed import unpack_coords
+from .parallel import ProcessRenderer
+from .scheduling import InputEstimate, MemoryBudget
 
 import asyncio
 
 from goes2.product import Product
-from goes2.raster import Rasterizer
+from goes2.raster import Rasterizer, stamp, write_all
 from goes2.storage import Storage, TimeSeriesStorage
 
 import xarray as xr
 
+
 class GOES2:
-    def __init__(self, rasterizer: Rasterizer):
-        self._repo = AWSRepository()
+    def __init__(
+        self,
+        rasterizer: Union[Rasterizer, Dict[str, Rasterizer]],
+        repository: Optional[AWSRepository] = None,
+        executor: str = 'thread',
+        workers: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        packed: bool = False
+    ):
+        """
+        Args:
+            rasterizer: Saída dos produtos, ou várias saídas por nome; cada
+            produto é calculado uma vez e gravado em todas
+            repository: Repositório de dados (por padrão, o bucket da NOAA)
+            executor: 'thread' gera os produtos em threads deste processo;
+            'process' usa um pool de processos com memória compartilhada
+            workers: Número de processos do pool (padrão: núcleos da CPU)
+            memory_budget: Bytes disponíveis para produtos simultâneos
+            (padrão: metade da memória física)
+            packed: Mantém o CMI nos inteiros empacotados do arquivo
+            (int16) durante a reprojeção; escala, offset e valores ausentes
+            são aplicados só na paleta
+        """
+        if executor not in ('thread', 'process'):
+            raise ValueError(f'executor inválido: {executor}')
+
+        self._repo = repository or AWSRepository()
         self._projection = WebMercator()
-        self._rasterizer = rasterizer
-        self._semaphore = asyncio.Semaphore(4)
+        self._sinks: Dict[str, Rasterizer] = {}
+        self.to(rasterizer)
+        self._budget = MemoryBudget(memory_budget)
         self._store = TimeSeriesStorage(at='static', max_size=12)
+        self._inputs = SharedInputs()
+        self._packed = packed
+        # estimativa por entrada e dizimação; os tamanhos do arquivo são os
+        # mesmos em todo horário
+        self._estimates: Dict[Tuple[str, str], InputEstimate] = {}
+
+        self._renderer = (
+            ProcessRenderer(workers) if executor == 'process' else None
+        )
+
+    def to(self, rasterizer: Union[Rasterizer, Dict[str, Rasterizer]]):
+        if isinstance(rasterizer, Rasterizer):
+            rasterizer = {'default': rasterizer}
+        self._sinks = dict(rasterizer)
+        return self
+
+    def add_sink(self, name: str, rasterizer: Rasterizer):
+        """Mais uma saída para os mesmos produtos"""
+        self._sinks[name] = rasterizer
+        return self
 
-    def to(self, rasterizer: Rasterizer):
-        self._rasterizer = rasterizer
+    def _keys(self, product: Product) -> Dict[str, str]:
+        """
+        Nome de cada saída do produto no armazenamento: o próprio produto
+        com uma saída só; <produto>-<saída> com várias
+        """
+        if len(self._sinks) == 1:
+            return {name: product.name for name in self._sinks}
+        return {name: f'{product.name}-{name}' for name in self._sinks}
 
-    def _generate(self, product: Product, data, date: datetime):
+    def _decode_one(self, file, decimation: str = 'mean') -> xr.Dataset:
+        # o arquivo é aberto aqui, fora do loop de eventos: no modo 'ranges'
+        # a leitura busca bytes do S3 de forma síncrona
+        with registry.timer('decode'), self._open(file) as datum:
+            return self._projection.reproject(datum, decimation)
 
-        reprojs = []
-        for datum in data:
-            reproj = self._projection.reproject(datum)
-            reprojs.append(reproj)
-        
-        result = product.create(*reprojs)
+    def _decode(
+        self,
+        files,
+        product: Product,
+        date: Optional[datetime] = None
+    ) -> List[xr.Dataset]:
+        """
+        Abre e reprojeta os arquivos de entrada do produto. Com `date`, cada
+        arquivo é decodificado uma única vez por intervalo, mesmo que vários
+        produtos o usem
+        """
+        decimation = product.decimation
+        if date is None:
+            return [self._decode_one(file, decimation) for file in files]
+
+        return [
+            self._inputs.get(
+                (use, date, decimation),
+                lambda f=file: self._decode_one(f, decimation)
+            )
+            for use, file in zip(self._uses(product), files)
+        ]
+
+    def _expect_inputs(self, products: List[Product], date: datetime):
+        """Anuncia quantos produtos do intervalo usam cada entrada"""
+        counts: Dict[Tuple[str, str], int] = {}
+        for product in products:
+            for use in self._uses(product):
+                key = (use, product.decimation)
+                counts[key] = counts.get(key, 0) + 1
+
+        for (use, decimation), count in counts.items():
+            self._inputs.expect((use, date, decimation), count)
+
+    def _release_inputs(self, product: Product, date: datetime):
+        for use in self._uses(product):
+            self._inputs.release((use, date, product.decimation))
+
+    def _render(self, product: Product, reprojs, date: datetime):
+        """
+        Gera o produto a partir das entradas reprojetadas e o grava nas
+        saídas que ainda não o têm, cada uma com o seu status
+        """
+        keys = {
+            name: key for name, key in self._keys(product).items()
+            if not self._store.find_by_date(key, date, False)
+        }
+        targets = [
+            (name, self._sinks[name], self._store.new(key, date))
+            for name, key in keys.items()
+        ]
+        if not targets:
+            return
 
-        path = self._store.new(product.name, date)
-        self._rasterizer.to_raster(result, path)
+        try:
+            with registry.timer('render', product=product.name):
+                if self._renderer is not None:
+                    errors = self._renderer.render(
+                        product, reprojs, targets, date
+                    )
+                else:
+                    result = stamp(
+                        product.create(*reprojs), product.name, date
+                    )
+                    errors = write_all(result, targets)
+        except BaseException:
+            for key in keys.values():
+                self._store.failed(key, date)
+            raise
+
+        # só entradas completas são encontradas por _exists
+        for name, key in keys.items():
+            if errors[name] is None:
+                self._store.ready(key, date)
+            else:
+                print(f'erro na saída {name} de {product.name}: '
+                      f'{errors[name]}')
+                self._store.failed(key, date)
+
+        failed = [name for name, error in errors.items() if error is not None]
+        if failed:
+            raise RuntimeError(
+                f'{product.name}: falha nas saídas {", ".join(failed)}'
+            ) from errors[failed[0]]
+
+    def _generate(self, product: Product, files, date: datetime):
+        reprojs = self._decode(files, product, date)
+        self._render(product, reprojs, date)
+
+    def _estimate_input(self, file, decimation: str) -> InputEstimate:
+        with self._open(file) as data:
+            window = self._projection.decimate(
+                self._projection.window(data), decimation
+            )
+            spatial = [
+                var for var in window.data_vars.values()
+                if var.dims == ('y', 'x')
+            ]
+            height, width = self._projection.output_shape(data)
+
+            return InputEstimate(
+                source_bytes=sum(v.size * v.dtype.itemsize for v in spatial),
+                output_pixels=height * width,
+                itemsize=sum(v.dtype.itemsize for v in spatial)
+            )
+
+    def _estimate(self, product: Product, files) -> int:
+        """
+        Estima o pico de memória do produto sem ler os dados. Os metadados
+        de cada entrada são lidos só no primeiro horário: no modo 'ranges'
+        cada abertura são leituras remotas, além das do `_decode`
+        """
+        inputs = []
+        for use, file in zip(self._uses(product), files):
+            key = (use, product.decimation)
+            estimate = self._estimates.get(key)
+            if estimate is None:
+                estimate = self._estimate_input(file, product.decimation)
+                self._estimates[key] = estimate
+            inputs.append(estimate)
+
+        return product.estimate_memory(inputs)
+
+    def memory_report(self) -> dict:
+        """Reservas de memória atuais e de pico"""
+        return self._budget.report()
+
+    def _exists(self, product: Product, date: datetime) -> bool:
+        return all(
+            self._store.find_by_date(key, date, False)
+            for key in self._keys(product).values()
+        )
+
+    def _open(self, file) -> xr.Dataset:
+        options = {'chunks': 'auto'}
+        if self._packed:
+            options['mask_and_scale'] = False
+
+        if isinstance(file, Path):
+            data = xr.open_dataset(file, **options)
+        else:
+            # objetos em memória (ou remotos) são abertos direto do buffer
+            data = xr.open_dataset(file.open(), engine='h5netcdf', **options)
+
+        if not self._packed:
+            return data
+
+        # o dataset derivado precisa fechar o arquivo original
+        unpacked = unpack_coords(data)
+        unpacked.set_close(data.close)
+        return unpacked
 
     async def _handle_product(
         self, 
         product: Product, 
         date: datetime, 
     ):
-        already_exists = self._store.find_by_date(product.name, date, False)
-        if already_exists:
-            print(f'{product.name} das {date} já existe')
-            return
+        status = 'failed'
+        try:
+            if await asyncio.to_thread(self._exists, product, date):
+                print(f'{product.name} das {date} já existe')
+                status = 'skipped'
+                return
 
-        paths = await self._repo.get(product.uses, date)
+            with registry.timer('product', product=product.name):
+                with registry.timer('fetch'):
+                    paths = await self._repo.get(product.uses, date)
 
-        async with self._semaphore:
-            data = [xr.open_dataset(path, chunks='auto') for path in paths]
+                try:
+                    nbytes = await asyncio.to_thread(
+                        self._estimate, product, paths
+                    )
 
-            print(f'produzindo {product}')
-            await asyncio.to_thread(self._generate, product, data, date)
+                    async with self._budget.reserve(nbytes):
+                        print(f'produzindo {product}')
+                        await asyncio.to_thread(
+                            self._generate, product, paths, date
+                        )
+                    status = 'done'
+                finally:
+                    self._repo.release(paths)
+        finally:
+            self._release_inputs(product, date)
+            registry.inc('products_total', status=status)
+            await asyncio.to_thread(registry.export)
 
     def on_projection(self, projection: Projection):
         self._projection = projection
+        self._estimates.clear()
         return self
 
     def at_date(self, date: datetime):
@@ -65,6 +289,14 @@ class GOES2:
     def use_store(self, store: Storage):
         self._store = store
 
+    @property
+    def store(self) -> Storage:
+        return self._store
+
+    def storage_key(self, product: Product, sink: str) -> str:
+        """Nome da saída `sink` do produto no armazenamento"""
+        return self._keys(product)[sink]
+
     def _flatten_requests(self, products):
         # necessário, pois CMI.in_range retorna uma lista
         flattened = []
@@ -85,15 +317,168 @@ class GOES2:
             products = [products]
 
         products = self._flatten_requests(products)
+        self._expect_inputs(products, self._date)
 
-        tasks = []
-        for product in products:
-            task = asyncio.create_task(
-                self._handle_product(product, self._date),
+        # as tarefas herdam o span e formam a árvore do intervalo
+        with registry.tracer.span('timestep', date=str(self._date)):
+            tasks = []
+            for product in products:
+                task = asyncio.create_task(
+                    self._handle_product(product, self._date),
+                )
+                tasks.append(task)
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    def _uses(product: Product) -> Tuple[str]:
+        uses = product.uses
+        return uses if isinstance(uses, tuple) else (uses,)
+
+    @staticmethod
+    def _request_of(record: KeyRecord) -> str:
+        if record.channel:
+            return f'{record.product}/{record.channel}'
+        return record.product
+
+    async def _follow_product(
+        self,
+        product: Product,
+        date: datetime,
+        scan_end: datetime,
+        retries: int = 3,
+        backoff: float = 30
+    ) -> bool:
+        """
+        Produz o produto, com até `retries` tentativas espaçadas de
+        `backoff` segundos (dobrando a cada falha); devolve se conseguiu
+        """
+        for attempt in range(retries):
+            if attempt:
+                await asyncio.sleep(backoff * 2 ** (attempt - 1))
+                # a tentativa anterior liberou as entradas
+                self._expect_inputs([product], date)
+
+            try:
+                await self._handle_product(product, date)
+                break
+            except Exception as e:
+                print(
+                    f'falha ao produzir {product.name} das {date} '
+                    f'(tentativa {attempt + 1}/{retries}): {e}'
+                )
+        else:
+            return False
+
+        latency = datetime.now(timezone.utc) - scan_end
+        print(
+            f'{product.name} das {date} publicado '
+            f'{latency.total_seconds():.0f}s após o fim da varredura'
+        )
+        return True
+
+    async def follow(
+        self,
+        products: Union[List[Product], Product],
+        source: Optional[ScanSource] = None,
+        interval: float = 20
+    ):
+        """
+        Modo contínuo: acompanha as varreduras mais recentes e produz cada
+        produto assim que todos os arquivos que ele usa chegam ao bucket.
+        Produtos já presentes no armazenamento não são refeitos.
+
+        Args:
+            products: Produtos a gerar
+            source: Fonte de novos objetos. Por padrão consulta o prefixo
+            da hora corrente a cada `interval` segundos.
+            interval: Intervalo entre consultas da fonte padrão
+        """
+        if not isinstance(products, list):
+            products = [products]
+        products = self._flatten_requests(products)
+
+        if source is None:
+            prefixes = {
+                use.split('/')[0]
+                for product in products for use in self._uses(product)
+            }
+            source = PollingSource(self._repo.index, prefixes, interval)
+
+        available: Dict[datetime, Set[str]] = {}
+        scan_ends: Dict[datetime, datetime] = {}
+        started: Set[Tuple[str, datetime]] = set()
+        tasks: Set[asyncio.Task] = set()
+
+        async def produce(product: Product, date: datetime, end: datetime):
+            if not await self._follow_product(product, date, end):
+                # volta a ser candidato na próxima notificação do horário
+                started.discard((product.name, date))
+
+        async for record in source.events():
+            self._repo.index.add(record)
+
+            start = record.start
+            date = start.replace(
+                minute=(start.minute // 10) * 10, second=0, microsecond=0
             )
-            tasks.append(task)
+            available.setdefault(date, set()).add(self._request_of(record))
+            scan_ends[date] = max(scan_ends.get(date, record.end), record.end)
 
-        await asyncio.gather(*tasks, return_exceptions=True)
+            ready = []
+            for product in products:
+                if (product.name, date) in started:
+                    continue
+
+                uses = self._uses(product)
+                if all(use in available[date] for use in uses):
+                    ready.append(product)
+
+            # os produtos que ficam prontos juntos compartilham a decodificação
+            self._expect_inputs(ready, date)
+            for product in ready:
+                started.add((product.name, date))
+                task = asyncio.create_task(
+                    produce(product, date, scan_ends[date])
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            # esquece as varreduras antigas
+            limit = date - timedelta(hours=3)
+            for old in [d for d in available if d < limit]:
+                available.pop(old)
+                scan_ends.pop(old, None)
+            started.difference_update(
+                [(name, d) for name, d in started if d < limit]
+            )
+            self._repo.index.prune(limit)
+
+    async def backfill(
+        self,
+        products: Union[List[Product], Product],
+        start: datetime,
+        end: datetime,
+        cadence: timedelta = timedelta(minutes=10),
+        queue_size: int = 2
+    ) -> Backfill:
+        """Reprocessa os produtos em todos os intervalos de start a end"""
+        if not isinstance(products, list):
+            products = [products]
+        products = self._flatten_requests(products)
+
+        backfill = Backfill(
+            self, products, start, end,
+            cadence=cadence,
+            queue_size=queue_size
+        )
+        await backfill.run()
+        return backfill
 
     async def dispose(self):
         await self._repo.dispose()
+        # espera o coletor apagar o que já expirou
+        await asyncio.to_thread(self._store.dispose)
+
+        if self._renderer is not None:
+            await asyncio.to_thread(self._renderer.shutdown)
@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+@dataclass
+class _Entry:
+    remaining: int
+    future: Optional[Future] = field(default=None)
+
+
+class SharedInputs:
+    """
+    Entradas decodificadas e reprojetadas compartilhadas entre os produtos
+    de um mesmo intervalo: cada arquivo é decodificado uma única vez, não
+    importa quantos produtos o consumam, e é descartado quando o último
+    consumidor esperado o libera.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def expect(self, key: Hashable, consumers: int):
+        """Registra quantos produtos vão consumir a entrada"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = _Entry(consumers)
+            else:
+                entry.remaining += consumers
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        owner = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # consumidor não anunciado: vale só para ele
+                entry = self._entries[key] = _Entry(1)
+            if entry.future is None:
+                entry.future = Future()
+                owner = True
+
+        if owner:
+            try:
+                entry.future.set_result(loader())
+            except BaseException as e:
+                entry.future.set_exception(e)
+
+        return entry.future.result()
+
+    def release(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+
+            entry.remaining -= 1
+            if entry.remaining <= 0:
+                self._entries.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
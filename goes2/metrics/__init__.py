@@ -0,0 +1,15 @@
+from .tracing import Span, SpanRecorder, Tracer
+from .registry import Metrics, peak_rss, registry
+from .exporters import Exporter, JSONLines, PrometheusTextFile
+
+__all__ = [
+    'Span',
+    'SpanRecorder',
+    'Tracer',
+    'Metrics',
+    'peak_rss',
+    'registry',
+    'Exporter',
+    'JSONLines',
+    'PrometheusTextFile'
+]
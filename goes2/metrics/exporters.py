@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List
+from uuid import uuid4
+
+
+class Exporter(ABC):
+    @abstractmethod
+    def export(self, snapshot: Dict):
+        pass
+
+
+def _metric(name: str, prefix: str) -> str:
+    return prefix + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+
+    def escape(value) -> str:
+        return (
+            str(value)
+            .replace('\\', '\\\\')
+            .replace('"', '\\"')
+            .replace('\n', '\\n')
+        )
+
+    pairs = ','.join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items()))
+    return '{' + pairs + '}'
+
+
+class PrometheusTextFile(Exporter):
+    """
+    Formato texto do Prometheus, reescrito atomicamente a cada exportação
+    (para o textfile collector do node_exporter)
+    """
+
+    def __init__(self, path: str, prefix: str = 'goes2_'):
+        self._path = Path(path)
+        self._prefix = prefix
+        self._lock = threading.Lock()
+
+    def _render(self, snapshot: Dict) -> str:
+        # as amostras de cada família precisam ficar juntas, logo depois do
+        # seu TYPE; os rótulos do mesmo nome vêm em qualquer ordem
+        families: Dict[str, List[str]] = {}
+
+        def add(name: str, kind: str, line: str):
+            if name not in families:
+                families[name] = [f'# TYPE {name} {kind}']
+            families[name].append(line)
+
+        for entry in snapshot['counters']:
+            name = _metric(entry['name'], self._prefix)
+            add(name, 'counter',
+                f"{name}{_labels(entry['labels'])} {entry['value']}")
+
+        for entry in snapshot['gauges']:
+            name = _metric(entry['name'], self._prefix)
+            add(name, 'gauge',
+                f"{name}{_labels(entry['labels'])} {entry['value']}")
+
+        for entry in snapshot['summaries']:
+            name = _metric(entry['name'], self._prefix)
+            labels = _labels(entry['labels'])
+            add(name, 'summary', f"{name}_count{labels} {entry['count']}")
+            add(name, 'summary', f"{name}_sum{labels} {entry['sum']}")
+
+        # o máximo é outra família, depois de todas as amostras do resumo
+        for entry in snapshot['summaries']:
+            name = _metric(entry['name'], self._prefix) + '_max'
+            add(name, 'gauge',
+                f"{name}{_labels(entry['labels'])} {entry['max']}")
+
+        lines = [line for family in families.values() for line in family]
+        return '\n'.join(lines) + '\n'
+
+    def export(self, snapshot: Dict):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # export roda em várias threads ao mesmo tempo: nome temporário
+        # único, e uma publicação por vez
+        temp = self._path.with_name(f'.{self._path.name}.{uuid4().hex}')
+        with self._lock:
+            temp.write_text(self._render(snapshot))
+            os.replace(temp, self._path)
+
+
+class JSONLines(Exporter):
+    """Um snapshot por linha, acrescentado ao arquivo"""
+
+    def __init__(self, path: str):
+        self._path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, snapshot: Dict):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(snapshot)
+        with self._lock, open(self._path, 'a') as f:
+            f.write(line + '\n')
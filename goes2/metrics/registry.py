@@ -0,0 +1,190 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - sem getrusage (Windows)
+    resource = None
+
+from .tracing import Tracer
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# rótulos herdados pelos estágios internos (ex.: o produto em andamento)
+_labels: ContextVar[Dict[str, str]] = ContextVar('labels', default={})
+
+
+def _key(name: str, labels: Dict) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def peak_rss() -> int:
+    """Pico de memória residente, em bytes, deste processo e dos filhos"""
+    if resource is None:
+        return 0
+
+    # ru_maxrss é em KiB no Linux e em bytes no macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * unit
+
+
+@dataclass
+class _Summary:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, count: int, total: float, max_value: float):
+        self.count += count
+        self.total += total
+        self.max = max(self.max, max_value)
+
+
+class Metrics:
+    """
+    Registro de métricas do pipeline: contadores (bytes baixados, acertos
+    de cache), medidores (profundidade das filas, memória reservada) e
+    resumos de duração por estágio e produto. Os exportadores registrados
+    recebem um snapshot a cada `export`.
+    """
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        self.tracer = tracer or Tracer()
+        self._exporters = []
+        self._lock = threading.Lock()
+        self._counters: Dict[Key, float] = {}
+        self._gauges: Dict[Key, float] = {}
+        self._summaries: Dict[Key, _Summary] = {}
+
+    def add_exporter(self, exporter):
+        self._exporters.append(exporter)
+        return self
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, _Summary())
+            summary.add(1, value, value)
+
+    @contextmanager
+    def labels(self, **labels):
+        """Rótulos aplicados aos estágios cronometrados dentro do bloco"""
+        token = _labels.set({**_labels.get(), **labels})
+        try:
+            yield
+        finally:
+            _labels.reset(token)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """
+        Cronometra um estágio (`stage_seconds`) e abre um span para ele.
+        Os rótulos passam para os estágios aninhados no mesmo contexto.
+        """
+        labels = {**_labels.get(), **labels}
+        token = _labels.set(labels)
+        start = time.perf_counter()
+
+        try:
+            with self.tracer.span(stage, **labels):
+                yield
+        finally:
+            _labels.reset(token)
+            self.observe(
+                'stage_seconds', time.perf_counter() - start,
+                stage=stage, **labels
+            )
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            summaries = {
+                key: _Summary(s.count, s.total, s.max)
+                for key, s in self._summaries.items()
+            }
+
+        gauges[_key('peak_rss_bytes', {})] = peak_rss()
+
+        def entries(values: Dict[Key, float]) -> List[Dict]:
+            return [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in values.items()
+            ]
+
+        return {
+            'time': time.time(),
+            'counters': entries(counters),
+            'gauges': entries(gauges),
+            'summaries': [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': s.count,
+                    'sum': s.total,
+                    'max': s.max,
+                }
+                for (name, labels), s in summaries.items()
+            ],
+        }
+
+    def drain(self) -> Dict:
+        """Snapshot dos contadores e resumos, zerando-os (processos filhos)"""
+        snapshot = self.snapshot()
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+        return snapshot
+
+    def merge(self, snapshot: Dict):
+        """Soma ao registro um snapshot vindo de outro processo"""
+        with self._lock:
+            for entry in snapshot['counters']:
+                key = _key(entry['name'], entry['labels'])
+                self._counters[key] = (
+                    self._counters.get(key, 0) + entry['value']
+                )
+
+            for entry in snapshot['summaries']:
+                key = _key(entry['name'], entry['labels'])
+                self._summaries.setdefault(key, _Summary()).add(
+                    entry['count'], entry['sum'], entry['max']
+                )
+
+            # o pico dos filhos só entra no RUSAGE_CHILDREN quando terminam
+            for entry in snapshot['gauges']:
+                if entry['name'] == 'peak_rss_bytes':
+                    key = _key('worker_peak_rss_bytes', {})
+                    self._gauges[key] = max(
+                        self._gauges.get(key, 0), entry['value']
+                    )
+
+    def export(self):
+        if not self._exporters:
+            return
+
+        snapshot = self.snapshot()
+        for exporter in self._exporters:
+            try:
+                exporter.export(snapshot)
+            except OSError as e:
+                print(f'falha ao exportar métricas: {e}')
+
+
+registry = Metrics()
@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+_current: ContextVar[Optional['Span']] = ContextVar('span', default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    attributes: Dict
+    start: float
+    end: Optional[float] = None
+    parent: Optional['Span'] = field(default=None, repr=False)
+    children: List['Span'] = field(default_factory=list, repr=False)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def to_json(self) -> Dict:
+        return {
+            'name': self.name,
+            'attributes': self.attributes,
+            'start': self.start,
+            'duration': self.duration,
+            'children': [child.to_json() for child in self.children],
+        }
+
+
+class Tracer:
+    """
+    Gancho de rastreamento. Cada estágio cronometrado abre um span filho do
+    span corrente (propagado por contextvars, inclusive para to_thread), de
+    modo que um intervalo de tempo forma uma árvore. `on_finish` recebe cada
+    span ao terminar; sem ele o rastreamento não faz nada.
+    """
+
+    def __init__(self, on_finish: Optional[Callable[[Span], None]] = None):
+        self.on_finish = on_finish
+
+    @property
+    def enabled(self) -> bool:
+        return self.on_finish is not None
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current.get()
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes):
+        if not self.enabled:
+            yield None
+            return
+
+        parent = parent or _current.get()
+        span = Span(name, attributes, time.time(), parent=parent)
+        token = _current.set(span)
+
+        try:
+            yield span
+        finally:
+            span.end = time.time()
+            _current.reset(token)
+
+            if parent is not None:
+                parent.children.append(span)
+            self.on_finish(span)
+
+
+class SpanRecorder:
+    """
+    on_finish que grava cada árvore completa (span raiz), uma por linha
+    JSON, ex.: Tracer(SpanRecorder('traces.jsonl'))
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span):
+        if span.parent is not None:
+            return
+
+        line = json.dumps(span.to_json(), default=str)
+        with self._lock, open(self._path, 'a') as f:
+            f.write(line + '\n')
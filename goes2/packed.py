@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import xarray as xr
+import dask.array as da
+
+
+@dataclass(frozen=True)
+class Packing:
+    """
+    Codificação de uma variável inteira "empacotada" do NetCDF
+    (scale_factor, add_offset, _FillValue, _Unsigned, valid_range), lida
+    dos atributos quando o arquivo é aberto com mask_and_scale=False.
+
+    Como as variáveis têm no máximo 16 bits, a decodificação inteira cabe
+    numa tabela indexada pelo próprio código bruto.
+    """
+
+    dtype: str
+    scale: float = 1.0
+    offset: float = 0.0
+    fill: Optional[int] = None
+    unsigned: bool = False
+    valid_range: Optional[Tuple[int, int]] = None
+
+    MAX_ITEMSIZE = 2
+
+    @staticmethod
+    def of(data: xr.DataArray) -> Optional['Packing']:
+        """A codificação da variável, ou None se ela não for inteira"""
+        dtype = np.dtype(data.dtype)
+        if dtype.kind not in 'iu' or dtype.itemsize > Packing.MAX_ITEMSIZE:
+            return None
+
+        attrs = data.attrs
+        fill = attrs.get('_FillValue')
+        valid_range = attrs.get('valid_range')
+
+        return Packing(
+            dtype=dtype.str,
+            scale=float(attrs.get('scale_factor', 1.0)),
+            offset=float(attrs.get('add_offset', 0.0)),
+            fill=None if fill is None else int(fill),
+            unsigned=str(attrs.get('_Unsigned', 'false')).lower() == 'true',
+            valid_range=(
+                None if valid_range is None
+                else tuple(int(v) for v in valid_range)
+            )
+        )
+
+    @property
+    def _bits(self) -> np.dtype:
+        return np.dtype(f'u{np.dtype(self.dtype).itemsize}')
+
+    def codes(self, block: np.ndarray) -> np.ndarray:
+        """Padrão de bits de cada pixel, usado como índice das tabelas"""
+        return np.asarray(block).view(self._bits)
+
+    def raw(self, block: np.ndarray) -> np.ndarray:
+        """Valor inteiro armazenado, respeitando _Unsigned"""
+        codes = self.codes(block)
+        return codes if self.unsigned else codes.view(self.dtype)
+
+    def _raw_value(self, value: int) -> int:
+        """Atributo (fill, valid_range) no mesmo domínio de `raw`"""
+        stored = np.array(value).astype(self.dtype)
+        return int(self.raw(stored.reshape(1))[0])
+
+    def table(self) -> np.ndarray:
+        """Valor físico (float32, NaN para ausentes) de cada código possível"""
+        codes = np.arange(2 ** (8 * self._bits.itemsize), dtype=np.int64)
+        raw = self.raw(codes.astype(self._bits))
+
+        values = raw.astype(np.float32) * np.float32(self.scale)
+        values += np.float32(self.offset)
+
+        if self.fill is not None:
+            values[raw == self._raw_value(self.fill)] = np.nan
+
+        if self.valid_range is not None:
+            low, high = (self._raw_value(v) for v in self.valid_range)
+            values[(raw < low) | (raw > high)] = np.nan
+
+        return values
+
+    def decode(self, block: np.ndarray) -> np.ndarray:
+        return np.take(_table(self), self.codes(block))
+
+
+# atributos que deixam de valer depois da decodificação
+ATTRS = (
+    'scale_factor', 'add_offset', '_FillValue', '_Unsigned', 'valid_range'
+)
+
+_tables = {}
+
+
+def _table(packing: Packing) -> np.ndarray:
+    table = _tables.get(packing)
+    if table is None:
+        table = _tables[packing] = packing.table()
+    return table
+
+
+def strip(attrs: dict) -> dict:
+    return {key: value for key, value in attrs.items() if key not in ATTRS}
+
+
+def unpack(data: xr.DataArray) -> xr.DataArray:
+    """
+    Decodifica (de forma preguiçosa, se o array for dask) uma variável
+    empacotada para float32. Variáveis já decodificadas voltam como estão.
+    """
+    packing = Packing.of(data)
+    if packing is None:
+        return data
+
+    if isinstance(data.data, da.Array):
+        values = data.data.map_blocks(packing.decode, dtype=np.float32)
+    else:
+        values = packing.decode(data.values)
+
+    result = data.copy(data=values)
+    result.attrs = strip(data.attrs)
+    return result
+
+
+def unpack_coords(data: xr.Dataset) -> xr.Dataset:
+    """Decodifica as coordenadas x/y (ângulos de varredura empacotados)"""
+    coords = {}
+    for name in ('x', 'y'):
+        coord = data.coords.get(name)
+        if coord is None:
+            continue
+
+        packing = Packing.of(coord)
+        if packing is not None:
+            # em float64: a grade de origem entra na chave das LUTs
+            values = packing.raw(coord.values).astype(np.float64)
+            coords[name] = (
+                coord.dims,
+                values * packing.scale + packing.offset,
+                strip(coord.attrs)
+            )
+
+    return data.assign_coords(coords) if coords else data
@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import xarray as xr
+
+from goes2.metrics import registry
+from goes2.raster import stamp, write_all
+
+
+def _attach(name: str) -> SharedMemory:
+    # a partir do 3.13 o processo que só lê não precisa registrar o
+    # segmento no resource tracker (quem cria é quem remove)
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+
+    # antes disso o registro é automático: sem desfazê-lo, o tracker do
+    # worker avisa de vazamento e pode remover o segmento quando o worker
+    # termina, ainda em uso pelo processo principal
+    shm = SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+@dataclass
+class SharedArray:
+    """Descrição serializável de um array em memória compartilhada"""
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    @staticmethod
+    def create(values: np.ndarray) -> Tuple['SharedArray', SharedMemory]:
+        values = np.asarray(values)
+        shm = SharedMemory(create=True, size=max(values.nbytes, 1))
+
+        array = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)
+        array[...] = values
+        del array
+
+        return SharedArray(shm.name, values.shape, values.dtype.str), shm
+
+    def attach(self) -> Tuple[np.ndarray, SharedMemory]:
+        shm = _attach(self.name)
+        array = np.ndarray(self.shape, dtype=np.dtype(self.dtype),
+                           buffer=shm.buf)
+        return array, shm
+
+
+@dataclass
+class SharedDataset:
+    """
+    Dataset cujas variáveis (y, x) ficam em memória compartilhada; só as
+    coordenadas e atributos, pequenos, são serializados
+    """
+
+    variables: Dict[str, Tuple[SharedArray, Tuple[str, ...], Dict]]
+    coords: Dict[str, Tuple[Tuple[str, ...], Any, Dict]]
+    attrs: Dict
+
+    @staticmethod
+    def create(
+        data: xr.Dataset
+    ) -> Tuple['SharedDataset', List[SharedMemory]]:
+        segments = []
+        variables = {}
+
+        try:
+            for name, var in data.data_vars.items():
+                shared, shm = SharedArray.create(var.values)
+                segments.append(shm)
+                variables[name] = (shared, var.dims, dict(var.attrs))
+        except Exception:
+            _unlink(segments)
+            raise
+
+        coords = {
+            name: (coord.dims, coord.values, dict(coord.attrs))
+            for name, coord in data.coords.items()
+        }
+
+        return SharedDataset(variables, coords, dict(data.attrs)), segments
+
+    def attach(self) -> Tuple[xr.Dataset, List[SharedMemory]]:
+        segments = []
+        data_vars = {}
+
+        for name, (shared, dims, attrs) in self.variables.items():
+            array, shm = shared.attach()
+            segments.append(shm)
+            data_vars[name] = (dims, array, attrs)
+
+        return (
+            xr.Dataset(data_vars, coords=self.coords, attrs=self.attrs),
+            segments
+        )
+
+
+def _unlink(segments: List[SharedMemory]):
+    for shm in segments:
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _create_and_write(product, datasets, targets, date):
+    result = stamp(product.create(*datasets), product.name, date)
+    return write_all(result, targets)
+
+
+def _render(
+    product,
+    shared: List[SharedDataset],
+    targets: List[Tuple[str, Any, str]],
+    date: datetime,
+    labels: Dict[str, str]
+) -> Tuple[Dict[str, Optional[BaseException]], Dict]:
+    """
+    Executado no processo de trabalho. Devolve o erro de cada saída e as
+    métricas coletadas aqui, para que o processo pai as some ao seu
+    registro
+    """
+    attached = [s.attach() for s in shared]
+    segments = [shm for _, segs in attached for shm in segs]
+
+    try:
+        with registry.timer('worker', **labels):
+            errors = _create_and_write(
+                product, [data for data, _ in attached], targets, date
+            )
+        # nem toda exceção sobrevive ao pickle de volta para o pai
+        errors = {
+            name: None if error is None
+            else RuntimeError(f'{type(error).__name__}: {error}')
+            for name, error in errors.items()
+        }
+        return errors, registry.drain()
+    finally:
+        # os arrays precisam ser soltos antes de fechar os segmentos
+        del attached
+        for shm in segments:
+            try:
+                shm.close()
+            except BufferError:
+                pass
+
+
+class ProcessRenderer:
+    """
+    Pool de processos, mantido aquecido entre intervalos, que gera e
+    rasteriza os produtos. As entradas reprojetadas vão por memória
+    compartilhada, sem serialização dos arrays.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count() or 4,
+            # spawn: o processo pai tem threads (asyncio, dask)
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def render(
+        self,
+        product,
+        reprojs: List[xr.Dataset],
+        targets: List[Tuple[str, Any, str]],
+        date: datetime
+    ) -> Dict[str, Optional[BaseException]]:
+        """
+        Gera o produto num processo do pool e o grava em cada alvo (nome,
+        rasterizador, caminho); devolve o erro de cada alvo
+        """
+        shared = []
+        segments = []
+
+        try:
+            for reproj in reprojs:
+                data, segs = SharedDataset.create(reproj)
+                shared.append(data)
+                segments += segs
+
+            future = self._executor.submit(
+                _render, product, shared, targets, date,
+                {'product': product.name}
+            )
+            errors, metrics = future.result()
+            registry.merge(metrics)
+            return errors
+        finally:
+            _unlink(segments)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,9 +1,13 @@
 from .product import Product
+from .composite import Composite
 from .true_color import TrueColor
 from .cmi import CMI
+from .rgb import RGB
 
 __all__ = [
     'Product',
+    'Composite',
     'TrueColor',
-    'CMI'
+    'CMI',
+    'RGB'
 ]
@@ -8,9 +8,14 @@ class CMI:
             self,
             channel: str,
             palette_path: str,
-            range: Tuple = (0, 1)
+            range: Tuple = (0, 1),
+            decimation: str = 'mean'
         ):
-            super().__init__(name=channel, uses=f'ABI-L2-CMIPF/{channel}')
+            super().__init__(
+                name=channel,
+                uses=f'ABI-L2-CMIPF/{channel}',
+                decimation=decimation
+            )
             self._palette_path = palette_path
             self._range = range
 
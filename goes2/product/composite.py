@@ -0,0 +1,156 @@
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import xarray as xr
+
+from goes2.packed import unpack
+
+from .product import Product
+
+Recipe = Callable[[Dict[str, xr.DataArray]], xr.DataArray]
+
+# raio usado pelo EPSG:3857
+EARTH_RADIUS = 6378137.0
+
+
+def normalize(
+    band: xr.DataArray,
+    vmin: float,
+    vmax: float,
+    gamma: float = 1.0
+) -> xr.DataArray:
+    """Leva [vmin, vmax] para [0, 1] (vmin > vmax inverte), com gama"""
+    out = ((band - vmin) / (vmax - vmin)).clip(0, 1)
+    if gamma != 1.0:
+        out = out ** (1 / gamma)
+    return out
+
+
+def blend(
+    a: xr.DataArray,
+    b: xr.DataArray,
+    weight: xr.DataArray
+) -> xr.DataArray:
+    """a onde weight = 1, b onde weight = 0"""
+    return a * weight + b * (1 - weight)
+
+
+def stack(
+    r: xr.DataArray,
+    g: xr.DataArray,
+    b: xr.DataArray,
+    alpha: Optional[xr.DataArray] = None
+) -> xr.DataArray:
+    if alpha is None:
+        alpha = (r.notnull() & g.notnull() & b.notnull()).astype(np.float32)
+
+    return xr.concat(
+        [r, g, b, alpha], dim='band', coords='minimal', compat='override'
+    ).assign_coords(band=['R', 'G', 'B', 'A']).transpose('y', 'x', 'band')
+
+
+def gray(band: xr.DataArray) -> xr.DataArray:
+    return stack(band, band, band)
+
+
+def _to_uint8(block: np.ndarray) -> np.ndarray:
+    out = np.nan_to_num(block, nan=0.0) * 255 + 0.5
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+def to_rgba(rgb: xr.DataArray) -> xr.DataArray:
+    """Converte o RGBA em [0, 1] para uint8 ao fim do grafo preguiçoso"""
+    return xr.apply_ufunc(
+        _to_uint8, rgb,
+        dask='parallelized',
+        output_dtypes=[np.uint8]
+    )
+
+
+def cos_solar_zenith(band: xr.DataArray) -> xr.DataArray:
+    """
+    Cosseno do ângulo zenital solar na grade (EPSG:3857) da banda, no
+    instante `t` da varredura (aproximação da NOAA, ~0.1 grau)
+    """
+    time = band.coords['t'].values.astype('datetime64[s]').item()
+
+    lon = np.degrees(band.x / EARTH_RADIUS)
+    lat = np.degrees(2 * np.arctan(np.exp(band.y / EARTH_RADIUS)) - np.pi / 2)
+
+    day = time.timetuple().tm_yday
+    hour = time.hour + time.minute / 60 + time.second / 3600
+    gamma = 2 * np.pi / 365 * (day - 1 + (hour - 12) / 24)
+
+    declination = (
+        0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma) -
+        0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma) -
+        0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma)
+    )
+    equation_of_time = 229.18 * (
+        0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma) -
+        0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma)
+    )
+
+    solar_time = hour * 60 + equation_of_time + 4 * lon
+    hour_angle = np.radians(solar_time / 4 - 180)
+    lat = np.radians(lat)
+
+    return (
+        np.sin(lat) * np.sin(declination) +
+        np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    )
+
+
+class Composite(Product):
+    """
+    Produto RGB a partir de várias bandas. As bandas são levadas à grade
+    da primeira entrada e a receita monta, de forma preguiçosa, um único
+    grafo (realce, gama, mistura) que só é calculado na rasterização.
+
+    A receita recebe um dicionário canal -> DataArray (CMI) e devolve um
+    RGBA em [0, 1] com dimensões (y, x, band); deve ser uma função de
+    módulo para que o produto possa ir para o pool de processos.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        uses: Tuple[str],
+        recipe: Recipe,
+        chunks: int = 2048,
+        decimation: str = 'mean'
+    ):
+        super().__init__(name=name, uses=uses, decimation=decimation)
+        self._recipe = recipe
+        self._chunks = chunks
+
+    def _align(self, bands: Dict[str, xr.DataArray]):
+        reference = next(iter(bands.values()))
+        resolution = abs(float(reference.x[1] - reference.x[0]))
+
+        aligned = {}
+        for channel, band in bands.items():
+            if not (
+                band.sizes == reference.sizes and
+                np.allclose(band.x, reference.x) and
+                np.allclose(band.y, reference.y)
+            ):
+                band = band.reindex(
+                    x=reference.x, y=reference.y,
+                    method='nearest', tolerance=resolution
+                )
+
+            aligned[channel] = band.chunk(
+                {'y': self._chunks, 'x': self._chunks}
+            )
+        return aligned
+
+    def create(self, *data) -> xr.DataArray:
+        # entradas empacotadas são decodificadas dentro do próprio grafo
+        bands = {
+            use.split('/')[-1]: unpack(datum['CMI'])
+            for use, datum in zip(self.uses, data)
+        }
+
+        rgb = self._recipe(self._align(bands))
+        return to_rgba(rgb)
@@ -1,48 +1,44 @@
 from dataclasses import dataclass
-from typing import Tuple, Union
+from typing import List, Tuple, Union
 
 from abc import ABC, abstractmethod
-from matplotlib.colors import Colormap
 import xarray as xr
 
-from goes2.raster.cpt_utils import load_cpt
-from pathlib import Path
-
-import matplotlib.pyplot as plt
+from goes2.raster.palette import CompiledPalette
+from goes2.scheduling import InputEstimate
 
 
 @dataclass
 class Product(ABC):
     name: str
     uses: Union[Tuple[str], str]
+    # como bandas mais finas que a saída são reduzidas na leitura:
+    # 'mean' (média de blocos) ou 'nearest' (pixel central)
+    decimation: str = 'mean'
 
     def apply_palette(self, data, palette_path, range=(0, 1)):
-        if isinstance(palette_path, Colormap):
-            palette = palette_path
-
-        elif isinstance(palette_path, str):
-            palette_path = Path(palette_path)
-
-            palette = (
-                load_cpt(palette_path)
-                if palette_path.exists()
-                else plt.colormaps[str(palette_path)]
-            )
-
-        vmin, vmax = range
-        if vmin is not None or vmax is not None:
-            norm = plt.Normalize(vmin=vmin, vmax=vmax)
-            normalized_values = norm(data)
-
-        return xr.DataArray(
-            data=palette(normalized_values) * 255,
-            coords={
-                **data.coords,
-                'band': ['R', 'G', 'B', 'A'],  # Assuming RGBA (4 bands)
-            },
-            dims=data.dims + ("band",),
-            attrs=data.attrs
-        )
+        """
+        Índices da paleta (uint8) com a tabela em attrs['palette'];
+        `to_rgba` dá as cores
+        """
+        palette = CompiledPalette.of(palette_path, range)
+        return palette.indexed(data)
+
+    def estimate_memory(self, inputs: List[InputEstimate]) -> int:
+        """
+        Estima o pico de memória, em bytes, para gerar o produto: as
+        entradas decodificadas e reprojetadas, mais os índices da paleta
+        (float32), o RGBA (uint8) e a pirâmide de tiles do resultado. Com
+        saída em paleta o RGBA não existe, e a estimativa sobra
+        """
+        total = 0
+        output_pixels = 0
+        for estimate in inputs:
+            total += estimate.source_bytes
+            total += estimate.output_pixels * estimate.itemsize
+            output_pixels = max(output_pixels, estimate.output_pixels)
+
+        return total + output_pixels * (4 + 4 + 6)
 
     @abstractmethod
     def create(self, data) -> xr.DataArray:
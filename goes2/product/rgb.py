@@ -0,0 +1,91 @@
+import numpy as np
+
+from goes2.raster.palette import CompiledPalette
+
+from .composite import (
+    Composite, blend, cos_solar_zenith, gray, normalize, stack
+)
+
+
+def true_color(bands):
+    # verde simulado (o ABI não tem banda verde)
+    green = 0.45 * bands['C02'] + 0.1 * bands['C03'] + 0.45 * bands['C01']
+    return stack(
+        normalize(bands['C02'], 0, 1, gamma=2.2),
+        normalize(green, 0, 1, gamma=2.2),
+        normalize(bands['C01'], 0, 1, gamma=2.2)
+    )
+
+
+def airmass(bands):
+    return stack(
+        normalize(bands['C08'] - bands['C10'], -26.2, 0.6),
+        normalize(bands['C12'] - bands['C13'], -43.2, 6.7),
+        normalize(bands['C08'], 243.9, 208.5)
+    )
+
+
+def sandwich(bands):
+    visible = gray(normalize(bands['C02'], 0, 1, gamma=2.0))
+
+    palette = CompiledPalette.of(
+        'res/palettes/ir_realce_dsa_kelvin.cpt', (193.15, 313.15)
+    )
+    infrared = palette.colorize(bands['C13']) / 255
+
+    # só os topos frios aparecem sobre o visível
+    weight = normalize(bands['C13'], 243.15, 213.15)
+    rgb = blend(infrared, visible, weight)
+    return rgb.where(rgb.band != 'A', visible.sel(band='A'))
+
+
+def day_night(bands):
+    day = true_color(bands)
+    night = gray(normalize(bands['C13'], 310, 200))
+
+    # transição entre 78 e 88 graus de ângulo zenital
+    weight = normalize(
+        cos_solar_zenith(bands['C13']),
+        np.cos(np.radians(88)),
+        np.cos(np.radians(78))
+    )
+    return blend(day, night, weight)
+
+
+class RGB:
+    recipes = {
+        'truecolor': Composite(
+            'truecolor',
+            ('ABI-L2-CMIPF/C01', 'ABI-L2-CMIPF/C02', 'ABI-L2-CMIPF/C03'),
+            true_color
+        ),
+        'airmass': Composite(
+            'airmass',
+            (
+                'ABI-L2-CMIPF/C08', 'ABI-L2-CMIPF/C10',
+                'ABI-L2-CMIPF/C12', 'ABI-L2-CMIPF/C13'
+            ),
+            airmass
+        ),
+        'sandwich': Composite(
+            'sandwich',
+            ('ABI-L2-CMIPF/C02', 'ABI-L2-CMIPF/C13'),
+            sandwich
+        ),
+        'daynight': Composite(
+            'daynight',
+            (
+                'ABI-L2-CMIPF/C01', 'ABI-L2-CMIPF/C02',
+                'ABI-L2-CMIPF/C03', 'ABI-L2-CMIPF/C13'
+            ),
+            day_night
+        ),
+    }
+
+    @staticmethod
+    def ALL():
+        return list(RGB.recipes.values())
+
+    @staticmethod
+    def of(name: str):
+        return RGB.recipes[name]
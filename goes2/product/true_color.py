@@ -1,19 +1,8 @@
-from dataclasses import dataclass
-from typing import Tuple
-from .product import Product
+from .composite import Composite
+from .rgb import RGB, true_color
 
-import xarray as xr
 
-
-@dataclass
-class TrueColor(Product):
-    uses: Tuple[str] = (
-        'ABI-L2-CMIPF/C01',
-    )
-
-    name: str = "truecolor"
-
-    def create(self, data) -> xr.DataArray:
-        da = data['CMI']
-        da = da * 255
-        return da
+class TrueColor(Composite):
+    def __init__(self):
+        truecolor = RGB.of('truecolor')
+        super().__init__(truecolor.name, truecolor.uses, true_color)
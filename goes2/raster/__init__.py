@@ -1,11 +1,27 @@
-from .rasterizer import Rasterizer
+from .rasterizer import Rasterizer, stamp, write_all
 from .image import Image
 from .plot import Plot
 from .gdal_tiles import GDALTiles
+from .xyz_tiles import XYZTiles
+from .tile_store import TileStore
+from .cog import COG
+from .encoding import Encoding
+from .palette import to_rgba
+from .zarr_series import ZarrTimeSeries
+from .animation import AnimatedLoop
 
 __all__ = [
     'Rasterizer',
     'Image',
     'Plot',
-    'GDALTiles'
+    'GDALTiles',
+    'XYZTiles',
+    'TileStore',
+    'COG',
+    'Encoding',
+    'to_rgba',
+    'ZarrTimeSeries',
+    'AnimatedLoop',
+    'stamp',
+    'write_all'
 ]
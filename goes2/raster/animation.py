@@ -0,0 +1,347 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+import glob
+import io
+import os
+import struct
+import threading
+
+import numpy as np
+import PIL.Image
+
+from goes2.metrics import registry
+from goes2.storage.catalog import format_timestamp, parse_timestamp
+
+if TYPE_CHECKING:
+    from goes2.storage import StorageEvent, TimeSeriesStorage
+
+
+FORMATS = ('WEBP', 'GIF')
+IMAGE_EXTENSIONS = ('.png', '.webp', '.jpeg', '.jpg', '.gif')
+
+
+@dataclass(frozen=True)
+class Frame:
+    """Um quadro já codificado, pronto para ser concatenado na animação"""
+    width: int
+    height: int
+    # WebP: chunks ALPH/VP8/VP8L; GIF: descritor sem a posição, tabela
+    # local, código LZW e sub-blocos
+    data: bytes
+    # só GIF
+    transparency: Optional[int] = None
+
+
+def _riff_chunks(data: bytes):
+    offset = 12
+    while offset + 8 <= len(data):
+        kind = data[offset:offset + 4]
+        size = struct.unpack('<I', data[offset + 4:offset + 8])[0]
+        end = offset + 8 + size + (size & 1)
+        yield kind, data[offset:end]
+        offset = end
+
+
+def _riff_chunk(kind: bytes, payload: bytes) -> bytes:
+    padding = b'\0' if len(payload) & 1 else b''
+    return kind + struct.pack('<I', len(payload)) + payload + padding
+
+
+def _uint24(value: int) -> bytes:
+    return struct.pack('<I', value)[:3]
+
+
+def _gif_sub_blocks_end(data: bytes, offset: int) -> int:
+    while data[offset]:
+        offset += data[offset] + 1
+    return offset + 1
+
+
+class AnimatedLoop:
+    """
+    Animação (WebP ou GIF) dos últimos `frames` horários de um produto do
+    armazenamento, mantida de forma incremental: cada quadro é codificado
+    uma única vez, quando o horário fica pronto, e a animação é só a
+    concatenação dos quadros já codificados. Os eventos do armazenamento
+    ('ready' e 'removed', inclusive os da retenção) mantêm o laço igual à
+    série guardada.
+
+    Os quadros vêm das saídas de imagem (`Image`) do produto; pirâmides de
+    tiles não têm um quadro único e são ignoradas. O trabalho roda numa
+    thread própria, fora da produção.
+    """
+
+    def __init__(
+        self,
+        store: 'TimeSeriesStorage',
+        product: str,
+        path: str,
+        format: str = 'WEBP',
+        frames: int = 12,
+        duration: int = 500,
+        max_size: Optional[int] = 1024,
+        lossless: bool = False,
+        quality: int = 75
+    ):
+        """
+        Args:
+            store: Armazenamento com as imagens do produto
+            product: Nome do produto no armazenamento
+            path: Arquivo da animação (a extensão é acrescentada)
+            frames: Número máximo de quadros
+            duration: Duração de cada quadro, em ms
+            max_size: Maior lado dos quadros, em pixels (None mantém)
+        """
+        self._format = format.upper()
+        if self._format not in FORMATS:
+            raise ValueError(f'formato inválido: {format} (use {FORMATS})')
+
+        self._store = store
+        self.product = product
+        self.path = f'{path}.{self._format.lower()}'
+        self._frames = frames
+        self._duration = duration
+        self._max_size = max_size
+        self._lossless = lossless
+        self._quality = quality
+
+        self._encoded: Dict[datetime, Frame] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(1)
+
+        store.subscribe(self._on_event)
+        self._executor.submit(self._warm)
+
+    def _on_event(self, event: 'StorageEvent'):
+        if event.product != self.product:
+            return
+
+        # o horário como está no catálogo (o mesmo do `_warm`), para que o
+        # quadro reprocessado substitua o antigo
+        timestamp = parse_timestamp(format_timestamp(event.timestamp))
+        if event.kind == 'ready':
+            self._executor.submit(self._add, timestamp, event.path)
+        elif event.kind == 'removed':
+            self._executor.submit(self._remove, timestamp)
+
+    def _warm(self):
+        """Quadros da série já guardada, ao iniciar"""
+        latest = self._store.latest(self.product, self._frames)
+        for timestamp, path in reversed(latest):
+            self._encode(timestamp, path, replace=False)
+        self._write()
+
+    def _image_path(self, path: str) -> Optional[str]:
+        candidates = [path] + sorted(glob.glob(glob.escape(path) + '.*'))
+        for candidate in candidates:
+            if candidate.lower().endswith(IMAGE_EXTENSIONS) and \
+                    os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def _load(self, path: str) -> Optional[PIL.Image.Image]:
+        image_path = self._image_path(path)
+        if image_path is None:
+            print(f'{self.product}: sem imagem em {path} para a animação')
+            return None
+
+        image = PIL.Image.open(image_path)
+        image.load()
+        if self._max_size is not None:
+            image.thumbnail((self._max_size, self._max_size))
+        return image
+
+    def _encode(self, timestamp: datetime, path: str, replace: bool = True):
+        """
+        Codifica o quadro do horário. Um 'ready' de um horário já presente
+        é um reprocessamento e substitui o quadro; só o `_warm` pula os já
+        codificados
+        """
+        with self._lock:
+            if not replace and timestamp in self._encoded:
+                return
+
+        image = self._load(path)
+        if image is None:
+            return
+
+        with registry.timer('loop_frame', product=self.product):
+            frame = (
+                self._encode_webp(image) if self._format == 'WEBP'
+                else self._encode_gif(image)
+            )
+
+        with self._lock:
+            self._encoded[timestamp] = frame
+            # só os mais novos ficam
+            for old in sorted(self._encoded)[:-self._frames]:
+                del self._encoded[old]
+
+    def _encode_webp(self, image: PIL.Image.Image) -> Frame:
+        buffer = io.BytesIO()
+        image.convert('RGBA').save(
+            buffer, 'WEBP',
+            lossless=self._lossless,
+            quality=self._quality
+        )
+
+        # do arquivo de um quadro só, os chunks do bitstream (e do alfa)
+        # entram como estão no ANMF
+        data = b''.join(
+            chunk for kind, chunk in _riff_chunks(buffer.getvalue())
+            if kind in (b'ALPH', b'VP8 ', b'VP8L')
+        )
+        return Frame(image.width, image.height, data)
+
+    def _encode_gif(self, image: PIL.Image.Image) -> Frame:
+        rgba = np.asarray(image.convert('RGBA'))
+
+        # 255 cores para a imagem e o índice 255 para o transparente
+        quantized = image.convert('RGB').quantize(
+            255, method=PIL.Image.Quantize.FASTOCTREE
+        )
+        indices = np.asarray(quantized).copy()
+        indices[rgba[..., 3] < 128] = 255
+
+        palette = (quantized.getpalette() or [])[:255 * 3]
+        palette += [0] * (256 * 3 - len(palette))
+
+        paletted = PIL.Image.fromarray(indices, mode='P')
+        paletted.putpalette(palette)
+
+        buffer = io.BytesIO()
+        paletted.save(buffer, 'GIF', transparency=255, interlace=False)
+        return self._gif_frame(buffer.getvalue(), image.width, image.height)
+
+    @staticmethod
+    def _gif_frame(data: bytes, width: int, height: int) -> Frame:
+        """Separa a imagem de um GIF de um quadro só, com tabela local"""
+        packed = data[10]
+        offset = 13
+        table = b''
+        bits = 0
+        if packed & 0x80:
+            bits = packed & 0x07
+            size = 3 * 2 ** (bits + 1)
+            table = data[offset:offset + size]
+            offset += size
+
+        transparency = None
+        while data[offset] != 0x2C:
+            if data[offset] != 0x21:
+                raise ValueError('GIF inesperado')
+            if data[offset + 1] == 0xF9 and data[offset + 3] & 0x01:
+                transparency = data[offset + 6]
+            offset = _gif_sub_blocks_end(data, offset + 2)
+
+        descriptor = data[offset:offset + 10]
+        local = descriptor[9]
+        offset += 10
+        if local & 0x80:
+            bits = local & 0x07
+            size = 3 * 2 ** (bits + 1)
+            table = data[offset:offset + size]
+            offset += size
+
+        end = _gif_sub_blocks_end(data, offset + 1)
+        flags = 0x80 | (local & 0x40) | bits
+        image = (
+            struct.pack('<HH', width, height) + bytes((flags,)) +
+            table + data[offset:end]
+        )
+        return Frame(width, height, image, transparency)
+
+    def _add(self, timestamp: datetime, path: str):
+        try:
+            self._encode(timestamp, path)
+            self._write()
+        except Exception as e:
+            print(f'erro no quadro {timestamp} de {self.product}: {e}')
+
+    def _remove(self, timestamp: datetime):
+        with self._lock:
+            removed = self._encoded.pop(timestamp, None)
+        if removed is not None:
+            self._write()
+
+    def _ordered(self) -> List[Frame]:
+        with self._lock:
+            return [self._encoded[t] for t in sorted(self._encoded)]
+
+    def _assemble_webp(self, frames: List[Frame]) -> bytes:
+        width = max(frame.width for frame in frames)
+        height = max(frame.height for frame in frames)
+
+        # VP8X com animação e alfa; ANIM com laço infinito
+        header = _riff_chunk(
+            b'VP8X',
+            bytes((0x12, 0, 0, 0)) + _uint24(width - 1) + _uint24(height - 1)
+        )
+        anim = _riff_chunk(b'ANIM', b'\0\0\0\0' + struct.pack('<H', 0))
+
+        chunks = [header, anim]
+        for frame in frames:
+            # sem mistura com o quadro anterior: o transparente é
+            # transparente
+            chunks.append(_riff_chunk(
+                b'ANMF',
+                _uint24(0) + _uint24(0) +
+                _uint24(frame.width - 1) + _uint24(frame.height - 1) +
+                _uint24(self._duration) + bytes((0x02,)) + frame.data
+            ))
+
+        body = b'WEBP' + b''.join(chunks)
+        return b'RIFF' + struct.pack('<I', len(body)) + body
+
+    def _assemble_gif(self, frames: List[Frame]) -> bytes:
+        width = max(frame.width for frame in frames)
+        height = max(frame.height for frame in frames)
+
+        parts = [
+            b'GIF89a',
+            struct.pack('<HHBBB', width, height, 0x70, 0, 0),
+            # NETSCAPE2.0: laço infinito
+            b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00',
+        ]
+        delay = max(self._duration // 10, 1)
+        for frame in frames:
+            transparent = frame.transparency is not None
+            # descarte 2 (restaura o fundo) antes do próximo quadro
+            flags = (2 << 2) | (1 if transparent else 0)
+            parts.append(struct.pack(
+                '<BBBBHBB', 0x21, 0xF9, 4, flags, delay,
+                frame.transparency or 0, 0
+            ))
+            parts.append(b'\x2c' + struct.pack('<HH', 0, 0) + frame.data)
+
+        parts.append(b'\x3b')
+        return b''.join(parts)
+
+    def _write(self):
+        frames = self._ordered()
+        if not frames:
+            # a retenção removeu todos os horários: a animação também sai
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+
+        with registry.timer('loop', product=self.product):
+            data = (
+                self._assemble_webp(frames) if self._format == 'WEBP'
+                else self._assemble_gif(frames)
+            )
+
+            output = Path(self.path)
+            output.parent.mkdir(exist_ok=True, parents=True)
+            temp = output.with_name(f'.{output.name}.{os.getpid()}')
+            temp.write_bytes(data)
+            os.replace(temp, output)
+
+    def close(self):
+        """Espera os quadros pendentes e encerra a thread"""
+        self._executor.shutdown(wait=True)
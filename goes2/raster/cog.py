@@ -0,0 +1,96 @@
+from pathlib import Path
+from typing import Optional
+import os
+import threading
+
+import numpy as np
+import rasterio.shutil
+import rioxarray  # noqa: F401 (registra o acessor .rio)
+import xarray as xr
+
+from goes2.metrics import registry
+
+from .palette import to_rgba
+from .rasterizer import Rasterizer
+
+
+class COG(Rasterizer):
+    """
+    Cloud-Optimized GeoTIFF: blocos internos, compressão e overviews
+    internas, legível por requisições de intervalo.
+
+    Os chunks do grafo dask são calculados em paralelo e gravados num
+    GeoTIFF em blocos (a trava serializa só a escrita), sem materializar o
+    array inteiro; o driver COG do GDAL então monta as overviews e
+    reorganiza o arquivo no layout otimizado.
+    """
+
+    def __init__(
+        self,
+        compress: str = 'DEFLATE',
+        level: Optional[int] = None,
+        blocksize: int = 512,
+        overview_resampling: str = 'AVERAGE',
+        threads: str = 'ALL_CPUS'
+    ):
+        self._compress = compress.upper()
+        self._level = level
+        self._blocksize = blocksize
+        self._resampling = overview_resampling.upper()
+        self._threads = threads
+
+    def _options(self, cog: bool = False) -> dict:
+        options = {'compress': self._compress}
+        if self._level is not None:
+            # o driver COG usa LEVEL; o GTiff, uma opção por algoritmo
+            if cog:
+                key = 'level'
+            elif self._compress == 'ZSTD':
+                key = 'zstd_level'
+            else:
+                key = 'zlevel'
+            options[key] = self._level
+        return options
+
+    def to_raster(self, data_array: xr.DataArray, path: str):
+        data_array = to_rgba(data_array).transpose('band', 'y', 'x')
+        data_array = data_array.astype(np.uint8)
+        data_array.rio.write_crs('EPSG:3857', inplace=True)
+
+        # chunks múltiplos dos blocos do TIFF: cada chunk escreve blocos
+        # inteiros
+        step = self._blocksize * 4
+        data_array = data_array.chunk({'band': -1, 'y': step, 'x': step})
+
+        output = Path(path + '.tif')
+        output.parent.mkdir(exist_ok=True, parents=True)
+        temp = output.with_name(f'.{output.name}.{os.getpid()}.tmp')
+
+        try:
+            with registry.timer('compute'):
+                data_array.rio.to_raster(
+                    temp,
+                    driver='GTiff',
+                    tiled=True,
+                    blockxsize=self._blocksize,
+                    blockysize=self._blocksize,
+                    photometric='RGB' if data_array.sizes['band'] >= 3
+                    else 'MINISBLACK',
+                    alpha='YES' if data_array.sizes['band'] == 4 else 'NO',
+                    lock=threading.Lock(),
+                    **self._options()
+                )
+
+            with registry.timer('cog'):
+                rasterio.shutil.copy(
+                    temp,
+                    output,
+                    driver='COG',
+                    blocksize=self._blocksize,
+                    overview_resampling=self._resampling,
+                    num_threads=self._threads,
+                    **self._options(cog=True)
+                )
+        finally:
+            if temp.exists():
+                os.remove(temp)
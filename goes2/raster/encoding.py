@@ -0,0 +1,268 @@
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import io
+import struct
+import zlib
+
+import numpy as np
+import PIL.Image
+
+
+FORMATS = ('PNG', 'JPEG', 'WEBP')
+
+# tipos de filtro por linha do PNG (RFC 2083, 6.1)
+FILTERS = {'none': 0, 'sub': 1, 'up': 2, 'average': 3, 'paeth': 4}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+ADLER_BASE = 65521
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack('>I', len(data)) + kind + data +
+        struct.pack('>I', zlib.crc32(kind + data))
+    )
+
+
+def _adler32_combine(first: int, second: int, second_length: int) -> int:
+    """adler32 da concatenação, a partir dos adler32 de cada parte"""
+    remainder = second_length % ADLER_BASE
+    sum1 = first & 0xffff
+    sum2 = (remainder * sum1) % ADLER_BASE
+    sum1 += (second & 0xffff) + ADLER_BASE - 1
+    sum2 += (first >> 16) + (second >> 16) + ADLER_BASE - remainder
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum2 >= ADLER_BASE << 1:
+        sum2 -= ADLER_BASE << 1
+    if sum2 >= ADLER_BASE:
+        sum2 -= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _zlib_header(level: int) -> bytes:
+    cmf = 0x78
+    flevel = 0 if level < 2 else 1 if level < 6 else 2 if level == 6 else 3
+    flg = flevel << 6
+    flg += 31 - (cmf * 256 + flg) % 31
+    return bytes((cmf, flg))
+
+
+def _filter(
+    rows: np.ndarray,
+    prior: np.ndarray,
+    bpp: int,
+    kind: str
+) -> np.ndarray:
+    """
+    Aplica o filtro às linhas (n, largura*bpp) e prefixa o byte do tipo.
+    `prior` é a linha anterior à primeira (zeros no início da imagem)
+    """
+    out = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    out[:, 0] = FILTERS[kind]
+    if kind == 'none':
+        out[:, 1:] = rows
+        return out
+
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    up = np.concatenate((prior[None], rows[:-1]))
+
+    if kind == 'sub':
+        out[:, 1:] = rows - left
+    elif kind == 'up':
+        out[:, 1:] = rows - up
+    elif kind == 'average':
+        mean = (left.astype(np.uint16) + up) >> 1
+        out[:, 1:] = rows - mean.astype(np.uint8)
+    else:
+        upleft = np.zeros_like(rows)
+        upleft[:, bpp:] = up[:, :-bpp]
+
+        a, b, c = (v.astype(np.int16) for v in (left, up, upleft))
+        p = a + b - c
+        pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+        predictor = np.where(
+            (pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upleft)
+        )
+        out[:, 1:] = rows - predictor
+    return out
+
+
+def _deflate_stripe(
+    raw: np.ndarray,
+    start: int,
+    stop: int,
+    bpp: int,
+    kind: str,
+    level: int,
+    last: bool
+) -> Tuple[bytes, int, int]:
+    prior = raw[start - 1] if start else np.zeros_like(raw[0])
+    data = _filter(raw[start:stop], prior, bpp, kind).tobytes()
+
+    # deflate cru; cada faixa termina num flush de sincronização (alinhado
+    # em bytes, sem bloco final) e as faixas podem ser concatenadas
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9)
+    compressed = compressor.compress(data) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    )
+    return compressed, zlib.adler32(data), len(data)
+
+
+def encode_png(
+    array: np.ndarray,
+    palette: Optional[np.ndarray] = None,
+    level: int = 6,
+    filter: str = 'none',
+    stripe_rows: int = 256,
+    pool: Optional[Executor] = None
+) -> bytes:
+    """
+    PNG de um array (altura, largura, 4) RGBA, (altura, largura, 3) RGB ou
+    (altura, largura) de índices de `palette` (tabela RGBA, até 256 cores;
+    o alfa vai no chunk tRNS).
+
+    As faixas de `stripe_rows` linhas são filtradas e comprimidas em
+    paralelo no `pool` (zlib e numpy liberam o GIL), e os fluxos deflate
+    concatenados num único IDAT válido; o custo é só perder o contexto de
+    compressão entre faixas.
+    """
+    if filter not in FILTERS:
+        raise ValueError(f'filtro inválido: {filter} (use {list(FILTERS)})')
+
+    array = np.ascontiguousarray(array, dtype=np.uint8)
+    height, width = array.shape[:2]
+
+    if array.ndim == 2:
+        if palette is None:
+            raise ValueError('índices sem paleta')
+        color_type, bpp = 3, 1
+    elif array.shape[2] == 4:
+        color_type, bpp = 6, 4
+    elif array.shape[2] == 3:
+        color_type, bpp = 2, 3
+    else:
+        raise ValueError(f'forma inválida para PNG: {array.shape}')
+
+    raw = array.reshape(height, width * bpp)
+    stripes = [
+        (start, min(start + stripe_rows, height))
+        for start in range(0, height, stripe_rows)
+    ]
+
+    def deflate(index: int):
+        start, stop = stripes[index]
+        return _deflate_stripe(
+            raw, start, stop, bpp, filter, level,
+            last=index == len(stripes) - 1
+        )
+
+    if pool is None or len(stripes) == 1:
+        parts = [deflate(i) for i in range(len(stripes))]
+    else:
+        parts = list(pool.map(deflate, range(len(stripes))))
+
+    checksum = 1
+    for _, adler, length in parts:
+        checksum = _adler32_combine(checksum, adler, length)
+
+    header = struct.pack(
+        '>IIBBBBB', width, height, 8, color_type, 0, 0, 0
+    )
+    chunks: List[bytes] = [PNG_SIGNATURE, _chunk(b'IHDR', header)]
+
+    if color_type == 3:
+        table = np.asarray(palette, dtype=np.uint8)
+        chunks.append(_chunk(b'PLTE', table[:, :3].tobytes()))
+
+        # alfa até a última entrada não opaca; as demais são opacas
+        alpha = table[:, 3] if table.shape[1] == 4 else np.array([], np.uint8)
+        translucent = np.flatnonzero(alpha != 255)
+        if len(translucent):
+            chunks.append(
+                _chunk(b'tRNS', alpha[:translucent[-1] + 1].tobytes())
+            )
+
+    chunks.append(_chunk(b'IDAT', _zlib_header(level) + parts[0][0]))
+    for compressed, _, _ in parts[1:]:
+        chunks.append(_chunk(b'IDAT', compressed))
+    chunks.append(_chunk(b'IDAT', struct.pack('>I', checksum)))
+    chunks.append(_chunk(b'IEND', b''))
+
+    return b''.join(chunks)
+
+
+@dataclass(frozen=True)
+class Encoding:
+    """
+    Formato e opções de codificação das imagens e tiles.
+
+    PNG: `level` do zlib (0-9; 1 é bem mais rápido, com arquivos pouco
+    maiores) e `filter` das linhas ('none' é o recomendado para paleta;
+    'paeth' ou 'up' costumam comprimir melhor o RGBA). WEBP: `lossless`,
+    ou `quality` (0-100) com perdas; `method` (0-6) troca velocidade por
+    tamanho. JPEG: `quality`.
+    """
+    format: str = 'PNG'
+    level: int = 6
+    filter: str = 'none'
+    quality: int = 80
+    lossless: bool = True
+    method: int = 4
+    stripe_rows: int = 256
+
+    def __post_init__(self):
+        format = self.format.upper()
+        if format == 'JPG':
+            format = 'JPEG'
+        if format not in FORMATS:
+            raise ValueError(f'formato inválido: {self.format}')
+        if self.filter not in FILTERS:
+            raise ValueError(f'filtro inválido: {self.filter}')
+        object.__setattr__(self, 'format', format)
+
+    @property
+    def extension(self) -> str:
+        return 'jpg' if self.format == 'JPEG' else self.format.lower()
+
+    @property
+    def supports_palette(self) -> bool:
+        return self.format == 'PNG'
+
+    def encode(
+        self,
+        array: np.ndarray,
+        palette: Optional[np.ndarray] = None,
+        pool: Optional[Executor] = None
+    ) -> bytes:
+        """
+        Codifica um array RGBA, ou de índices de `palette`. Só o PNG é
+        dividido em faixas no `pool`; o WebP não tem como (e é limitado a
+        16383 pixels de lado)
+        """
+        if self.format == 'PNG':
+            return encode_png(
+                array, palette, self.level, self.filter,
+                self.stripe_rows, pool
+            )
+
+        if array.ndim == 2:
+            array = np.take(np.asarray(palette, np.uint8), array, axis=0)
+
+        buffer = io.BytesIO()
+        if self.format == 'JPEG':
+            image = PIL.Image.fromarray(array[..., :3], mode='RGB')
+            image.save(buffer, 'JPEG', quality=self.quality)
+        else:
+            image = PIL.Image.fromarray(array, mode='RGBA')
+            image.save(
+                buffer, 'WEBP',
+                lossless=self.lossless,
+                quality=self.quality,
+                method=self.method
+            )
+        return buffer.getvalue()
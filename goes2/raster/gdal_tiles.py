@@ -1,12 +1,14 @@
 from pathlib import Path
+from .palette import to_rgba
 from .rasterizer import Rasterizer
+from .tile_store import TileStore
 
 import xarray as xr
 import numpy as np
 
 from uuid import uuid4
 
-from typing import Tuple
+from typing import Optional, Tuple
 
 import subprocess
 import os
@@ -16,14 +18,16 @@ class GDALTiles(Rasterizer):
         self, 
         format: str = 'PNG', 
         zoom_range: Tuple[int] = (4, 6),
-        max_workers = os.cpu_count() | 4
+        max_workers = os.cpu_count() | 4,
+        tile_store: Optional[TileStore] = None
     ):
         self._format = format.upper()
         self._min_zoom, self._max_zoom = zoom_range
         self._max_workers = max_workers
+        self._tile_store = tile_store
 
     def to_raster(self, data_array: xr.DataArray, path):
-        data_array = data_array.transpose('band', 'y', 'x')
+        data_array = to_rgba(data_array).transpose('band', 'y', 'x')
         data_array = data_array.astype(np.uint8)
 
         temp_path = Path('temp')
@@ -43,4 +47,8 @@ class GDALTiles(Rasterizer):
             path
         ])
 
-        os.remove(tif_path)        
+        os.remove(tif_path)
+
+        # o gdal2tiles grava todos os tiles; os repetidos viram hardlinks
+        if self._tile_store is not None:
+            self._tile_store.adopt_tree(path)        
@@ -1,23 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import os
+
+from .encoding import Encoding
+from .palette import is_indexed, to_rgba
 from .rasterizer import Rasterizer
 
-import PIL.Image
 import xarray as xr
 
 import numpy as np
 
 
 class Image(Rasterizer):
-    def __init__(self, format: str):
-        self._format = format.upper()
+    """
+    Imagem única do produto. Com `paletted`, produtos em paleta são
+    gravados como PNG de 8 bits com paleta e tRNS; o PNG é comprimido em
+    faixas paralelas em `max_workers` threads (ver `Encoding`).
+    """
 
-        if self._format == 'JPG':
-            self._format = 'JPEG'
+    def __init__(
+        self,
+        format: str,
+        paletted: bool = False,
+        encoding: Optional[Encoding] = None,
+        max_workers: int = os.cpu_count() or 4
+    ):
+        self._encoding = encoding or Encoding(format)
+        self._format = self._encoding.format
+        self._paletted = paletted
+        self._max_workers = max_workers
 
     def to_raster(self, data_array: xr.DataArray, path: str):
-        data_array = data_array.astype(np.uint8)
-        data_array = data_array.fillna(0)
+        palette = None
+        if self._paletted and is_indexed(data_array) and \
+                self._encoding.supports_palette:
+            palette = np.asarray(data_array.attrs['palette'], np.uint8)
+            pixels = np.asarray(data_array.values, dtype=np.uint8)
+        else:
+            data_array = to_rgba(data_array).astype(np.uint8)
+            data_array = data_array.fillna(0)
+            pixels = data_array.values
+
+        with ThreadPoolExecutor(self._max_workers) as pool:
+            payload = self._encoding.encode(pixels, palette, pool)
 
-        PIL.Image.fromarray(
-            data_array.values,
-            mode='RGBA'
-        ).save(path + f'.{self._format.lower()}', self._format)
+        with open(path + f'.{self._format.lower()}', 'wb') as file:
+            file.write(payload)
@@ -0,0 +1,208 @@
+import time
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Tuple, Union
+
+import numpy as np
+import xarray as xr
+import dask.array as da
+
+import matplotlib.pyplot as plt
+from matplotlib.colors import Colormap
+
+from goes2.metrics import registry
+from goes2.packed import Packing, _table, strip
+from goes2.raster.cpt_utils import load_cpt
+
+
+@lru_cache(maxsize=None)
+def load_colormap(name: str) -> Colormap:
+    """Carrega um .cpt (se o caminho existir) ou um colormap do matplotlib"""
+    path = Path(name)
+    return load_cpt(path) if path.exists() else plt.colormaps[name]
+
+
+class CompiledPalette:
+    """
+    Paleta quantizada numa tabela RGBA uint8 de tamanho fixo. Os valores são
+    convertidos em índices uma única vez e a cor é obtida por um único take,
+    sem o intermediário RGBA em float64 do matplotlib.
+
+    Para variáveis inteiras empacotadas (int16 do CMI, por exemplo), escala,
+    offset e valores ausentes são incorporados numa tabela com uma cor por
+    código bruto, e a colorização é um único take sobre os inteiros.
+    """
+
+    LEVELS = 255
+    NODATA = 255
+
+    def __init__(self, colormap: Colormap, range: Tuple[float, float]):
+        self.vmin, self.vmax = (float(v) for v in range)
+        if self.vmax == self.vmin:
+            raise ValueError(f'intervalo inválido para a paleta: {range}')
+
+        table = np.zeros((self.LEVELS + 1, 4), dtype=np.uint8)
+        colors = colormap(np.linspace(0, 1, self.LEVELS))
+        table[:self.LEVELS] = np.rint(colors * 255)
+        table[self.NODATA] = np.rint(np.array(colormap.get_bad()) * 255)
+        self.table = table
+        self._packed = {}
+
+    @staticmethod
+    def of(
+        palette: Union[str, Colormap],
+        range: Tuple[float, float] = (0, 1)
+    ) -> 'CompiledPalette':
+        if isinstance(palette, Colormap):
+            # Colormap não é hashable (nem tem um nome garantidamente
+            # único); compilar a tabela é barato
+            return CompiledPalette(palette, tuple(range))
+        if isinstance(palette, Path):
+            palette = str(palette)
+        return _compile(palette, tuple(range))
+
+    def index(self, block: np.ndarray) -> np.ndarray:
+        scale = self.LEVELS / (self.vmax - self.vmin)
+        scaled = np.asarray(block, dtype=np.float32) - np.float32(self.vmin)
+        scaled *= np.float32(scale)
+
+        nodata = np.isnan(scaled)
+        np.clip(scaled, 0, self.LEVELS - 1, out=scaled)
+
+        indices = scaled.astype(np.uint8)
+        indices[nodata] = self.NODATA
+        return indices
+
+    def rgba(self, block: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        indices = self.index(block)
+        out = np.empty(indices.shape + (4,), dtype=np.uint8)
+        np.take(self.table, indices, axis=0, out=out)
+
+        # por bloco: roda nas threads do dask, fora do contexto do produto
+        registry.observe(
+            'stage_seconds', time.perf_counter() - start, stage='palette'
+        )
+        return out
+
+    def packed_index_table(self, packing: Packing) -> np.ndarray:
+        """Índice da paleta de cada código bruto possível"""
+        key = ('index', packing)
+        table = self._packed.get(key)
+        if table is None:
+            table = self._packed[key] = self.index(_table(packing))
+        return table
+
+    def packed_index(self, packing: Packing, block: np.ndarray) -> np.ndarray:
+        return np.take(self.packed_index_table(packing), packing.codes(block))
+
+    def packed_table(self, packing: Packing) -> np.ndarray:
+        """Cor RGBA de cada código bruto possível (65536 x 4 para int16)"""
+        table = self._packed.get(packing)
+        if table is None:
+            table = self._packed[packing] = self.table[
+                self.packed_index_table(packing)
+            ]
+        return table
+
+    def packed_rgba(self, packing: Packing, block: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        table = self.packed_table(packing)
+        codes = packing.codes(block)
+        out = np.empty(codes.shape + (4,), dtype=np.uint8)
+        np.take(table, codes, axis=0, out=out)
+
+        registry.observe(
+            'stage_seconds', time.perf_counter() - start, stage='palette'
+        )
+        return out
+
+    def indexed(self, data: xr.DataArray) -> xr.DataArray:
+        """
+        Índices da paleta (uint8, um byte por pixel), com a tabela RGBA em
+        attrs['palette']: os rasterizadores gravam PNG com paleta ou
+        expandem para RGBA com `to_rgba`
+        """
+        packing = Packing.of(data)
+        index = (
+            self.index if packing is None
+            else partial(self.packed_index, packing)
+        )
+
+        if isinstance(data.data, da.Array):
+            indices = data.data.map_blocks(index, dtype=np.uint8)
+        else:
+            indices = index(data.values)
+
+        attrs = data.attrs if packing is None else strip(data.attrs)
+        return xr.DataArray(
+            data=indices,
+            coords=data.coords,
+            dims=data.dims,
+            attrs={**attrs, 'palette': self.table}
+        )
+
+    def colorize(self, data: xr.DataArray) -> xr.DataArray:
+        packing = Packing.of(data)
+        rgba = (
+            self.rgba if packing is None
+            else partial(self.packed_rgba, packing)
+        )
+
+        if isinstance(data.data, da.Array):
+            colored = data.data.map_blocks(
+                rgba,
+                dtype=np.uint8,
+                new_axis=data.ndim,
+                chunks=data.data.chunks + ((4,),)
+            )
+        else:
+            colored = rgba(data.values)
+
+        return xr.DataArray(
+            data=colored,
+            coords={
+                **data.coords,
+                'band': ['R', 'G', 'B', 'A'],
+            },
+            dims=data.dims + ('band',),
+            attrs=data.attrs if packing is None else strip(data.attrs)
+        )
+
+
+def is_indexed(data: xr.DataArray) -> bool:
+    return 'palette' in data.attrs and 'band' not in data.dims
+
+
+def to_rgba(data: xr.DataArray) -> xr.DataArray:
+    """Expande índices de paleta (ver `CompiledPalette.indexed`) em RGBA"""
+    if not is_indexed(data):
+        return data
+
+    table = np.asarray(data.attrs['palette'], dtype=np.uint8)
+
+    def rgba(block: np.ndarray) -> np.ndarray:
+        return np.take(table, block, axis=0)
+
+    if isinstance(data.data, da.Array):
+        colored = data.data.map_blocks(
+            rgba,
+            dtype=np.uint8,
+            new_axis=data.ndim,
+            chunks=data.data.chunks + ((4,),)
+        )
+    else:
+        colored = rgba(data.values)
+
+    return xr.DataArray(
+        data=colored,
+        coords={**data.coords, 'band': ['R', 'G', 'B', 'A']},
+        dims=data.dims + ('band',),
+        attrs={k: v for k, v in data.attrs.items() if k != 'palette'},
+        name=data.name
+    )
+
+
+@lru_cache(maxsize=None)
+def _compile(palette: str, range: Tuple[float, float]) -> CompiledPalette:
+    return CompiledPalette(load_colormap(palette), range)
@@ -1,8 +1,9 @@
+from .palette import to_rgba
 from .rasterizer import Rasterizer
 import matplotlib.pyplot as plt
 
 
 class Plot(Rasterizer):
     def to_raster(self, data_array, path):
-        plt.imshow(data_array.values, cmap='gray')
+        plt.imshow(to_rgba(data_array).values, cmap='gray')
         plt.show()
@@ -1,6 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import dask.array as da
+import numpy as np
 import xarray as xr
 
+from goes2.metrics import registry
+
 
 class Rasterizer:
     def to_raster(self, data_array: xr.DataArray, path: str):
         pass
+
+
+def stamp(
+    data_array: xr.DataArray,
+    name: str,
+    date: datetime
+) -> xr.DataArray:
+    """
+    Nomeia o resultado com o produto e anota o horário numa coordenada
+    escalar `time` (UTC), usada pelos rasterizadores que guardam séries
+    """
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return data_array.rename(name).assign_coords(
+        time=np.datetime64(date, 'ns')
+    )
+
+
+def write_all(
+    data_array: xr.DataArray,
+    targets: List[Tuple[str, Rasterizer, str]],
+) -> Dict[str, Optional[BaseException]]:
+    """
+    Grava o mesmo resultado em cada alvo (nome, rasterizador, caminho).
+    Com mais de um alvo o grafo é calculado uma vez só e mantido em
+    memória, e os rasterizadores rodam em paralelo. Devolve o erro de cada
+    alvo (None se gravado); a falha de um não interrompe os outros.
+    """
+    if len(targets) > 1 and isinstance(data_array.data, da.Array):
+        with registry.timer('compute'):
+            data_array = data_array.persist()
+
+    def write(name: str, rasterizer: Rasterizer, path: str):
+        try:
+            with registry.timer('sink', sink=name):
+                rasterizer.to_raster(data_array, path)
+        except Exception as e:
+            registry.inc('sink_writes_total', sink=name, status='failed')
+            return e
+        registry.inc('sink_writes_total', sink=name, status='done')
+        return None
+
+    if len(targets) == 1:
+        name, rasterizer, path = targets[0]
+        return {name: write(name, rasterizer, path)}
+
+    with ThreadPoolExecutor(len(targets)) as pool:
+        futures = {
+            name: pool.submit(write, name, rasterizer, path)
+            for name, rasterizer, path in targets
+        }
+        return {name: future.result() for name, future in futures.items()}
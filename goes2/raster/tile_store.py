@@ -0,0 +1,210 @@
+from hashlib import blake2b
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from uuid import uuid4
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from goes2.metrics import registry
+
+
+class TileStore:
+    """
+    Armazenamento de tiles endereçado pelo conteúdo: cada tile codificado é
+    identificado pelo seu hash (blake2b) e gravado uma única vez em
+    `root`; os tiles de cada produto e horário são hardlinks para essa cópia
+    (ou cópias, se o sistema de arquivos não aceitar hardlinks).
+
+    No disco completo grande parte dos tiles é idêntica (espaço
+    transparente, preenchimento uniforme nas bordas), e se repete em todo
+    produto e horário. Os tiles uniformes nem são codificados de novo: o
+    resultado da codificação fica em memória, indexado pelo pixel.
+
+    `root` deve ficar no mesmo sistema de arquivos do armazenamento, em
+    geral dentro dele (ex. static/.tiles).
+    """
+
+    def __init__(self, root: str, digest_size: int = 16):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._digest_size = digest_size
+        self._hardlinks = True
+
+        self._uniform: Dict[Tuple, bytes] = {}
+        self._released: Set[Path] = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # vai junto do rasterizador para os processos do pool; o cache de
+        # tiles uniformes e a trava são de cada processo
+        state = self.__dict__.copy()
+        state['_uniform'] = {}
+        state['_released'] = set()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def uniform_key(tile: np.ndarray, *options) -> Optional[Tuple]:
+        """Chave do tile se todos os pixels são iguais, senão None"""
+        first = tile[0, 0]
+        if not (tile == first).all():
+            return None
+        return (tile.shape, tile.dtype.str, first.tobytes(), *options)
+
+    def _blob(self, digest: str, extension: str) -> Path:
+        return self.root / digest[:2] / f'{digest[2:]}.{extension}'
+
+    def _store(self, payload: bytes, extension: str) -> Path:
+        digest = blake2b(payload, digest_size=self._digest_size).hexdigest()
+        blob = self._blob(digest, extension)
+        if blob.exists():
+            registry.inc('tiles_deduplicated_total')
+            return blob
+
+        blob.parent.mkdir(exist_ok=True, parents=True)
+        temp = blob.with_name(f'.{blob.name}.{uuid4().hex}')
+        temp.write_bytes(payload)
+        try:
+            # link falha se outra thread (ou processo) gravou primeiro
+            os.link(temp, blob)
+        except FileExistsError:
+            registry.inc('tiles_deduplicated_total')
+        except OSError:
+            os.replace(temp, blob)
+            return blob
+        os.remove(temp)
+        return blob
+
+    def _link(self, blob: Path, file: Path):
+        file.parent.mkdir(exist_ok=True, parents=True)
+        temp = file.with_name(f'.{file.name}.{uuid4().hex}')
+
+        if self._hardlinks:
+            try:
+                os.link(blob, temp)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                # outro dispositivo, ou sem suporte a hardlinks
+                print(f'hardlinks indisponíveis em {self.root}, copiando')
+                self._hardlinks = False
+
+        if not self._hardlinks:
+            shutil.copyfile(blob, temp)
+        os.replace(temp, file)
+
+    def put(self, payload: bytes, file: Path):
+        """Grava `payload` em `file`, reaproveitando uma cópia idêntica"""
+        extension = file.suffix.lstrip('.')
+        try:
+            self._link(self._store(payload, extension), file)
+        except FileNotFoundError:
+            # a cópia foi removida pelo prune entre o hash e o link
+            self._link(self._store(payload, extension), file)
+
+    def put_tile(
+        self,
+        tile: np.ndarray,
+        file: Path,
+        encode: Callable[[np.ndarray], bytes],
+        *options
+    ):
+        """
+        Codifica o tile com `encode` e o grava em `file`. Tiles uniformes
+        (mesmo pixel em todo o tile) são codificados uma vez só; `options`
+        distingue codificações diferentes do mesmo pixel.
+        """
+        key = self.uniform_key(tile, file.suffix, *options)
+        payload = None
+        if key is not None:
+            with self._lock:
+                payload = self._uniform.get(key)
+            if payload is not None:
+                registry.inc('tiles_encoding_skipped_total')
+
+        if payload is None:
+            payload = encode(tile)
+            if key is not None:
+                with self._lock:
+                    self._uniform[key] = payload
+
+        self.put(payload, file)
+
+    def adopt(self, file: Path):
+        """
+        Troca um tile já gravado por um link para a cópia única do seu
+        conteúdo (para saídas de ferramentas externas, como o gdal2tiles)
+        """
+        self.put(file.read_bytes(), file)
+
+    def adopt_tree(self, path: str, extensions=('png', 'jpg', 'webp')):
+        for root, _, files in os.walk(path):
+            for name in files:
+                if name.rsplit('.', 1)[-1].lower() in extensions:
+                    self.adopt(Path(root) / name)
+
+    def release(self, path: str, stat: os.stat_result):
+        """
+        Chamado antes de um tile ser apagado (Collector.on_remove): se ele
+        é o último link da sua cópia, a cópia é guardada para o
+        `prune_released`. Só esses tiles são lidos, para achar a cópia
+        pelo hash.
+        """
+        if stat.st_nlink != 2:
+            return
+
+        extension = path.rsplit('.', 1)[-1]
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except OSError:
+            return
+
+        digest = blake2b(payload, digest_size=self._digest_size).hexdigest()
+        blob = self._blob(digest, extension)
+        try:
+            if not os.path.samestat(blob.stat(), stat):
+                return
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            self._released.add(blob)
+
+    def prune_released(self) -> int:
+        """
+        Remove só as cópias cujo último tile foi apagado desde a chamada
+        anterior (ver `release`), sem percorrer o armazenamento inteiro
+        """
+        with self._lock:
+            blobs, self._released = self._released, set()
+        return self.prune(blobs)
+
+    def prune(self, blobs: Optional[Iterable[Path]] = None) -> int:
+        """
+        Remove as cópias que nenhum tile referencia mais (só resta o link
+        da própria cópia), entre `blobs` ou, sem eles, em todo o
+        armazenamento. Devolve o número de arquivos removidos.
+        """
+        if blobs is None:
+            blobs = self.root.glob('*/*')
+
+        removed = 0
+        for blob in blobs:
+            try:
+                if blob.name.startswith('.') or blob.stat().st_nlink > 1:
+                    continue
+                blob.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+
+        registry.inc('tile_blobs_pruned_total', removed)
+        return removed
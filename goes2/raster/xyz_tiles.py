@@ -0,0 +1,267 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from hashlib import blake2b
+from typing import Optional, Tuple
+import math
+import os
+
+import numpy as np
+import xarray as xr
+
+from goes2.metrics import registry
+
+from .encoding import Encoding
+from .palette import is_indexed, to_rgba
+from .rasterizer import Rasterizer
+from .tile_store import TileStore
+
+
+# extensão da grade global do EPSG:3857, em metros
+ORIGIN = math.pi * 6378137.0
+
+
+class XYZTiles(Rasterizer):
+    """
+    Pirâmide de tiles gerada em processo, direto do array RGBA já reprojetado
+    em EPSG:3857. O nível de zoom máximo é amostrado (vizinho mais próximo)
+    na grade global de tiles e os níveis inferiores são obtidos por redução
+    2x2 do nível de cima.
+
+    Por padrão segue a numeração TMS (y invertido) do gdal2tiles, para que o
+    layout z/x/y continue o mesmo; com tms=False usa a numeração XYZ.
+
+    Com um `TileStore`, tiles idênticos (entre níveis, produtos e horários)
+    são gravados uma vez só e ligados por hardlinks.
+
+    Com `paletted`, produtos em paleta (ver `CompiledPalette.indexed`) viram
+    PNG de 8 bits com paleta e tRNS, ~4x menores que o RGBA; a pirâmide é
+    montada sobre os índices, e os níveis inferiores usam o vizinho mais
+    próximo em vez da média.
+    """
+
+    def __init__(
+        self,
+        format: str = 'PNG',
+        zoom_range: Tuple[int] = (4, 6),
+        max_workers: int = os.cpu_count() or 4,
+        tile_size: int = 256,
+        tms: bool = True,
+        tile_store: Optional[TileStore] = None,
+        paletted: bool = False,
+        encoding: Optional[Encoding] = None
+    ):
+        self._encoding = encoding or Encoding(format)
+        self._format = self._encoding.format
+        self._paletted = paletted
+
+        self._min_zoom, self._max_zoom = zoom_range
+        self._max_workers = max_workers
+        self._tile_size = tile_size
+        self._tms = tms
+        self._tile_store = tile_store
+
+    def _resolution(self, zoom: int) -> float:
+        return 2 * ORIGIN / (self._tile_size * 2 ** zoom)
+
+    def _resample(
+        self,
+        pixels: np.ndarray,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        zoom: int,
+        fill: int = 0
+    ) -> Tuple[np.ndarray, int, int]:
+        """
+        Amostra o array (RGBA ou índices) na grade de tiles do zoom dado.
+        Retorna o array cobrindo tiles inteiros, com `fill` fora dos dados,
+        e o índice (x, y) do primeiro tile
+        """
+        size = self._tile_size
+        res = self._resolution(zoom)
+
+        dx = xs[1] - xs[0]
+        dy = ys[1] - ys[0]
+        left = xs[0] - dx / 2
+        top = ys[0] - dy / 2
+        right = left + dx * len(xs)
+        bottom = top + dy * len(ys)
+
+        tx0 = int(math.floor((left + ORIGIN) / res / size))
+        tx1 = int(math.ceil((right + ORIGIN) / res / size))
+        ty0 = int(math.floor((ORIGIN - top) / res / size))
+        ty1 = int(math.ceil((ORIGIN - bottom) / res / size))
+
+        # centros dos pixels da grade global, convertidos em índices da origem
+        gx = (np.arange(tx0 * size, tx1 * size) + 0.5) * res - ORIGIN
+        gy = ORIGIN - (np.arange(ty0 * size, ty1 * size) + 0.5) * res
+        cols = np.floor((gx - left) / dx).astype(np.int64)
+        rows = np.floor((gy - top) / dy).astype(np.int64)
+
+        valid_cols = np.flatnonzero((cols >= 0) & (cols < len(xs)))
+        valid_rows = np.flatnonzero((rows >= 0) & (rows < len(ys)))
+
+        level = np.full(
+            (len(rows), len(cols)) + pixels.shape[2:], fill, dtype=np.uint8
+        )
+        if len(valid_cols) and len(valid_rows):
+            c0, c1 = valid_cols[0], valid_cols[-1] + 1
+            r0, r1 = valid_rows[0], valid_rows[-1] + 1
+            level[r0:r1, c0:c1] = pixels[np.ix_(rows[r0:r1], cols[c0:c1])]
+
+        return level, tx0, ty0
+
+    def _downsample(
+        self,
+        level: np.ndarray,
+        tx0: int,
+        ty0: int,
+        fill: int = 0
+    ) -> Tuple[np.ndarray, int, int]:
+        size = self._tile_size
+
+        # alinha o nível a um número par de tiles, começando num índice par
+        pad_left = (tx0 % 2) * size
+        pad_top = (ty0 % 2) * size
+        width = level.shape[1] + pad_left
+        height = level.shape[0] + pad_top
+        pad_right = (-width) % (2 * size)
+        pad_bottom = (-height) % (2 * size)
+
+        level = np.pad(
+            level,
+            ((pad_top, pad_bottom), (pad_left, pad_right)) +
+            ((0, 0),) * (level.ndim - 2),
+            constant_values=fill
+        )
+        tx0, ty0 = (tx0 - tx0 % 2) // 2, (ty0 - ty0 % 2) // 2
+
+        if level.ndim == 2:
+            # índices de paleta não têm média: vizinho mais próximo
+            return np.ascontiguousarray(level[::2, ::2]), tx0, ty0
+
+        h, w = level.shape[0] // 2, level.shape[1] // 2
+        blocks = level.reshape(h, 2, w, 2, 4).astype(np.uint32)
+
+        # média com alfa pré-multiplicado, evitando bordas escurecidas
+        alpha = blocks[..., 3].sum(axis=(1, 3))
+        color = (blocks[..., :3] * blocks[..., 3:]).sum(axis=(1, 3))
+
+        out = np.empty((h, w, 4), dtype=np.uint8)
+        out[..., :3] = color // np.maximum(alpha, 1)[..., None]
+        out[..., 3] = alpha // 4
+
+        return out, tx0, ty0
+
+    def _write_tile(
+        self,
+        tile: np.ndarray,
+        file: Path,
+        palette: Optional[np.ndarray],
+        palette_key: bytes
+    ):
+        def encode(tile: np.ndarray) -> bytes:
+            return self._encoding.encode(tile, palette)
+
+        if self._tile_store is not None:
+            self._tile_store.put_tile(
+                tile, file, encode, self._encoding, palette_key
+            )
+        else:
+            file.parent.mkdir(exist_ok=True, parents=True)
+            file.write_bytes(encode(tile))
+        registry.inc('tiles_written_total')
+
+    def _write_level(
+        self,
+        pool: ThreadPoolExecutor,
+        level: np.ndarray,
+        zoom: int,
+        tx0: int,
+        ty0: int,
+        path: Path,
+        palette: Optional[np.ndarray] = None
+    ):
+        size = self._tile_size
+        extension = self._encoding.extension
+
+        if palette is None:
+            def visible(tile):
+                return tile[..., 3].any()
+            palette_key = b''
+        else:
+            opaque = palette[:, 3] > 0
+
+            def visible(tile):
+                return opaque[tile].any()
+            palette_key = blake2b(palette.tobytes()).digest()
+
+        futures = []
+        for j in range(level.shape[0] // size):
+            for i in range(level.shape[1] // size):
+                tile = level[j*size:(j+1)*size, i*size:(i+1)*size]
+
+                # tiles totalmente transparentes não são escritos
+                if not visible(tile):
+                    continue
+
+                x = tx0 + i
+                y = ty0 + j
+                if self._tms:
+                    y = 2 ** zoom - 1 - y
+
+                file = path / str(zoom) / str(x) / f'{y}.{extension}'
+                futures.append(pool.submit(
+                    self._write_tile, tile, file, palette, palette_key
+                ))
+
+        return futures
+
+    @staticmethod
+    def _transparent_index(palette: np.ndarray) -> Optional[int]:
+        transparent = np.flatnonzero(palette[:, 3] == 0)
+        return int(transparent[0]) if len(transparent) else None
+
+    def to_raster(self, data_array: xr.DataArray, path: str):
+        palette = None
+        fill = 0
+        if self._paletted and is_indexed(data_array) and \
+                self._encoding.supports_palette:
+            palette = np.asarray(data_array.attrs['palette'], np.uint8)
+            # fora do disco os tiles precisam de um índice transparente
+            fill = self._transparent_index(palette)
+            if fill is None:
+                palette, fill = None, 0
+
+        if palette is None:
+            data_array = to_rgba(data_array).transpose('y', 'x', 'band')
+        else:
+            data_array = data_array.transpose('y', 'x')
+
+        # o grafo preguiçoso do produto (paleta, composição) roda aqui
+        with registry.timer('compute'):
+            pixels = np.asarray(data_array.values, dtype=np.uint8)
+
+        with registry.timer('tiles'):
+            level, tx0, ty0 = self._resample(
+                pixels,
+                data_array.x.values,
+                data_array.y.values,
+                self._max_zoom,
+                fill
+            )
+
+            path = Path(path)
+            futures = []
+            with ThreadPoolExecutor(self._max_workers) as pool:
+                for zoom in range(self._max_zoom, self._min_zoom - 1, -1):
+                    futures += self._write_level(
+                        pool, level, zoom, tx0, ty0, path, palette
+                    )
+
+                    if zoom > self._min_zoom:
+                        level, tx0, ty0 = self._downsample(
+                            level, tx0, ty0, fill
+                        )
+
+            for future in futures:
+                future.result()
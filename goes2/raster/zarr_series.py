@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - sem flock (Windows)
+    fcntl = None
+
+import numpy as np
+import xarray as xr
+
+from goes2.metrics import registry
+
+from .palette import is_indexed
+from .rasterizer import Rasterizer
+
+
+class ZarrTimeSeries(Rasterizer):
+    """
+    Série temporal em Zarr, um store por produto (root/<produto>.zarr), com
+    um chunk por horário e bloco espacial: anexar um horário grava só os
+    chunks novos e os metadados, e quem analisa os dados lê intervalos em
+    vez de decodificar tiles PNG.
+
+    Os chunks do grafo dask são gravados em paralelo direto no store. O
+    resultado precisa do nome do produto e da coordenada `time` (ver
+    `stamp`). No caminho do armazenamento fica só uma referência JSON ao
+    store e à posição do horário; a rotação remove a referência, não os
+    dados da série.
+
+    Os horários são anexados na ordem em que chegam (um backfill atrás do
+    modo contínuo chega fora de ordem), o que mantém o anexo barato e as
+    posições fixas. O eixo `time` pode então estar fora de ordem: para
+    seleções por intervalo use `open`, que o ordena.
+    """
+
+    def __init__(self, root: str = 'static/zarr', chunk: int = 512):
+        self.root = Path(root)
+        self._chunk = chunk
+
+    def _series(self, name: str) -> Path:
+        return self.root / f'{name}.zarr'
+
+    @contextmanager
+    def _locked(self, name: str):
+        # vários threads ou processos podem anexar ao mesmo produto
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / f'.{name}.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _chunks(self, data_array: xr.DataArray) -> Dict[str, int]:
+        sizes = {'time': 1, 'y': self._chunk, 'x': self._chunk}
+        return {
+            dim: min(sizes.get(dim, size), size)
+            for dim, size in data_array.sizes.items()
+        }
+
+    def _dataset(self, data_array: xr.DataArray) -> xr.Dataset:
+        name = data_array.name
+        if name is None or 'time' not in data_array.coords:
+            raise ValueError(
+                'o resultado precisa de nome e da coordenada time (stamp)'
+            )
+
+        # coordenadas escalares do arquivo de origem (t, ...) variam a cada
+        # horário e não entram na série; spatial_ref guarda o CRS
+        scalars = [
+            coord for coord in data_array.coords
+            if coord not in data_array.dims
+            and coord not in ('time', 'spatial_ref')
+        ]
+        data_array = data_array.drop_vars(scalars).expand_dims('time')
+
+        if is_indexed(data_array):
+            # índices de paleta ficam como estão (um byte por pixel), com a
+            # tabela RGBA nos atributos, em JSON. Os atributos do dado de
+            # origem (units, valid_range, ...) não valem para os índices
+            palette = np.asarray(data_array.attrs['palette']).tolist()
+            attrs = {'palette': palette}
+            if 'long_name' in data_array.attrs:
+                attrs['long_name'] = data_array.attrs['long_name']
+            data_array = data_array.copy()
+            data_array.attrs = attrs
+
+        return data_array.chunk(self._chunks(data_array)).to_dataset()
+
+    @staticmethod
+    def _times(series: Path) -> Optional[np.ndarray]:
+        if not series.exists():
+            return None
+        with xr.open_zarr(series) as existing:
+            return existing['time'].values
+
+    @staticmethod
+    def _timeless(dataset: xr.Dataset) -> list:
+        return [
+            name for name, var in dataset.variables.items()
+            if 'time' not in var.dims
+        ]
+
+    def _write_slice(self, series: Path, dataset: xr.Dataset, index: int):
+        dataset.drop_vars(self._timeless(dataset)).to_zarr(
+            series, region={'time': slice(index, index + 1)}
+        )
+
+    def open(self, name: str) -> xr.Dataset:
+        """
+        A série do produto com o eixo `time` em ordem crescente, pronta
+        para `.sel(time=slice(...))`
+        """
+        return xr.open_zarr(self._series(name)).sortby('time')
+
+    def to_raster(self, data_array: xr.DataArray, path: str):
+        dataset = self._dataset(data_array)
+        name = data_array.name
+        time = dataset['time'].values[0]
+        series = self._series(name)
+
+        with self._locked(name), registry.timer('compute'):
+            times = self._times(series)
+
+            if times is None:
+                encoding = {
+                    name: {'chunks': tuple(self._chunks(dataset[name])
+                                           .values())},
+                    'time': {
+                        'units': 'seconds since 2000-01-01 12:00:00',
+                        'dtype': 'int64'
+                    },
+                }
+                dataset.to_zarr(series, mode='w-', encoding=encoding)
+                index = 0
+            elif time in times:
+                # horário reprocessado: sobrescreve só a sua fatia
+                index = int(np.flatnonzero(times == time)[0])
+                self._write_slice(series, dataset, index)
+            else:
+                # a grade (x, y) é a mesma em todos os horários; só o
+                # que depende do tempo é gravado, sempre no fim (mesmo
+                # fora de ordem: ver `open`)
+                dataset.drop_vars(self._timeless(dataset)).to_zarr(
+                    series, append_dim='time'
+                )
+                index = len(times)
+
+        reference = Path(path + '.json')
+        reference.parent.mkdir(exist_ok=True, parents=True)
+        temp = reference.with_name(f'.{reference.name}.{os.getpid()}')
+        with open(temp, 'w') as f:
+            json.dump({
+                'store': str(series.resolve()),
+                'variable': name,
+                'time': str(np.datetime_as_string(time, unit='s')) + 'Z',
+                'index': index,
+            }, f)
+        os.replace(temp, reference)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from itertools import count
+from typing import List, Optional
+
+from goes2.metrics import registry
+
+
+@dataclass
+class InputEstimate:
+    """Tamanhos de uma entrada usados para estimar o pico de memória"""
+
+    source_bytes: int
+    output_pixels: int
+    itemsize: int
+
+
+def physical_memory() -> Optional[int]:
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+@dataclass(order=True)
+class _Waiter:
+    order: int
+    nbytes: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    bypassed: int = field(default=0, compare=False)
+
+
+class MemoryBudget:
+    """
+    Controle de admissão por orçamento de memória. Cada trabalho reserva a
+    estimativa do seu pico antes de rodar; quando um trabalho grande não
+    cabe, os menores que cabem passam na frente, até `max_bypass` vezes
+    (para não deixá-lo esperando para sempre). Um trabalho maior que o
+    orçamento inteiro só roda sozinho.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_bypass: int = 8
+    ):
+        if max_bytes is None:
+            memory = physical_memory()
+            max_bytes = memory // 2 if memory else 8 * 1024 ** 3
+
+        self.max_bytes = max_bytes
+        self.max_bypass = max_bypass
+        self.current = 0
+        self.peak = 0
+        self.running = 0
+
+        self._waiters: List[_Waiter] = []
+        self._order = count()
+
+    def _fits(self, nbytes: int) -> bool:
+        if self.running == 0:
+            return True
+        return self.current + nbytes <= self.max_bytes
+
+    def _admit(self, nbytes: int):
+        self.current += nbytes
+        self.running += 1
+        self.peak = max(self.peak, self.current)
+        registry.set('memory_reserved_bytes', self.current)
+
+    def _wake(self):
+        # em ordem de chegada, admite todos os que couberem
+        blocked = []
+        for waiter in sorted(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+
+            if not self._fits(waiter.nbytes):
+                blocked.append(waiter)
+                if waiter.bypassed >= self.max_bypass:
+                    # já foi ultrapassado demais: ninguém mais passa
+                    break
+                continue
+
+            self._waiters.remove(waiter)
+            self._admit(waiter.nbytes)
+            waiter.future.set_result(None)
+
+            for other in blocked:
+                other.bypassed += 1
+
+    async def acquire(self, nbytes: int):
+        waiter = _Waiter(
+            next(self._order),
+            nbytes,
+            asyncio.get_running_loop().create_future()
+        )
+        self._waiters.append(waiter)
+        self._wake()
+        start = time.perf_counter()
+
+        try:
+            await waiter.future
+            registry.observe(
+                'memory_wait_seconds', time.perf_counter() - start
+            )
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # foi admitido no mesmo instante do cancelamento
+                self.release(nbytes)
+            elif waiter in self._waiters:
+                # quem esperava atrás dele pode caber agora
+                self._waiters.remove(waiter)
+                self._wake()
+            raise
+
+    def release(self, nbytes: int):
+        self.current -= nbytes
+        self.running -= 1
+        registry.set('memory_reserved_bytes', self.current)
+        self._wake()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        await self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def report(self) -> dict:
+        return {
+            'max_bytes': self.max_bytes,
+            'current_bytes': self.current,
+            'peak_bytes': self.peak,
+            'running': self.running,
+            'waiting': len(self._waiters),
+        }
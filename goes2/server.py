@@ -0,0 +1,378 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from hashlib import blake2b
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+from goes2.metrics import registry
+from goes2.storage import StorageEvent, TimeSeriesStorage
+from goes2.storage.catalog import (
+    Entry, format_timestamp, parse_timestamp
+)
+
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+}
+
+# custo fixo de cada tile no cache, além do conteúdo (chave, ETag, ...)
+OVERHEAD = 256
+
+Key = Tuple[str, datetime, float, int, int, int, str]
+
+# horários resolvidos guardados, no máximo
+MAX_RESOLVED = 4096
+
+
+@dataclass(frozen=True)
+class Tile:
+    # None: o tile não existe (os rasterizadores não gravam os vazios)
+    data: Optional[bytes]
+    etag: Optional[str] = None
+    content_type: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return OVERHEAD + (len(self.data) if self.data is not None else 0)
+
+
+class TileCache:
+    """
+    Cache LRU de tiles limitado em bytes. As chaves incluem o horário e o
+    `updated` da entrada no catálogo: um horário reprocessado nunca
+    devolve o tile antigo, e os de um horário são removidos juntos com
+    `invalidate`.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+        self._tiles: 'OrderedDict[Key, Tile]' = OrderedDict()
+        self._by_time: Dict[Tuple[str, datetime], Set[Key]] = {}
+        # os eventos do armazenamento chegam em outras threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def get(self, key: Key) -> Optional[Tile]:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key: Key, tile: Tile):
+        if tile.size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._discard(key)
+            self._tiles[key] = tile
+            self._by_time.setdefault(key[:2], set()).add(key)
+            self.bytes += tile.size
+
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._tiles))
+                self._discard(oldest)
+                registry.inc('tile_cache_evictions_total')
+
+        registry.set('tile_cache_bytes', self.bytes)
+
+    def _discard(self, key: Key):
+        tile = self._tiles.pop(key, None)
+        if tile is None:
+            return
+
+        self.bytes -= tile.size
+        keys = self._by_time[key[:2]]
+        keys.discard(key)
+        if not keys:
+            del self._by_time[key[:2]]
+
+    def invalidate(self, product: str, timestamp: datetime) -> int:
+        """Remove os tiles do horário; devolve quantos foram removidos"""
+        with self._lock:
+            keys = list(self._by_time.get((product, timestamp), ()))
+            for key in keys:
+                self._discard(key)
+
+        registry.set('tile_cache_bytes', self.bytes)
+        return len(keys)
+
+    def timesteps(self) -> Dict[Tuple[str, datetime], Set[float]]:
+        """Os horários em cache, com os `updated` de cada um"""
+        with self._lock:
+            return {
+                time: {key[2] for key in keys}
+                for time, keys in self._by_time.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._by_time.clear()
+            self.bytes = 0
+        registry.set('tile_cache_bytes', 0)
+
+
+def parse_time(value: str) -> Optional[datetime]:
+    """
+    'latest' (None), o formato dos dates/date_<produto>.json
+    (2025-01-01T12:00Z) ou ISO 8601; sem fuso, UTC
+    """
+    if value == 'latest':
+        return None
+
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        try:
+            date = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise web.HTTPBadRequest(text=f'horário inválido: {value}')
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
+
+
+def _matches(header: str, etag: str) -> bool:
+    """If-None-Match (RFC 9110, 13.1.2): comparação fraca, ou '*'"""
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in ('*', etag):
+            return True
+    return False
+
+
+class TileServer:
+    """
+    Servidor HTTP assíncrono dos tiles do armazenamento, em
+    /{produto}/{horário}/{z}/{x}/{y}[.ext]. O horário é resolvido pelo
+    catálogo a cada requisição (`latest` é o mais recente pronto), então
+    um horário expirado deixa de ser servido na hora, mesmo com o cache
+    cheio.
+
+    Os tiles mais acessados ficam em memória (`TileCache`), com ETag forte
+    (hash do conteúdo): If-None-Match igual responde 304 sem corpo. Os
+    eventos do armazenamento (retenção e reprocessamento) removem do cache
+    os tiles do horário; quando quem produz é outro processo, os eventos
+    não chegam e uma varredura a cada `sweep_interval` segundos faz o
+    mesmo.
+
+    As consultas ao catálogo rodam fora do loop de eventos (o produtor
+    pode segurar a trava do SQLite), e cada horário resolvido vale por
+    `resolve_ttl` segundos.
+
+    Com `xyz`, o y da URL segue a numeração XYZ e é convertido para o
+    layout TMS gravado pelo `XYZTiles`; sem ele, a URL é a do disco.
+    """
+
+    def __init__(
+        self,
+        store: TimeSeriesStorage,
+        host: str = '127.0.0.1',
+        port: int = 8080,
+        cache_bytes: int = 256 * 1024 ** 2,
+        xyz: bool = False,
+        max_age: int = 60,
+        sweep_interval: float = 30,
+        resolve_ttl: float = 1.0
+    ):
+        """
+        Args:
+            store: Armazenamento com as pirâmides de tiles
+            cache_bytes: Tamanho máximo do cache de tiles, em bytes
+            max_age: Cache-Control dos horários explícitos, em segundos
+            (os de `latest` são sempre revalidados)
+        """
+        self._store = store
+        self._host = host
+        self.port = port
+        self._xyz = xyz
+        self._max_age = max_age
+        self._sweep_interval = sweep_interval
+        self._resolve_ttl = resolve_ttl
+        self._resolved: Dict[
+            Tuple[str, Optional[datetime]], Tuple[float, Optional[Entry]]
+        ] = {}
+
+        self.cache = TileCache(cache_bytes)
+        self._runner: Optional[web.AppRunner] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+        store.subscribe(self._on_event)
+
+    def _on_event(self, event: StorageEvent):
+        # 'ready' de um horário já servido: foi reprocessado
+        if event.kind in ('ready', 'removed'):
+            # o horário como está no catálogo, que é o das chaves
+            timestamp = parse_timestamp(format_timestamp(event.timestamp))
+            self.cache.invalidate(event.product, timestamp)
+            self._resolved = {}
+
+    async def _resolve(self, product: str, value: str) -> Entry:
+        key = (product, parse_time(value))
+        now = time.monotonic()
+
+        cached = self._resolved.get(key)
+        if cached is not None and cached[0] > now:
+            entry = cached[1]
+        else:
+            entry = await asyncio.to_thread(self._store.entry, *key)
+            if len(self._resolved) >= MAX_RESOLVED:
+                self._resolved = {}
+            self._resolved[key] = (now + self._resolve_ttl, entry)
+
+        if entry is None:
+            raise web.HTTPNotFound(text=f'{product} sem o horário {value}')
+        return entry
+
+    def _tile_path(self, entry: Entry, z: int, x: int, y: int) -> str:
+        if self._xyz:
+            y = 2 ** z - 1 - y
+        return os.path.join(entry.path, str(z), str(x), str(y))
+
+    @staticmethod
+    def _read(path: str, extension: Optional[str]) -> Tile:
+        extensions = (
+            [extension] if extension is not None else list(CONTENT_TYPES)
+        )
+        for extension in extensions:
+            try:
+                with open(f'{path}.{extension}', 'rb') as f:
+                    data = f.read()
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            etag = blake2b(data, digest_size=16).hexdigest()
+            return Tile(data, f'"{etag}"', CONTENT_TYPES[extension])
+        return Tile(None)
+
+    async def _tile(self, request: web.Request) -> web.Response:
+        info = request.match_info
+        product = info['product']
+        z, x, y = int(info['z']), int(info['x']), int(info['y'])
+        extension = info.get('ext', '').lstrip('.').lower() or None
+        if extension is not None:
+            if extension not in CONTENT_TYPES:
+                raise web.HTTPNotFound(text=f'formato inválido: {extension}')
+
+        if z > 30 or x >= 2 ** z or y >= 2 ** z:
+            raise web.HTTPNotFound(text='tile fora da grade')
+
+        latest = info['time'] == 'latest'
+        entry = await self._resolve(product, info['time'])
+        key = (product, entry.timestamp, entry.updated, z, x, y,
+               extension or '')
+
+        tile = self.cache.get(key)
+        if tile is not None:
+            registry.inc('tile_cache_hits_total')
+        else:
+            registry.inc('tile_cache_misses_total')
+            with registry.timer('tile_read'):
+                tile = await asyncio.to_thread(
+                    self._read, self._tile_path(entry, z, x, y), extension
+                )
+            self.cache.put(key, tile)
+
+        if tile.data is None:
+            registry.inc('tile_requests_total', status='404')
+            raise web.HTTPNotFound()
+
+        headers = {
+            'ETag': tile.etag,
+            'Cache-Control': (
+                'no-cache' if latest else f'public, max-age={self._max_age}'
+            ),
+            'X-Timestamp': format_timestamp(entry.timestamp),
+        }
+
+        if _matches(request.headers.get('If-None-Match', ''), tile.etag):
+            registry.inc('tile_requests_total', status='304')
+            return web.Response(status=304, headers=headers)
+
+        registry.inc('tile_requests_total', status='200')
+        return web.Response(
+            body=tile.data, content_type=tile.content_type, headers=headers
+        )
+
+    async def _times(self, request: web.Request) -> web.Response:
+        """Horários prontos do produto, do mais novo ao mais antigo"""
+        product = request.match_info['product']
+        try:
+            limit = int(request.query.get('limit', 100))
+        except ValueError:
+            raise web.HTTPBadRequest(text='limit inválido')
+        latest = await asyncio.to_thread(self._store.latest, product, limit)
+        return web.json_response({
+            'dates': [
+                format_timestamp(timestamp) for timestamp, _ in latest
+            ]
+        }, headers={'Cache-Control': 'no-cache'})
+
+    def _stale(self) -> List[Tuple[str, datetime]]:
+        """Horários em cache que expiraram ou foram refeitos"""
+        stale = []
+        for (product, timestamp), updated in self.cache.timesteps().items():
+            entry = self._store.entry(product, timestamp)
+            if entry is None or {entry.updated} != updated:
+                stale.append((product, timestamp))
+        return stale
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            try:
+                for product, timestamp in await asyncio.to_thread(
+                    self._stale
+                ):
+                    self.cache.invalidate(product, timestamp)
+            except Exception as e:
+                print(f'erro na varredura do cache de tiles: {e}')
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/{product}/times', self._times)
+        app.router.add_get(
+            r'/{product}/{time}/{z:\d+}/{x:\d+}/{y:\d+}{ext:(?:\.\w+)?}',
+            self._tile
+        )
+        return app
+
+    async def start(self) -> 'TileServer':
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+
+        site = web.TCPSite(self._runner, self._host, self.port)
+        await site.start()
+        # com port=0, a porta escolhida pelo sistema
+        self.port = self._runner.addresses[0][1]
+
+        if self._sweep_interval:
+            self._sweeper = asyncio.create_task(self._sweep())
+        print(f'servindo tiles em http://{self._host}:{self.port}')
+        return self
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        self.cache.clear()
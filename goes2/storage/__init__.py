@@ -1,7 +1,13 @@
-from .storage import Storage
+from .storage import Storage, StorageEvent
+from .catalog import Catalog
+from .retention import Collector, RetentionPolicy
 from .time_series_storage import TimeSeriesStorage
 
 __all__ = [
+    'Catalog',
+    'Collector',
+    'RetentionPolicy',
     'TimeSeriesStorage',
-    'Storage'
+    'Storage',
+    'StorageEvent'
 ]
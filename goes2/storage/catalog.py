@@ -0,0 +1,432 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+# mesmo formato dos antigos dates/date_<produto>.json; ordena como texto
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%MZ'
+
+PENDING = 'pending'
+READY = 'ready'
+FAILED = 'failed'
+# expirada: invisível para as buscas, aguardando o coletor apagar os arquivos
+TOMBSTONED = 'tombstoned'
+# arquivos sendo apagados pelo coletor; a linha só sai depois deles
+COLLECTING = 'collecting'
+
+# entradas pendentes há mais tempo que isso (produção interrompida) podem
+# expirar; as demais ainda estão sendo gravadas
+STALE_PENDING = 3600
+
+# entradas em coleta há mais tempo que isso (coletor interrompido no meio
+# de um lote) voltam a ser entregues ao coletor
+STALE_COLLECTING = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    product TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    PRIMARY KEY (product, timestamp)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS entries_by_status
+    ON entries (product, status, timestamp);
+"""
+
+
+class CollectingError(RuntimeError):
+    """A entrada ainda está tendo os arquivos apagados pelo coletor"""
+
+
+def format_timestamp(date: datetime) -> str:
+    return date.strftime(TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(value: str) -> datetime:
+    return datetime.strptime(value, TIMESTAMP_FORMAT).replace(
+        tzinfo=timezone.utc
+    )
+
+
+@dataclass(frozen=True)
+class Entry:
+    product: str
+    timestamp: datetime
+    status: str
+    path: str
+    size: int
+    updated: float
+
+    @staticmethod
+    def of(row: sqlite3.Row) -> 'Entry':
+        return Entry(
+            product=row['product'],
+            timestamp=parse_timestamp(row['timestamp']),
+            status=row['status'],
+            path=row['path'],
+            size=row['size'],
+            updated=row['updated']
+        )
+
+
+class Catalog:
+    """
+    Catálogo transacional das séries temporais, em SQLite no modo WAL:
+    uma linha por (produto, horário) com status, caminho e tamanho.
+    Consultas pela chave primária são O(log n), e a inserção com rotação
+    é atômica mesmo com vários processos escrevendo no mesmo catálogo.
+
+    A rotação não apaga nada: as entradas expiradas viram `tombstoned` na
+    mesma transação e os arquivos são removidos depois, em segundo plano.
+    """
+
+    def __init__(self, path: str, timeout: float = 30):
+        self.path = path
+        self._timeout = timeout
+        self._local = threading.local()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # executescript faz o próprio COMMIT; fica fora de _transaction
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # conexões sqlite3 não são compartilhadas entre threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(
+                self.path, timeout=self._timeout, isolation_level=None
+            )
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    class _Transaction:
+        def __init__(self, db: sqlite3.Connection):
+            self.db = db
+
+        def __enter__(self) -> sqlite3.Connection:
+            # IMMEDIATE: a trava de escrita é obtida já no início, evitando
+            # a leitura seguida de escrita de outro processo no meio
+            self.db.execute('BEGIN IMMEDIATE')
+            return self.db
+
+        def __exit__(self, exc_type, exc, tb):
+            self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+    def _transaction(self) -> '_Transaction':
+        return Catalog._Transaction(self._connection())
+
+    def _query(self, sql: str, *params) -> Iterator[sqlite3.Row]:
+        return self._connection().execute(sql, params)
+
+    def insert(
+        self,
+        product: str,
+        timestamp: datetime,
+        path: str,
+        keep: Optional[int] = None,
+        status: str = PENDING,
+        older_than: Optional[datetime] = None,
+        max_bytes: Optional[int] = None
+    ) -> List[Entry]:
+        """
+        Registra (ou reinicia) uma entrada e, na mesma transação, aplica a
+        retenção do produto (ver `expire`). Devolve as entradas expiradas.
+        Levanta CollectingError se o coletor ainda apaga os arquivos da
+        entrada (o mesmo caminho seria apagado depois de regravado).
+        """
+        with self._transaction() as db:
+            row = db.execute(
+                """
+                SELECT status FROM entries
+                WHERE product = ? AND timestamp = ?
+                """,
+                (product, format_timestamp(timestamp))
+            ).fetchone()
+            if row is not None and row['status'] == COLLECTING:
+                raise CollectingError(
+                    f'{product} {format_timestamp(timestamp)} em coleta'
+                )
+
+            db.execute(
+                """
+                INSERT INTO entries (product, timestamp, status, path, size,
+                                     updated)
+                VALUES (?, ?, ?, ?, 0, ?)
+                ON CONFLICT (product, timestamp) DO UPDATE SET
+                    status = excluded.status,
+                    path = excluded.path,
+                    updated = excluded.updated
+                """,
+                (product, format_timestamp(timestamp), status, path,
+                 time.time())
+            )
+
+            return self._expire(db, product, keep, older_than, max_bytes)
+
+    @staticmethod
+    def _expire(
+        db: sqlite3.Connection,
+        product: str,
+        keep: Optional[int] = None,
+        older_than: Optional[datetime] = None,
+        max_bytes: Optional[int] = None
+    ) -> List[Entry]:
+        conditions = []
+        params = []
+        if keep is not None:
+            conditions.append('position > ?')
+            params.append(keep)
+        if older_than is not None:
+            conditions.append('timestamp < ?')
+            params.append(format_timestamp(older_than))
+        if max_bytes is not None:
+            conditions.append('total > ?')
+            params.append(max_bytes)
+
+        if not conditions:
+            return []
+
+        # posição e bytes acumulados a partir da entrada mais nova; as
+        # pendentes contam, mas só expiram se abandonadas
+        updated = time.time()
+        rows = db.execute(
+            f"""
+            SELECT * FROM (
+                SELECT *,
+                    ROW_NUMBER() OVER newest AS position,
+                    SUM(size) OVER newest AS total
+                FROM entries
+                WHERE product = ? AND status NOT IN (?, ?)
+                WINDOW newest AS (ORDER BY timestamp DESC)
+            )
+            WHERE ({' OR '.join(conditions)})
+                AND (status != ? OR updated < ?)
+            """,
+            (product, TOMBSTONED, COLLECTING, *params, PENDING,
+             updated - STALE_PENDING)
+        ).fetchall()
+
+        db.executemany(
+            """
+            UPDATE entries SET status = ?, updated = ?
+            WHERE product = ? AND timestamp = ?
+            """,
+            [
+                (TOMBSTONED, updated, row['product'], row['timestamp'])
+                for row in rows
+            ]
+        )
+        return [Entry.of(row) for row in rows]
+
+    def expire(
+        self,
+        product: str,
+        keep: Optional[int] = None,
+        older_than: Optional[datetime] = None,
+        max_bytes: Optional[int] = None
+    ) -> List[Entry]:
+        """
+        Marca como `tombstoned` as entradas além das `keep` mais novas, as
+        anteriores a `older_than` e as que passam de `max_bytes` somados a
+        partir da mais nova. Entradas ainda em gravação são preservadas.
+        Devolve as entradas expiradas.
+        """
+        with self._transaction() as db:
+            return self._expire(db, product, keep, older_than, max_bytes)
+
+    def claim_tombstoned(self, limit: int) -> List[Entry]:
+        """
+        Passa para `collecting` até `limit` entradas expiradas, as mais
+        antigas primeiro, para que o coletor apague os seus arquivos (e
+        depois chame `collected`). Entradas em coleta abandonadas há mais
+        de STALE_COLLECTING são entregues de novo.
+        """
+        updated = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                """
+                SELECT * FROM entries
+                WHERE status = ? OR (status = ? AND updated < ?)
+                ORDER BY updated, timestamp LIMIT ?
+                """,
+                (TOMBSTONED, COLLECTING, updated - STALE_COLLECTING, limit)
+            ).fetchall()
+
+            db.executemany(
+                """
+                UPDATE entries SET status = ?, updated = ?
+                WHERE product = ? AND timestamp = ?
+                """,
+                [
+                    (COLLECTING, updated, row['product'], row['timestamp'])
+                    for row in rows
+                ]
+            )
+            return [Entry.of(row) for row in rows]
+
+    def collected(self, entry: Entry):
+        """Remove a entrada cujos arquivos o coletor já apagou"""
+        with self._transaction() as db:
+            db.execute(
+                """
+                DELETE FROM entries
+                WHERE product = ? AND timestamp = ? AND status = ?
+                """,
+                (entry.product, format_timestamp(entry.timestamp), COLLECTING)
+            )
+
+    def mark(
+        self,
+        product: str,
+        timestamp: datetime,
+        status: str,
+        size: Optional[int] = None
+    ):
+        with self._transaction() as db:
+            db.execute(
+                """
+                UPDATE entries
+                SET status = ?, size = COALESCE(?, size), updated = ?
+                WHERE product = ? AND timestamp = ? AND status NOT IN (?, ?)
+                """,
+                (status, size, time.time(), product,
+                 format_timestamp(timestamp), TOMBSTONED, COLLECTING)
+            )
+
+    def remove(self, product: str, timestamp: datetime):
+        with self._transaction() as db:
+            db.execute(
+                'DELETE FROM entries WHERE product = ? AND timestamp = ?',
+                (product, format_timestamp(timestamp))
+            )
+
+    def get(self, product: str, timestamp: datetime) -> Optional[Entry]:
+        row = self._query(
+            'SELECT * FROM entries WHERE product = ? AND timestamp = ?',
+            product, format_timestamp(timestamp)
+        ).fetchone()
+        return None if row is None else Entry.of(row)
+
+    def latest(
+        self,
+        product: str,
+        n: int = 1,
+        status: Optional[str] = READY
+    ) -> List[Entry]:
+        """As `n` entradas mais recentes, da mais nova para a mais antiga"""
+        if status is None:
+            rows = self._query(
+                """
+                SELECT * FROM entries WHERE product = ?
+                ORDER BY timestamp DESC LIMIT ?
+                """,
+                product, n
+            )
+        else:
+            rows = self._query(
+                """
+                SELECT * FROM entries WHERE product = ? AND status = ?
+                ORDER BY timestamp DESC LIMIT ?
+                """,
+                product, status, n
+            )
+        return [Entry.of(row) for row in rows]
+
+    def between(
+        self,
+        product: str,
+        start: datetime,
+        end: datetime,
+        status: Optional[str] = READY
+    ) -> List[Entry]:
+        """Entradas com start <= horário < end, em ordem cronológica"""
+        params = [product, format_timestamp(start), format_timestamp(end)]
+        sql = """
+            SELECT * FROM entries
+            WHERE product = ? AND timestamp >= ? AND timestamp < ?
+        """
+        if status is not None:
+            sql += ' AND status = ?'
+            params.append(status)
+
+        rows = self._query(sql + ' ORDER BY timestamp', *params)
+        return [Entry.of(row) for row in rows]
+
+    def entries(self, product: str) -> List[Entry]:
+        rows = self._query(
+            'SELECT * FROM entries WHERE product = ? ORDER BY timestamp',
+            product
+        )
+        return [Entry.of(row) for row in rows]
+
+    def products(self) -> List[str]:
+        rows = self._query('SELECT DISTINCT product FROM entries')
+        return [row['product'] for row in rows]
+
+    def is_empty(self) -> bool:
+        return self._query('SELECT 1 FROM entries LIMIT 1').fetchone() is None
+
+    def import_json(
+        self,
+        dates_dir: str,
+        locate: Callable[[str, datetime], Optional[str]],
+        measure: Callable[[str], int] = lambda path: 0
+    ) -> int:
+        """
+        Importa os antigos dates/date_<produto>.json. `locate` devolve o
+        caminho de uma entrada se ela existe em disco; as que não existem
+        são descartadas. Devolve o número de entradas importadas.
+        """
+        imported = 0
+        for file in sorted(Path(dates_dir).glob('date_*.json')):
+            product = file.stem[len('date_'):]
+            try:
+                with open(file) as f:
+                    dates = json.load(f)['dates']
+            except (OSError, ValueError, KeyError) as e:
+                print(f'ignorando {file}: {e}')
+                continue
+
+            rows = []
+            for value in dates:
+                try:
+                    timestamp = parse_timestamp(value)
+                except ValueError:
+                    continue
+
+                path = locate(product, timestamp)
+                if path is not None:
+                    rows.append((
+                        product, value, READY, path, measure(path),
+                        time.time()
+                    ))
+
+            with self._transaction() as db:
+                db.executemany(
+                    """
+                    INSERT OR IGNORE INTO entries
+                        (product, timestamp, status, path, size, updated)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    rows
+                )
+            imported += len(rows)
+
+        return imported
+
+    def close(self):
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
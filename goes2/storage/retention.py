@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from goes2.metrics import registry
+
+from .catalog import Entry
+
+if TYPE_CHECKING:
+    from .time_series_storage import TimeSeriesStorage
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Quanto manter de cada produto: as `max_count` entradas mais novas, as
+    de até `max_age` atrás e até `max_bytes` somados a partir da mais nova.
+    Uma entrada expira ao violar qualquer um dos limites definidos.
+    """
+    max_count: Optional[int] = None
+    max_age: Optional[timedelta] = None
+    max_bytes: Optional[int] = None
+
+    def limits(self) -> Dict:
+        """Argumentos de Catalog.expire"""
+        older_than = None
+        if self.max_age is not None:
+            older_than = datetime.now(timezone.utc) - self.max_age
+
+        return {
+            'keep': self.max_count,
+            'older_than': older_than,
+            'max_bytes': self.max_bytes,
+        }
+
+
+class Collector(threading.Thread):
+    """
+    Apaga em segundo plano os arquivos das entradas expiradas. A cada
+    `interval` segundos (ou quando acordado) reaplica a retenção de todos
+    os produtos e remove as entradas marcadas em lotes de `batch`, com no
+    máximo `files_per_second` arquivos apagados por segundo para não
+    disputar o disco com a produção.
+    """
+
+    def __init__(
+        self,
+        storage: 'TimeSeriesStorage',
+        interval: float = 60,
+        batch: int = 8,
+        files_per_second: float = 2000
+    ):
+        super().__init__(name='goes2-collector', daemon=True)
+        self._storage = storage
+        self.interval = interval
+        self.batch = batch
+        self.files_per_second = files_per_second
+
+        self._wake = threading.Event()
+        self._state_lock = threading.Lock()
+        self._launched = False
+        self._stopping = False
+        self._drain = True
+        self._hooks: List[Callable[[], None]] = []
+        self._remove_hooks: List[Callable[[str, os.stat_result], None]] = []
+
+        # balde de fichas do limitador
+        self._tokens = files_per_second
+        self._refilled = time.monotonic()
+
+    def start_once(self):
+        """Inicia a thread, se ainda não foi iniciada nem encerrada"""
+        with self._state_lock:
+            if not self._launched and not self._stopping:
+                self._launched = True
+                self.start()
+
+    def on_collect(self, callback: Callable[[], None]):
+        """
+        Registra `callback`, chamado na thread do coletor depois de cada
+        coleta que apagou entradas (ex. TileStore.prune)
+        """
+        self._hooks.append(callback)
+
+    def on_remove(self, callback: Callable[[str, os.stat_result], None]):
+        """
+        Registra `callback`, chamado com o caminho e o `lstat` de cada
+        arquivo logo antes de ele ser apagado (ex. TileStore.release)
+        """
+        self._remove_hooks.append(callback)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, drain: bool = True):
+        """
+        Encerra o coletor. Com `drain`, apaga antes tudo o que já expirou;
+        sem ele, as entradas marcadas ficam para a próxima execução.
+        """
+        with self._state_lock:
+            self._stopping = True
+            self._drain = drain
+        self._wake.set()
+        if self._launched:
+            self.join()
+
+    def run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping and not self._drain:
+                return
+
+            try:
+                self.collect()
+            except Exception as e:
+                print(f'erro na coleta de {self._storage.path}: {e}')
+
+            if self._stopping:
+                return
+
+    def collect(self) -> int:
+        """Expira e apaga o que passou da retenção; devolve as entradas"""
+        for product in self._storage.catalog.products():
+            self._storage.expire(product)
+
+        collected = 0
+        while not (self._stopping and not self._drain):
+            entries = self._storage.catalog.claim_tombstoned(self.batch)
+            if not entries:
+                break
+
+            with registry.timer('collect'):
+                for entry in entries:
+                    self._remove_entry(entry)
+                    # só agora: uma coleta interrompida deixa a linha
+                    self._storage.catalog.collected(entry)
+            registry.inc('collected_entries_total', len(entries))
+            collected += len(entries)
+
+        if collected:
+            for callback in self._hooks:
+                callback()
+        return collected
+
+    def _throttle(self):
+        if not self.files_per_second:
+            return
+
+        now = time.monotonic()
+        self._tokens = min(
+            self.files_per_second,
+            self._tokens + (now - self._refilled) * self.files_per_second
+        )
+        self._refilled = now
+
+        if self._tokens < 1:
+            time.sleep((1 - self._tokens) / self.files_per_second)
+            self._tokens = 1
+            self._refilled = time.monotonic()
+        self._tokens -= 1
+
+    def _unlink(self, path: str):
+        self._throttle()
+        try:
+            if self._remove_hooks:
+                stat = os.lstat(path)
+                for callback in self._remove_hooks:
+                    try:
+                        callback(path, stat)
+                    except Exception as e:
+                        print(f'erro no aviso de remoção de {path}: {e}')
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_entry(self, entry: Entry):
+        """Remove os arquivos da entrada, um a um, e os diretórios vazios"""
+        for path in self._storage.paths_of(entry.path):
+            if os.path.isdir(path) and not os.path.islink(path):
+                for root, dirs, files in os.walk(path, topdown=False):
+                    for name in files:
+                        self._unlink(os.path.join(root, name))
+                    for name in dirs:
+                        self._rmdir(os.path.join(root, name))
+                self._rmdir(path)
+            else:
+                self._unlink(path)
+
+        self._prune(os.path.dirname(entry.path))
+
+    @staticmethod
+    def _rmdir(path: str) -> bool:
+        try:
+            os.rmdir(path)
+            return True
+        except OSError:
+            return False
+
+    def _prune(self, directory: str):
+        # sobe removendo os diretórios que ficaram vazios, até a raiz
+        root = os.path.abspath(self._storage.path)
+        directory = os.path.abspath(directory)
+        while directory.startswith(root + os.sep):
+            if not self._rmdir(directory):
+                break
+            directory = os.path.dirname(directory)
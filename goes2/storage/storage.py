@@ -1,10 +1,49 @@
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
+from typing import Callable, List
+
+
+@dataclass(frozen=True)
+class StorageEvent:
+    # 'ready': entrada completa e visível; 'removed': entrada expirada,
+    # já invisível (os arquivos são apagados depois, em segundo plano)
+    kind: str
+    product: str
+    timestamp: datetime
+    path: str
 
 
 class Storage:
     def __init__(self, at: str):
         Path(at).mkdir(exist_ok=True, parents=True)
         self.path = at
+        self._subscribers: List[Callable[[StorageEvent], None]] = []
 
     def new():
         pass
+
+    def ready(self, product: str, date):
+        """Chamado quando o conteúdo de `new` foi completamente gravado"""
+        pass
+
+    def failed(self, product: str, date):
+        pass
+
+    def dispose(self):
+        pass
+
+    def subscribe(self, callback: Callable[[StorageEvent], None]):
+        """
+        Registra `callback` para os eventos do armazenamento. É chamado na
+        thread que gerou o evento, e deve ser rápido.
+        """
+        self._subscribers.append(callback)
+
+    def _emit(self, kind: str, product: str, timestamp: datetime, path: str):
+        event = StorageEvent(kind, product, timestamp, path)
+        for callback in self._subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f'erro no assinante de {kind} ({product}): {e}')
@@ -1,12 +1,19 @@
 from .storage import Storage
+from .catalog import (
+    COLLECTING, FAILED, READY, TOMBSTONED, Catalog, CollectingError, Entry,
+    format_timestamp
+)
+from .retention import Collector, RetentionPolicy
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+import time
 import json
 from pathlib import Path
-import shutil
 import glob
-from typing import List, Optional, Dict, Union
+import threading
+from typing import List, Optional, Dict, Set, Tuple, Union
+from uuid import uuid4
 
 
 class TimeSeriesStorage(Storage):
@@ -19,7 +26,13 @@ class TimeSeriesStorage(Storage):
         at: str,
         max_size: int = 5,
         path_format: Optional[str] = None,
-        filename_pattern: Optional[str] = None
+        filename_pattern: Optional[str] = None,
+        catalog: Optional[Catalog] = None,
+        retention: Union[RetentionPolicy, Dict[str, RetentionPolicy],
+                         None] = None,
+        collector: Optional[Collector] = None,
+        export_delay: float = 1.0,
+        collect_timeout: float = 600
     ):
         """
         Constrói um objeto que armazenará e pesquisará arquivos em série
@@ -31,61 +44,141 @@ class TimeSeriesStorage(Storage):
             path_format (str): Formato do caminho com placeholders
             filename_pattern (str, optional): Padrão do nome do arquivo. Se
             None, retorna apenas o diretório.
+            catalog (Catalog, optional): Catálogo das entradas. Por padrão,
+            catalog.sqlite dentro de `at`; na primeira abertura importa os
+            dates/date_<produto>.json existentes.
+            retention (RetentionPolicy | dict, optional): Retenção de todos
+            os produtos, ou por produto (os ausentes usam `max_size`)
+            collector (Collector, optional): Coletor que apaga as entradas
+            expiradas, iniciado no primeiro `new`
+            export_delay (float): Segundos de espera antes de regravar os
+            dates/date_<produto>.json, juntando as mudanças do intervalo
+            collect_timeout (float): Segundos que `new` espera o coletor
+            terminar de apagar um horário expirado que é refeito
         """
         super().__init__(at)
         self.max_size = max_size
         self.path_format = path_format or '{year}{month}{day}/{hour}{minute}/{product}'
         self.filename_pattern = filename_pattern
 
-    def health_check(self, product: str) -> None:
+        keep = None if max_size == 'unlimited' else max_size
+        if isinstance(retention, RetentionPolicy):
+            self._default_retention = retention
+            self.retention = {}
+        else:
+            self._default_retention = RetentionPolicy(max_count=keep)
+            self.retention = dict(retention or {})
+
+        self._collector = collector or Collector(self)
+
+        self.export_delay = export_delay
+        self.collect_timeout = collect_timeout
+        self._export_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending_exports: Set[str] = set()
+        self._export_timer: Optional[threading.Timer] = None
+
+        self.catalog = catalog or Catalog(os.path.join(at, 'catalog.sqlite'))
+        if self.catalog.is_empty():
+            imported = self.catalog.import_json(
+                os.path.join(at, 'dates'), self._locate, self._size_of
+            )
+            if imported:
+                print(f'{imported} entradas importadas de {at}/dates')
+
+    def health_check(self, product: str) -> int:
         """
-        Verifies and cleans up date entries in the date.json file for a
-        specific product.
-        Removes entries that don't correspond to actual files in the storage.
+        Remove do catálogo as entradas do produto que não correspondem a
+        arquivos no armazenamento
 
         Args:
-            product: Name of the product to check
+            product: Nome do produto a verificar
         """
-        date_file = Path(f'{self.path}/dates/date_{product}.json')
-
-        if not date_file.exists():
-            return
-
-        # Load existing dates
-        with open(date_file, 'r') as file:
-            data = json.load(file)
-
-        # Keep track of valid dates
-        valid_dates = []
         removed_count = 0
-
-        for date_str in data["dates"]:
-            try:
-                date = datetime.strptime(date_str, "%Y-%m-%dT%H:%MZ")
-                full_path = self._generate_full_path(product, date)
-
-                if os.path.exists(full_path):
-                    valid_dates.append(date_str)
-                else:
-                    removed_count += 1
-            except ValueError:
-                # Skip malformed date strings
-                removed_count += 1
+        for entry in self.catalog.entries(product):
+            # as expiradas são do coletor, que remove a linha ao terminar
+            if entry.status in (TOMBSTONED, COLLECTING):
                 continue
+            if self._locate(product, entry.timestamp) is None:
+                self.catalog.remove(product, entry.timestamp)
+                removed_count += 1
 
-        # Only update the file if changes were made
         if removed_count > 0:
-            data["dates"] = valid_dates
-            with open(date_file, 'w') as file:
-                json.dump(data, file)
-
+            with self._export_lock:
+                self._export_dates(product)
             print(
-                f"Health check removed {removed_count} invalid entries for" +
+                f"Health check removed {removed_count} invalid entries for " +
                 f"product {product}"
             )
 
         return removed_count
 
+    @staticmethod
+    def _round(date: datetime) -> datetime:
+        rounded_minute = int(f'{date.minute:02.0f}'[0] + '0')
+        return date.replace(minute=rounded_minute)
+
+    def _locate(self, product: str, date: datetime) -> Optional[str]:
+        """
+        Caminho da entrada em disco, se existir (os rasterizadores de imagem
+        acrescentam a extensão ao caminho)
+        """
+        full_path = self._generate_full_path(product, date)
+        if os.path.exists(full_path):
+            return full_path
+
+        matches = glob.glob(glob.escape(full_path) + '.*')
+        return matches[0] if matches else None
+
+    def _export_dates(self, product: str):
+        """
+        Mantém o dates/date_<produto>.json (lido por quem consome o
+        armazenamento) com as entradas prontas, gravado atomicamente
+        """
+        dates_dir = Path(f'{self.path}/dates')
+        dates_dir.mkdir(exist_ok=True)
+
+        dates = [
+            format_timestamp(entry.timestamp)
+            for entry in self.catalog.entries(product)
+            if entry.status == READY
+        ]
+
+        date_file = dates_dir / f'date_{product}.json'
+        temp = dates_dir / f'.date_{product}.json.{uuid4().hex}'
+        with open(temp, 'w') as file:
+            json.dump({"dates": dates}, file)
+        os.replace(temp, date_file)
+
+    def _schedule_export(self, product: str):
+        """
+        Regrava o JSON do produto depois de `export_delay` segundos: as
+        entradas prontas e expiradas no intervalo custam uma gravação só
+        """
+        with self._pending_lock:
+            self._pending_exports.add(product)
+            if self._export_timer is not None:
+                return
+            self._export_timer = threading.Timer(
+                self.export_delay, self._flush_exports
+            )
+            self._export_timer.daemon = True
+            self._export_timer.start()
+
+    def _flush_exports(self):
+        with self._pending_lock:
+            products = self._pending_exports
+            self._pending_exports = set()
+            self._export_timer = None
+
+        # uma gravação por vez: a última lê o catálogo mais recente
+        with self._export_lock:
+            for product in products:
+                try:
+                    self._export_dates(product)
+                except OSError as e:
+                    print(f'erro ao exportar as datas de {product}: {e}')
+
     def _generate_placeholders(
         self,
         product: str,
@@ -123,42 +216,38 @@ class TimeSeriesStorage(Storage):
 
         return full_path
 
-    def dispose(self) -> None:
+    def dispose(self, drain: bool = True) -> None:
         """
-        Removes all empty directories within the storage path (self.path).
-        Walks through the directory tree bottom-up and removes directories
-        that are empty.
+        Encerra o coletor. Com `drain`, apaga antes as entradas já
+        expiradas (os diretórios vazios são removidos junto); sem ele,
+        ficam para a próxima execução.
         """
-        for root, dirs, files in os.walk(self.path, topdown=False):
-            for dir_name in dirs:
-                dir_path = os.path.join(root, dir_name)
-                try:
-                    # Try to remove the directory if it's empty
-                    os.rmdir(dir_path)
-                except OSError:
-                    # Directory not empty or other error - skip it
-                    pass
-
-        # Also try to remove the base directory if it's now empty
-        try:
-            os.rmdir(self.path)
-        except OSError:
-            # Base directory not empty or other error - skip it
-            pass
-
-    def _remove_oldest(self, product: str, of: List[str]):
-        """Remove os arquivos mais antigos até que a quantidade esteja dentro
-        do limite max_size"""
-        while len(of) > self.max_size:
-            to_remove = of.pop(0)
-            removed_date = datetime.strptime(to_remove, "%Y-%m-%dT%H:%MZ")
-            full_path = self._generate_full_path(product, removed_date)
-
-            if os.path.exists(full_path):
-                if os.path.isfile(full_path):
-                    os.remove(full_path)
-                else:
-                    shutil.rmtree(full_path)
+        self._collector.stop(drain)
+
+        with self._pending_lock:
+            timer = self._export_timer
+        if timer is not None:
+            timer.cancel()
+        self._flush_exports()
+
+    @staticmethod
+    def paths_of(full_path: str) -> List[str]:
+        """O caminho da entrada e as suas variantes com extensão"""
+        return [full_path] + glob.glob(glob.escape(full_path) + '.*')
+
+    @staticmethod
+    def _size_of(full_path: str) -> int:
+        size = 0
+        for path in TimeSeriesStorage.paths_of(full_path):
+            if os.path.isfile(path):
+                size += os.path.getsize(path)
+            for root, _, files in os.walk(path):
+                for name in files:
+                    try:
+                        size += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+        return size
 
     def new(
         self,
@@ -172,41 +261,43 @@ class TimeSeriesStorage(Storage):
         Args:
             product: Nome do produto
             date: Data do arquivo
-            use_dates_folder: Se True, mantém registro das datas no arquivo
-            JSON
+            use_dates_folder: Se True, registra a entrada no catálogo (como
+            pendente, até `ready`)
 
         Returns:
             Caminho completo para o novo arquivo/diretório
         """
-        if use_dates_folder:
-            Path(f'{self.path}/dates').mkdir(exist_ok=True)
-            data = {"dates": []}
-            date_file = Path(f'{self.path}/dates/date_{product}.json')
-
-            if date_file.exists():
-                with open(date_file, 'r+') as file:
-                    data = json.load(file)
-
-            rounded_minute = int(f'{date.minute:02.0f}'[0] + '0')
-            date = date.replace(minute=rounded_minute)
-            date_str = date.strftime("%Y-%m-%dT%H:%MZ")
-
-            if date_str not in data["dates"]:
-                data["dates"].append(date_str)
-
-                if (
-                    self.max_size != 'unlimited' and
-                    len(data["dates"]) > self.max_size
-                ):
-                    self._remove_oldest(product, of=data["dates"])
+        date = self._round(date)
+        full_path = self._generate_full_path(product, date)
 
-                with open(date_file, 'w') as file:
-                    json.dump(data, file)
+        if use_dates_folder:
+            # inserção e rotação numa única transação; as entradas
+            # expiradas somem das buscas já, e os arquivos são apagados
+            # pelo coletor, fora do caminho da produção
+            expired = self._insert(product, date, full_path)
+            self._expired(product, expired)
+            self._collector.start_once()
 
-        full_path = self._generate_full_path(product, date)
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
         return full_path
 
+    def _insert(self, product: str, date: datetime, full_path: str):
+        # um horário expirado refeito antes de o coletor terminar: o mesmo
+        # caminho seria apagado depois de regravado, então espera
+        deadline = time.monotonic() + self.collect_timeout
+        while True:
+            try:
+                return self.catalog.insert(
+                    product, date, full_path,
+                    **self.policy(product).limits()
+                )
+            except CollectingError:
+                if time.monotonic() > deadline:
+                    raise
+                self._collector.start_once()
+                self._collector.wake()
+                time.sleep(0.5)
+
     def find_by_date(
         self,
         product: str,
@@ -228,10 +319,32 @@ class TimeSeriesStorage(Storage):
             - Se exact_match=False: retorna lista de caminhos encontrados (
             pode ser vazia)
         """
+        date = self._round(date)
+
         if exact_match:
+            entry = self.catalog.get(product, date)
+            if entry is not None:
+                if entry.status != READY:
+                    return None
+                return self._locate(product, date)
+
+            # caminho gravado sem registro no catálogo
             full_path = self._generate_full_path(product, date)
             return full_path if os.path.exists(full_path) else None
         else:
+            entries = self.catalog.between(
+                product, date, date + timedelta(minutes=10), status=None
+            )
+            if entries:
+                # entradas pendentes (ainda em escrita, ou interrompidas)
+                # não contam
+                found = [
+                    self._locate(product, entry.timestamp)
+                    for entry in entries if entry.status == READY
+                ]
+                found = [path for path in found if path is not None]
+                return found or None
+
             # Gera o padrão de busca substituindo os placeholders
             placeholders = self._generate_placeholders(product, date)
             path_pattern = self.path_format.format(**placeholders)
@@ -254,3 +367,85 @@ class TimeSeriesStorage(Storage):
                 return result
             
             return None
+
+    def policy(self, product: str) -> RetentionPolicy:
+        return self.retention.get(product, self._default_retention)
+
+    def expire(self, product: str) -> int:
+        """Aplica a retenção do produto; devolve as entradas expiradas"""
+        limits = self.policy(product).limits()
+        expired = self.catalog.expire(product, **limits)
+        self._expired(product, expired)
+        return len(expired)
+
+    def on_collect(self, callback):
+        """Chamado depois que o coletor apaga entradas expiradas"""
+        self._collector.on_collect(callback)
+
+    def on_remove(self, callback):
+        """Chamado pelo coletor antes de apagar cada arquivo"""
+        self._collector.on_remove(callback)
+
+    def _expired(self, product: str, entries):
+        if not entries:
+            return
+
+        self._schedule_export(product)
+        for entry in entries:
+            self._emit('removed', product, entry.timestamp, entry.path)
+        self._collector.wake()
+
+    def ready(self, product: str, date: datetime):
+        """Marca a entrada como completa, visível para as buscas"""
+        date = self._round(date)
+        entry = self.catalog.get(product, date)
+        if entry is None or entry.status in (TOMBSTONED, COLLECTING):
+            return
+
+        # percorrer a árvore de tiles só vale para a retenção por bytes
+        size = None
+        if self.policy(product).max_bytes is not None:
+            size = self._size_of(entry.path)
+
+        self.catalog.mark(product, date, READY, size)
+        self._schedule_export(product)
+        self._emit('ready', product, date, entry.path)
+
+    def failed(self, product: str, date: datetime):
+        date = self._round(date)
+        self.catalog.mark(product, date, FAILED)
+
+    def entry(
+        self,
+        product: str,
+        date: Optional[datetime] = None
+    ) -> Optional[Entry]:
+        """
+        A entrada pronta do horário (arredondado), ou a mais recente se
+        `date` é None. Entradas pendentes e expiradas não contam.
+        """
+        if date is None:
+            latest = self.catalog.latest(product, 1)
+            return latest[0] if latest else None
+
+        entry = self.catalog.get(product, self._round(date))
+        return entry if entry is not None and entry.status == READY else None
+
+    def latest(self, product: str, n: int = 1) -> List[Tuple[datetime, str]]:
+        """As `n` entradas prontas mais recentes, da mais nova à mais antiga"""
+        return [
+            (entry.timestamp, entry.path)
+            for entry in self.catalog.latest(product, n)
+        ]
+
+    def between(
+        self,
+        product: str,
+        start: datetime,
+        end: datetime
+    ) -> List[Tuple[datetime, str]]:
+        """Entradas prontas com start <= horário < end"""
+        return [
+            (entry.timestamp, entry.path)
+            for entry in self.catalog.between(product, start, end)
+        ]
@@ -0,0 +1,46 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# os testes importam goes2 e benchmarks da raiz do repositório
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _timestamp(date: datetime) -> str:
+    return date.strftime('%Y%j%H%M%S') + str(date.microsecond // 100000)
+
+
+def key_of(product: str, channel: str, date: datetime) -> str:
+    """Chave no layout do bucket, ex. ABI-L2-CMIPF/2025/226/19/OR_..."""
+    end = date + timedelta(minutes=9, seconds=30)
+    created = end + timedelta(seconds=10)
+    name = (
+        f'OR_{product}-M6{channel}_G19_s{_timestamp(date)}'
+        f'_e{_timestamp(end)}_c{_timestamp(created)}.nc'
+    )
+    return f'{product}/{date.strftime("%Y/%j/%H")}/{name}'
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    """Cria objetos em tmp_path/bucket; devolve (raiz, função de escrita)"""
+    def put(key: str, data: bytes = b'goes') -> str:
+        path = tmp_path / 'bucket' / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return key
+
+    return tmp_path, put
+
+
+@pytest.fixture
+def local_s3(bucket):
+    pytest.importorskip('aiohttp')
+    from benchmarks.s3_server import LocalS3
+
+    root, _ = bucket
+    with LocalS3(str(root)) as server:
+        yield server
@@ -0,0 +1,138 @@
+import io
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip('numpy')
+PIL_Image = pytest.importorskip('PIL.Image')
+
+from goes2.raster.animation import (  # noqa: E402
+    AnimatedLoop, _gif_sub_blocks_end, _riff_chunk, _riff_chunks
+)
+
+START = datetime(2025, 8, 14, 19, 0, tzinfo=timezone.utc)
+
+
+class Store:
+    """Armazenamento mínimo: só o que o AnimatedLoop consulta"""
+
+    def __init__(self, latest=()):
+        self._latest = list(latest)
+        self.callbacks = []
+
+    def subscribe(self, callback):
+        self.callbacks.append(callback)
+
+    def latest(self, product, n):
+        return self._latest[:n]
+
+
+def _loop(tmp_path, format: str, **kwargs) -> AnimatedLoop:
+    loop = AnimatedLoop(
+        Store(), 'produto', str(tmp_path / 'loop'), format=format,
+        duration=200, max_size=None, **kwargs
+    )
+    loop.close()
+    return loop
+
+
+def _images(n: int):
+    images = []
+    for i in range(n):
+        array = np.zeros((24, 32, 4), np.uint8)
+        array[..., i % 3] = 255
+        array[..., 3] = 255
+        # canto transparente
+        array[:8, :8] = 0
+        images.append(PIL_Image.fromarray(array))
+    return images
+
+
+def _open(data: bytes):
+    return PIL_Image.open(io.BytesIO(data))
+
+
+def test_riff_chunks_padding():
+    odd = _riff_chunk(b'ABCD', b'abc')
+    assert len(odd) == 8 + 4
+    data = b'RIFF' + struct.pack('<I', 0) + b'WEBP' + odd + \
+        _riff_chunk(b'EFGH', b'de')
+    assert [kind for kind, _ in _riff_chunks(data)] == [b'ABCD', b'EFGH']
+    assert list(_riff_chunks(data))[0][1] == odd
+
+
+def test_gif_sub_blocks_end():
+    data = b'\x02ab\x01c\x00rest'
+    assert _gif_sub_blocks_end(data, 0) == 6
+
+
+def test_assemble_webp(tmp_path):
+    loop = _loop(tmp_path, 'WEBP', lossless=True)
+    images = _images(3)
+    data = loop._assemble_webp([loop._encode_webp(i) for i in images])
+
+    assert data[:4] == b'RIFF' and data[8:12] == b'WEBP'
+    assert struct.unpack('<I', data[4:8])[0] == len(data) - 8
+    kinds = [kind for kind, _ in _riff_chunks(data)]
+    assert kinds == [b'VP8X', b'ANIM'] + [b'ANMF'] * 3
+
+    animation = _open(data)
+    assert animation.n_frames == 3
+    assert animation.size == (32, 24)
+    for index, image in enumerate(images):
+        animation.seek(index)
+        assert np.array_equal(
+            np.asarray(animation.convert('RGBA')), np.asarray(image)
+        )
+
+
+def test_assemble_gif(tmp_path):
+    loop = _loop(tmp_path, 'GIF')
+    images = _images(3)
+    frames = [loop._encode_gif(image) for image in images]
+    # o PIL pode compactar a paleta; o índice vem do próprio GIF
+    assert all(frame.transparency is not None for frame in frames)
+
+    data = loop._assemble_gif(frames)
+    assert data[:6] == b'GIF89a' and data[-1:] == b'\x3b'
+
+    animation = _open(data)
+    assert animation.n_frames == 3
+    assert animation.info['loop'] == 0
+    assert animation.info['duration'] == 200
+    for index, image in enumerate(images):
+        animation.seek(index)
+        rgba = np.asarray(animation.convert('RGBA'))
+        expected = np.asarray(image)
+        assert (rgba[:8, :8, 3] == 0).all()
+        assert np.array_equal(rgba[8:, 8:], expected[8:, 8:])
+
+
+def test_frames_follow_storage(tmp_path):
+    paths = []
+    for i, image in enumerate(_images(4)):
+        path = tmp_path / f'frame{i}.png'
+        image.save(path)
+        paths.append(str(path))
+
+    loop = AnimatedLoop(
+        Store(), 'produto', str(tmp_path / 'loop'), format='GIF',
+        frames=3, max_size=None
+    )
+    try:
+        for i, path in enumerate(paths):
+            loop._add(START + timedelta(minutes=10 * i), path)
+        # só os três mais novos, em ordem
+        assert sorted(loop._encoded) == [
+            START + timedelta(minutes=10 * i) for i in (1, 2, 3)
+        ]
+        assert _open(open(loop.path, 'rb').read()).n_frames == 3
+
+        for i in (1, 2, 3):
+            loop._remove(START + timedelta(minutes=10 * i))
+        # sem horários, a animação sai
+        with pytest.raises(FileNotFoundError):
+            open(loop.path, 'rb')
+    finally:
+        loop.close()
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from goes2.storage import catalog as catalog_module
+from goes2.storage.catalog import (
+    COLLECTING, PENDING, READY, TOMBSTONED, Catalog, CollectingError
+)
+
+PRODUCT = 'ABI-L2-CMIPF-C13'
+START = datetime(2025, 8, 14, 19, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = Catalog(str(tmp_path / 'catalog.sqlite'))
+    yield catalog
+    catalog.close()
+
+
+def _times(n: int):
+    return [START + timedelta(minutes=10 * i) for i in range(n)]
+
+
+def _fill(catalog: Catalog, n: int, size: int = 10):
+    for date in _times(n):
+        catalog.insert(PRODUCT, date, f'/data/{date:%H%M}')
+        catalog.mark(PRODUCT, date, READY, size)
+
+
+def _expired(entries):
+    return sorted(entry.timestamp for entry in entries)
+
+
+def _statuses(catalog: Catalog):
+    return [entry.status for entry in catalog.entries(PRODUCT)]
+
+
+def test_keep_expires_oldest(catalog):
+    _fill(catalog, 5)
+
+    expired = catalog.expire(PRODUCT, keep=2)
+    assert _expired(expired) == _times(3)
+    assert _statuses(catalog) == [TOMBSTONED] * 3 + [READY] * 2
+    assert [entry.timestamp for entry in catalog.latest(PRODUCT, 5)] == \
+        _times(5)[:2:-1]
+
+    # as já expiradas não expiram de novo
+    assert catalog.expire(PRODUCT, keep=2) == []
+
+
+def test_older_than(catalog):
+    _fill(catalog, 4)
+
+    expired = catalog.expire(PRODUCT, older_than=_times(4)[2])
+    assert _expired(expired) == _times(2)
+
+
+def test_max_bytes_counts_from_newest(catalog):
+    _fill(catalog, 4, size=10)
+
+    expired = catalog.expire(PRODUCT, max_bytes=25)
+    assert _expired(expired) == _times(2)
+    assert _statuses(catalog) == [TOMBSTONED] * 2 + [READY] * 2
+
+
+def test_pending_preserved_until_stale(catalog, monkeypatch):
+    _fill(catalog, 2)
+    catalog.insert(PRODUCT, START - timedelta(minutes=10), '/data/old')
+
+    expired = catalog.expire(PRODUCT, keep=1)
+    assert _expired(expired) == [START]
+    assert _statuses(catalog)[0] == PENDING
+
+    # produção abandonada: a pendente também expira
+    monkeypatch.setattr(catalog_module, 'STALE_PENDING', -1)
+    expired = catalog.expire(PRODUCT, keep=1)
+    assert _expired(expired) == [START - timedelta(minutes=10)]
+
+
+def test_insert_rotates_in_same_transaction(catalog):
+    _fill(catalog, 3)
+
+    date = _times(4)[-1]
+    expired = catalog.insert(PRODUCT, date, '/data/new', keep=2)
+    # a nova entrada (pendente) conta na posição
+    assert _expired(expired) == _times(2)
+    assert catalog.get(PRODUCT, date).status == PENDING
+
+
+def test_collection_cycle(catalog):
+    _fill(catalog, 3)
+    catalog.expire(PRODUCT, keep=1)
+
+    claimed = catalog.claim_tombstoned(limit=1)
+    assert [entry.timestamp for entry in claimed] == [START]
+    assert catalog.get(PRODUCT, START).status == COLLECTING
+
+    # regravar o horário agora apagaria os arquivos novos
+    with pytest.raises(CollectingError):
+        catalog.insert(PRODUCT, START, '/data/again')
+    # nem a marcação ressuscita a entrada expirada
+    catalog.mark(PRODUCT, START, READY)
+    assert catalog.get(PRODUCT, START).status == COLLECTING
+
+    catalog.collected(claimed[0])
+    assert catalog.get(PRODUCT, START) is None
+    catalog.insert(PRODUCT, START, '/data/again')
+    assert catalog.get(PRODUCT, START).status == PENDING
+
+    assert [e.timestamp for e in catalog.claim_tombstoned(10)] == \
+        [_times(2)[1]]
+    assert catalog.claim_tombstoned(10) == []
+
+
+def test_stale_collecting_is_claimed_again(catalog, monkeypatch):
+    _fill(catalog, 2)
+    catalog.expire(PRODUCT, keep=1)
+    assert len(catalog.claim_tombstoned(10)) == 1
+    assert catalog.claim_tombstoned(10) == []
+
+    # coletor interrompido no meio do lote
+    monkeypatch.setattr(catalog_module, 'STALE_COLLECTING', -1)
+    assert len(catalog.claim_tombstoned(10)) == 1
@@ -0,0 +1,138 @@
+import io
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+np = pytest.importorskip('numpy')
+PIL_Image = pytest.importorskip('PIL.Image')
+
+from goes2.raster.encoding import (  # noqa: E402
+    FILTERS, Encoding, _adler32_combine, encode_png
+)
+
+
+def _chunks(data: bytes):
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    offset = 8
+    while offset < len(data):
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        payload = data[offset + 8:offset + 8 + length]
+        crc = struct.unpack('>I', data[offset + 8 + length:][:4])[0]
+        assert crc == zlib.crc32(kind + payload)
+        yield kind, payload
+        offset += 12 + length
+
+
+def _idat(data: bytes) -> bytes:
+    return b''.join(
+        payload for kind, payload in _chunks(data) if kind == b'IDAT'
+    )
+
+
+def _decode(data: bytes):
+    image = PIL_Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+@pytest.fixture
+def rgba():
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 256, (300, 37, 4), dtype=np.uint8)
+    # regiões lisas, para os filtros terem o que comprimir
+    array[100:200] = array[100:101]
+    return array
+
+
+def test_adler32_combine():
+    first, second = b'goes-19 ' * 1000, bytes(range(256)) * 300
+    combined = _adler32_combine(
+        zlib.adler32(first), zlib.adler32(second), len(second)
+    )
+    assert combined == zlib.adler32(first + second)
+
+
+@pytest.mark.parametrize('filter', list(FILTERS))
+def test_stripes_decode_to_same_pixels(rgba, filter):
+    with ThreadPoolExecutor(4) as pool:
+        data = encode_png(rgba, filter=filter, stripe_rows=64, pool=pool)
+
+    image = _decode(data)
+    assert image.mode == 'RGBA'
+    assert np.array_equal(np.asarray(image), rgba)
+
+
+def test_stripes_form_one_zlib_stream(rgba):
+    striped = encode_png(rgba, stripe_rows=7)
+    whole = encode_png(rgba, stripe_rows=len(rgba))
+
+    # o fluxo das faixas é um zlib válido (cabeçalho, deflate e adler32)
+    raw = zlib.decompress(_idat(striped))
+    assert raw == zlib.decompress(_idat(whole))
+
+    rows = np.frombuffer(raw, np.uint8).reshape(len(rgba), -1)
+    assert (rows[:, 0] == FILTERS['none']).all()
+    assert np.array_equal(rows[:, 1:].reshape(rgba.shape), rgba)
+
+
+def test_rgb(rgba):
+    rgb = rgba[..., :3]
+    image = _decode(encode_png(rgb, filter='paeth', stripe_rows=50))
+    assert image.mode == 'RGB'
+    assert np.array_equal(np.asarray(image), rgb)
+
+
+def test_palette_with_transparency():
+    palette = np.array([
+        [0, 0, 0, 0],
+        [255, 0, 0, 128],
+        [0, 255, 0, 255],
+        [0, 0, 255, 255],
+    ], dtype=np.uint8)
+    indices = np.arange(64 * 50, dtype=np.uint8).reshape(64, 50) % 4
+
+    data = encode_png(indices, palette, stripe_rows=10)
+    chunks = dict(_chunks(data))
+    assert chunks[b'PLTE'] == palette[:, :3].tobytes()
+    # só até a última entrada não opaca
+    assert chunks[b'tRNS'] == bytes((0, 128))
+
+    image = _decode(data)
+    assert image.mode == 'P'
+    assert np.array_equal(np.asarray(image), indices)
+    assert np.array_equal(
+        np.asarray(image.convert('RGBA')), palette[indices]
+    )
+
+
+def test_opaque_palette_has_no_trns():
+    palette = np.full((2, 4), 255, dtype=np.uint8)
+    data = encode_png(np.zeros((4, 4), np.uint8), palette)
+    assert b'tRNS' not in dict(_chunks(data))
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        encode_png(np.zeros((4, 4), np.uint8))
+    with pytest.raises(ValueError):
+        encode_png(np.zeros((4, 4, 2), np.uint8))
+    with pytest.raises(ValueError):
+        encode_png(np.zeros((4, 4, 4), np.uint8), filter='lzw')
+    with pytest.raises(ValueError):
+        Encoding(format='TIFF')
+
+
+def test_encoding_formats(rgba):
+    assert Encoding(format='jpg').format == 'JPEG'
+    assert Encoding(format='jpg').extension == 'jpg'
+
+    webp = Encoding(format='webp').encode(rgba)
+    image = _decode(webp)
+    assert image.format == 'WEBP'
+    decoded = np.asarray(image.convert('RGBA'))
+    # sem perdas, mas o libwebp descarta a cor dos pixels transparentes
+    visible = rgba[..., 3] > 0
+    assert np.array_equal(decoded[..., 3], rgba[..., 3])
+    assert np.array_equal(decoded[visible], rgba[visible])
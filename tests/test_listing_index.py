@@ -0,0 +1,259 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import key_of
+from goes2.aws.listing_index import KeyRecord, ListingIndex
+
+PRODUCT = 'ABI-L2-CMIPF'
+# hora encerrada há muito tempo: a listagem nunca mais muda
+OLD = datetime(2025, 8, 14, 19, 0, tzinfo=timezone.utc)
+
+
+class Lister:
+    """Listagem em memória que conta as chamadas"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.calls = []
+        self.gate = None
+
+    async def __call__(self, prefix: str):
+        self.calls.append(prefix)
+        if self.gate is not None:
+            await self.gate.wait()
+        return [
+            (key, 4, '"etag"') for key in self.keys
+            if key.startswith(prefix + '/')
+        ]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def test_key_record_parse():
+    key = key_of(PRODUCT, 'C13', OLD + timedelta(seconds=21))
+    record = KeyRecord.parse(key, 10, '"abc"')
+
+    assert record.product == 'ABI-L2-CMIPF'
+    assert record.mode == '6'
+    assert record.channel == 'C13'
+    assert record.start == OLD + timedelta(seconds=21)
+    assert record.etag == 'abc'
+    assert KeyRecord.from_json(record.to_json()) == record
+    assert KeyRecord.parse(f'{PRODUCT}/2025/226/19/outro.nc') is None
+
+
+def test_ttl_reuses_recent_hour():
+    now = _now()
+    lister = Lister([key_of(PRODUCT, 'C13', now)])
+
+    async def run():
+        index = ListingIndex(lister, ttl=60)
+        first = await index.hour(PRODUCT, now)
+        second = await index.hour(PRODUCT, now)
+        return index, first, second
+
+    index, first, second = asyncio.run(run())
+    assert len(lister.calls) == 1
+    assert first == second and len(first) == 1
+    assert (index.hits, index.misses) == (1, 1)
+
+
+def test_expired_ttl_lists_again():
+    now = _now()
+    lister = Lister([key_of(PRODUCT, 'C13', now)])
+
+    async def run():
+        index = ListingIndex(lister, ttl=0)
+        await index.hour(PRODUCT, now)
+        await index.hour(PRODUCT, now)
+
+    asyncio.run(run())
+    assert len(lister.calls) == 2
+
+
+def test_settled_hour_never_expires():
+    lister = Lister([key_of(PRODUCT, 'C13', OLD)])
+
+    async def run(index):
+        await index.hour(PRODUCT, OLD)
+        await index.hour(PRODUCT, OLD)
+
+    asyncio.run(run(ListingIndex(lister, ttl=0)))
+    assert len(lister.calls) == 1
+
+    # listada antes de passar o `settle`: ainda vale o TTL
+    lister.calls.clear()
+    unsettled = ListingIndex(lister, ttl=0, settle=timedelta(days=36500))
+    asyncio.run(run(unsettled))
+    assert len(lister.calls) == 2
+
+
+def test_refresh_forces_listing():
+    lister = Lister([key_of(PRODUCT, 'C13', OLD)])
+
+    async def run():
+        index = ListingIndex(lister)
+        await index.hour(PRODUCT, OLD)
+        await index.hour(PRODUCT, OLD, refresh=True)
+
+    asyncio.run(run())
+    assert len(lister.calls) == 2
+
+
+def test_concurrent_calls_share_listing():
+    lister = Lister([key_of(PRODUCT, 'C13', OLD)])
+
+    async def run():
+        lister.gate = asyncio.Event()
+        index = ListingIndex(lister)
+        tasks = [
+            asyncio.create_task(index.hour(PRODUCT, OLD)) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        lister.gate.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(run())
+    assert len(lister.calls) == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    lister = Lister([key_of(PRODUCT, 'C13', OLD)])
+
+    async def run():
+        lister.gate = asyncio.Event()
+        index = ListingIndex(lister)
+        cancelled = asyncio.create_task(index.hour(PRODUCT, OLD))
+        waiting = asyncio.create_task(index.hour(PRODUCT, OLD))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        lister.gate.set()
+        return await waiting, cancelled.cancelled()
+
+    records, cancelled = asyncio.run(run())
+    assert len(records) == 1 and cancelled
+    assert len(lister.calls) == 1
+
+
+def test_find_newest_of_channel():
+    date = OLD + timedelta(minutes=10)
+    keys = [
+        key_of(PRODUCT, 'C02', date),
+        key_of(PRODUCT, 'C13', date),
+        key_of(PRODUCT, 'C13', date + timedelta(minutes=10)),
+    ]
+    # reprocessado: mesmo início, criado depois
+    newer = keys[1].replace('_c2025', '_c2026')
+    lister = Lister(keys + [newer])
+
+    async def run():
+        index = ListingIndex(lister)
+        return (
+            await index.find(PRODUCT, 'C13', date),
+            await index.find(PRODUCT, 'C07', date),
+        )
+
+    found, missing = asyncio.run(run())
+    assert found.key == newer
+    assert missing is None
+    with pytest.raises(ValueError):
+        asyncio.run(ListingIndex(lister).find(PRODUCT, None, date))
+
+
+def test_add_only_extends_listed_hours():
+    lister = Lister([key_of(PRODUCT, 'C13', OLD)])
+    index = ListingIndex(lister)
+    asyncio.run(index.hour(PRODUCT, OLD))
+
+    later = OLD + timedelta(minutes=10)
+    record = KeyRecord.parse(key_of(PRODUCT, 'C13', later))
+    index.add(record)
+    index.add(record)
+    unlisted = KeyRecord.parse(
+        key_of(PRODUCT, 'C13', OLD + timedelta(hours=2))
+    )
+    index.add(unlisted)
+
+    records = asyncio.run(index.hour(PRODUCT, OLD))
+    assert [r.key for r in records].count(record.key) == 1
+    assert len(lister.calls) == 1
+
+    asyncio.run(index.hour(PRODUCT, OLD + timedelta(hours=2)))
+    assert len(lister.calls) == 2
+
+
+def test_prune_forgets_older_hours():
+    hours = [OLD - timedelta(hours=i) for i in range(3)]
+    lister = Lister([key_of(PRODUCT, 'C13', hour) for hour in hours])
+    index = ListingIndex(lister)
+
+    async def run():
+        for hour in hours:
+            await index.hour(PRODUCT, hour)
+
+    asyncio.run(run())
+    assert index.prune(hours[1]) == 1
+    assert index.prune(hours[1]) == 0
+
+    lister.calls.clear()
+    asyncio.run(run())
+    assert lister.calls == [ListingIndex.prefix(PRODUCT, hours[2])]
+
+
+def test_persisted_listings_are_reloaded(tmp_path):
+    path = tmp_path / 'listings.json'
+    lister = Lister([key_of(PRODUCT, 'C13', OLD)])
+
+    index = ListingIndex(lister, persist_path=str(path), save_interval=3600)
+    first = asyncio.run(index.hour(PRODUCT, OLD))
+    index.flush()
+
+    lister.calls.clear()
+    reloaded = ListingIndex(lister, persist_path=str(path))
+    assert asyncio.run(reloaded.hour(PRODUCT, OLD)) == first
+    assert lister.calls == []
+
+
+def test_lists_local_s3(bucket, local_s3):
+    pytest.importorskip('aioboto3')
+    from goes2.aws import AWSRepository
+
+    _, put = bucket
+    keys = sorted(
+        put(key_of(PRODUCT, channel, OLD + timedelta(minutes=minute)))
+        for channel in ('C02', 'C13') for minute in (0, 10, 20)
+    )
+    put(key_of(PRODUCT, 'C13', OLD + timedelta(hours=1)))
+
+    async def run():
+        repository = AWSRepository(
+            bucket_name='bucket', endpoint_url=local_s3.endpoint_url
+        )
+        try:
+            tasks = [repository.index.hour(PRODUCT, OLD) for _ in range(4)]
+            results = await asyncio.gather(*tasks)
+            requests = local_s3.requests
+
+            found = await repository.index.find(
+                PRODUCT, 'C13', OLD + timedelta(minutes=10)
+            )
+            return results, requests, found
+        finally:
+            await repository.dispose()
+
+    results, requests, found = asyncio.run(run())
+    assert sorted(r.key for r in results[0]) == keys
+    assert all(result == results[0] for result in results)
+    assert all(r.size == 4 and r.etag for r in results[0])
+    # uma listagem para as quatro chamadas, e a busca reusa a mesma
+    assert requests == 1
+    assert local_s3.requests == 1
+    assert found.channel == 'C13'
+    assert found.start == OLD + timedelta(minutes=10)
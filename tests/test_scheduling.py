@@ -0,0 +1,121 @@
+import asyncio
+
+from goes2.scheduling import MemoryBudget
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def _start(budget: MemoryBudget, nbytes: int, admitted: list):
+    async def job():
+        await budget.acquire(nbytes)
+        admitted.append(nbytes)
+
+    return asyncio.create_task(job())
+
+
+def test_admits_within_budget():
+    async def run():
+        budget = MemoryBudget(100)
+        admitted = []
+        tasks = [_start(budget, n, admitted) for n in (40, 50, 30)]
+        await _settle()
+
+        assert admitted == [40, 50]
+        assert budget.current == 90 and budget.running == 2
+
+        budget.release(50)
+        await _settle()
+        assert admitted == [40, 50, 30]
+        assert budget.peak == 90
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+
+def test_small_jobs_bypass_until_limit():
+    async def run():
+        budget = MemoryBudget(100, max_bypass=1)
+        admitted = []
+        tasks = [_start(budget, 70, admitted)]
+        await _settle()
+
+        # o grande não cabe; o primeiro pequeno passa na frente
+        tasks += [_start(budget, n, admitted) for n in (60, 20, 10)]
+        await _settle()
+        assert admitted == [70, 20]
+
+        # o grande já foi ultrapassado uma vez: o próximo espera por ele
+        budget.release(20)
+        await _settle()
+        assert admitted == [70, 20]
+
+        budget.release(70)
+        await _settle()
+        assert admitted == [70, 20, 60, 10]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+
+def test_oversized_job_runs_alone():
+    async def run():
+        budget = MemoryBudget(100)
+        admitted = []
+        tasks = [_start(budget, 10, admitted)]
+        await _settle()
+
+        tasks.append(_start(budget, 500, admitted))
+        await _settle()
+        assert admitted == [10]
+
+        budget.release(10)
+        await _settle()
+        assert admitted == [10, 500]
+        assert budget.running == 1
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def run():
+        budget = MemoryBudget(100, max_bypass=0)
+        admitted = []
+        tasks = [_start(budget, 80, admitted)]
+        await _settle()
+
+        waiting = _start(budget, 50, admitted)
+        behind = _start(budget, 10, admitted)
+        await _settle()
+        # sem ultrapassagens: o de 10 espera atrás do de 50
+        assert admitted == [80]
+
+        waiting.cancel()
+        await _settle()
+        assert admitted == [80, 10]
+        assert budget.report()['waiting'] == 0
+
+        budget.release(80)
+        budget.release(10)
+        assert (budget.current, budget.running) == (0, 0)
+        await asyncio.gather(*tasks, behind)
+
+    asyncio.run(run())
+
+
+def test_reserve_releases_on_error():
+    async def run():
+        budget = MemoryBudget(100)
+        try:
+            async with budget.reserve(60):
+                assert budget.current == 60
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        return budget
+
+    budget = asyncio.run(run())
+    assert (budget.current, budget.running, budget.peak) == (0, 0, 60)